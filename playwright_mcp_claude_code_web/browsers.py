@@ -0,0 +1,142 @@
+"""
+Browser engine selection (KAGAMI_BROWSER=firefox|chromium|webkit, default firefox)
+
+Per engine:
+  - Playwright build installed by setup_mcp.py (~/.cache/ms-playwright/<engine>-<build>)
+  - profile directory (userDataDir) and config file (playwright-<engine>-config.json)
+  - where the TLS inspection CAs are trusted:
+      firefox   NSS database inside the profile (cert9.db)
+      chromium  shared NSS database ~/.pki/nssdb (Chromium on Linux reads no certificates
+                from its profile; also covers isolated daemon workers)
+      webkit    system bundle (update-ca-certificates); WebKit has no NSS store
+  - launch options (Firefox prefs / Chromium switches, lean mode extras from lean.py)
+  - site storage inside the profile (cleared on recycle / idle shutdown without preserved storage)
+
+Also the Node compile cache directory, shared by setup_mcp.py (which warms it) and mcp.py
+(which passes it to every playwright-mcp launch).
+
+Standard library only.
+"""
+import os
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from lean import get_chromium_args, get_firefox_prefs
+
+ENGINES: Dict[str, Dict[str, Any]] = {
+    "firefox": {
+        "profile_dir": "/home/user/firefox-profile",
+        "cert_store": "profile",
+        # Relative to the profile; the NSS database (cert9.db / key4.db) stays
+        "storage_paths": ["cookies.sqlite", "cookies.sqlite-wal", "webappsstore.sqlite", "webappsstore.sqlite-wal",
+                          "storage"],
+    },
+    "chromium": {
+        "profile_dir": "/home/user/chromium-profile",
+        "cert_store": "nssdb",
+        "storage_paths": ["Default/Cookies", "Default/Cookies-journal", "Default/Network/Cookies",
+                          "Default/Network/Cookies-journal", "Default/Local Storage", "Default/Session Storage",
+                          "Default/IndexedDB", "Default/Service Worker"],
+    },
+    "webkit": {
+        "profile_dir": "/home/user/webkit-profile",
+        "cert_store": "system",
+        # No certificates in the profile: everything in it is site state
+        "storage_paths": None,
+    },
+}
+
+FIREFOX_PREFS: Dict[str, Any] = {
+    "privacy.trackingprotection.enabled": False,
+    "network.proxy.allow_hijacking_localhost": True,
+    "network.stricttransportsecurity.preloadlist": False,
+    "security.cert_pinning.enforcement_level": 0,
+    "security.enterprise_roots.enabled": False,
+    "security.ssl.errorReporting.enabled": False,
+    "browser.xul.error_pages.expert_bad_cert": True,
+    "media.navigator.streams.fake": True,
+    "security.insecure_connection_text.enabled": False,
+    "security.insecure_connection_text.pbmode.enabled": False,
+    "security.mixed_content.block_active_content": False,
+    "security.mixed_content.block_display_content": False,
+    "security.OCSP.enabled": 0
+}
+
+# Playwright already adds its automation defaults (no first run, no background networking, ...)
+# and its own --disable-features list (Chromium only honors the last one, so none here)
+CHROMIUM_ARGS: List[str] = [
+    "--disable-dev-shm-usage",
+    "--use-fake-ui-for-media-stream",
+    "--use-fake-device-for-media-stream",
+]
+
+CHROMIUM_NSS_DB = Path("/home/user/.pki/nssdb")
+
+
+def get_browser_engine() -> str:
+    """Browser engine from KAGAMI_BROWSER (unknown values fall back to firefox)"""
+    engine = os.environ.get("KAGAMI_BROWSER", "firefox").strip().lower() or "firefox"
+    return engine if engine in ENGINES else "firefox"
+
+
+def get_profile_dir(engine: Optional[str] = None) -> Path:
+    return Path(ENGINES[engine or get_browser_engine()]["profile_dir"])
+
+
+def get_config_filename(engine: Optional[str] = None) -> str:
+    return f"playwright-{engine or get_browser_engine()}-config.json"
+
+
+def get_cli_args(engine: Optional[str] = None) -> List[str]:
+    """
+    playwright-mcp --browser arguments
+    --browser only knows firefox, webkit and Chrome / Edge channels, so bundled Chromium is
+    selected by browserName + channel in the config file instead
+    """
+    engine = engine or get_browser_engine()
+    return [] if engine == "chromium" else ['--browser', engine]
+
+
+def get_chromium_channel() -> str:
+    """Playwright channel for Chromium (KAGAMI_CHROMIUM_CHANNEL, default the bundled build)"""
+    return os.environ.get("KAGAMI_CHROMIUM_CHANNEL", "chromium").strip() or "chromium"
+
+
+def build_launch_options(engine: Optional[str] = None) -> Dict[str, Any]:
+    """launchOptions for the playwright-mcp config (lean mode adds engine-specific extras)"""
+    engine = engine or get_browser_engine()
+    options: Dict[str, Any] = {"headless": True}
+    if engine == "firefox":
+        options["firefoxUserPrefs"] = dict(FIREFOX_PREFS, **get_firefox_prefs())
+    elif engine == "chromium":
+        options["channel"] = get_chromium_channel()
+        # Runs as root in the container; playwright-mcp enables the sandbox by default
+        options["chromiumSandbox"] = False
+        options["args"] = CHROMIUM_ARGS + get_chromium_args()
+    options["acceptDownloads"] = False
+    return options
+
+
+def get_storage_paths(profile_dir: Path, engine: Optional[str] = None) -> List[Path]:
+    """Cookie and site storage files / directories inside a profile"""
+    names = ENGINES[engine or get_browser_engine()]["storage_paths"]
+    if names is None:
+        return list(profile_dir.iterdir()) if profile_dir.exists() else []
+    return [profile_dir / name for name in names]
+
+
+def get_node_compile_cache_dir() -> Optional[Path]:
+    """
+    Node module compile cache shared by every playwright-mcp launch (NODE_COMPILE_CACHE, Node 22.1+)
+    KAGAMI_NODE_COMPILE_CACHE overrides the directory; 0 disables it
+    """
+    if os.environ.get("NODE_COMPILE_CACHE"):
+        return Path(os.environ["NODE_COMPILE_CACHE"])
+    value = os.environ.get("KAGAMI_NODE_COMPILE_CACHE", "/home/user/.cache/kagami-node-compile-cache").strip()
+    if value.lower() in ("", "0", "false", "no", "off"):
+        return None
+    return Path(value)
+
+
+def is_node_compile_cache_populated(cache_dir: Path) -> bool:
+    return cache_dir.exists() and any(path.is_file() for path in cache_dir.rglob("*"))
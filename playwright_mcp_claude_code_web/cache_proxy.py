@@ -0,0 +1,597 @@
+"""
+Caching forward proxy in front of the local proxy (proxy.py on :18915)
+
+Communication flow (KAGAMI_HTTP_CACHE=1):
+  Firefox → cache_proxy (localhost:18916) → proxy.py (localhost:18915) → JWT Auth Proxy → Internet
+
+HTTPS is cached by terminating TLS with per-host certificates signed by the Kagami
+local CA (generated and imported into the Firefox profile by setup_mcp.py, next to
+the TLS inspection CAs). Upstream TLS is verified against the system store, which
+already trusts the JWT proxy's TLS inspection CA. Hosts in the bypass list, and all
+hosts when the CA is missing, are tunneled without caching.
+
+Lean mode deny rules (lean.py) are enforced here too: blocked hosts are refused at
+CONNECT / request time, and since HTTPS is intercepted, responses with a blocked
+content type are refused before their body is downloaded.
+
+In-flight requests and tunnel traffic feed kagami_wait_network_idle (network_idle.py);
+intercepted HTTPS requests are tracked one by one.
+
+Runs in threads inside mcp.py (standard library only).
+"""
+import http.client
+import ipaddress
+import os
+import re
+import select
+import socket
+import socketserver
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import urlsplit
+
+from http_cache import (
+    Headers,
+    HttpCache,
+    build_meta,
+    get_header,
+    is_request_cacheable,
+    is_response_storable,
+    refresh_meta,
+    request_wants_revalidation,
+)
+from lean import DenyRules
+from network_idle import NetworkActivity
+
+KAGAMI_CA_DIR = Path(os.environ.get("KAGAMI_CA_DIR", "/home/user/.kagami/ca"))
+
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "proxy-connection",
+    "te", "trailer", "transfer-encoding", "upgrade",
+}
+CHUNK_SIZE = 65536
+HOSTNAME_LABEL = re.compile(r"^(?!-)[a-z0-9_-]{1,63}(?<!-)$")
+
+
+def is_valid_host(host: str) -> bool:
+    """DNS name or IP address (certificate hosts end up in file names and openssl arguments)"""
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        pass
+    return 0 < len(host) <= 253 and all(HOSTNAME_LABEL.match(label) for label in host.lower().split("."))
+
+
+class CertificateAuthority:
+    """Issues per-host leaf certificates signed by the Kagami local CA (openssl CLI)"""
+
+    def __init__(self, ca_dir: Path):
+        self.ca_cert = ca_dir / "kagami-ca.crt"
+        self.ca_key = ca_dir / "kagami-ca.key"
+        self.leaf_key = ca_dir / "leaf.key"
+        self.certs_dir = ca_dir / "certs"
+        self.contexts: Dict[str, ssl.SSLContext] = {}
+        self.lock = threading.Lock()  # Guards contexts and host_locks only; openssl runs under a host lock
+        self.host_locks: Dict[str, threading.Lock] = {}
+        self.leaf_key_lock = threading.Lock()
+
+    def available(self) -> bool:
+        return self.ca_cert.exists() and self.ca_key.exists()
+
+    def context_for(self, host: str) -> ssl.SSLContext:
+        """Server-side TLS context presenting a certificate for host (raises ValueError for invalid hosts)"""
+        host = host.lower().rstrip(".")
+        if not is_valid_host(host):
+            raise ValueError(f"invalid host '{host[:100]}'")
+        with self.lock:
+            context = self.contexts.get(host)
+            if context:
+                return context
+            host_lock = self.host_locks.setdefault(host, threading.Lock())
+
+        # Issuing takes tens of milliseconds: only requests for the same host wait for it
+        with host_lock:
+            with self.lock:
+                context = self.contexts.get(host)
+            if context:
+                return context
+
+            self.certs_dir.mkdir(parents=True, exist_ok=True)
+            with self.leaf_key_lock:
+                if not self.leaf_key.exists():
+                    subprocess.run(["openssl", "genrsa", "-out", str(self.leaf_key), "2048"],
+                                   check=True, capture_output=True)
+
+            cert_path = self.certs_dir / f"{host}.crt"
+            if not cert_path.exists():
+                self._issue(host, cert_path)
+
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(str(cert_path), str(self.leaf_key))
+            context.set_alpn_protocols(["http/1.1"])
+            with self.lock:
+                self.contexts[host] = context
+                self.host_locks.pop(host, None)
+            return context
+
+    def _issue(self, host: str, cert_path: Path):
+        try:
+            ipaddress.ip_address(host)
+            san = f"IP:{host}"
+        except ValueError:
+            san = f"DNS:{host}"
+
+        with tempfile.TemporaryDirectory() as tmp:
+            csr = Path(tmp) / "leaf.csr"
+            ext = Path(tmp) / "leaf.ext"
+            ext.write_text(f"subjectAltName={san}\nextendedKeyUsage=serverAuth\n")
+            subprocess.run(["openssl", "req", "-new", "-key", str(self.leaf_key), "-subj", f"/CN={host[:64]}",
+                            "-out", str(csr)], check=True, capture_output=True)
+            subprocess.run(["openssl", "x509", "-req", "-in", str(csr), "-CA", str(self.ca_cert),
+                            "-CAkey", str(self.ca_key), "-set_serial", str(int(time.time() * 1000)),
+                            "-days", "825", "-sha256", "-extfile", str(ext), "-out", str(cert_path)],
+                           check=True, capture_output=True)
+
+
+class UpstreamPool:
+    """Keep-alive connections to origins through the upstream (local) proxy"""
+
+    def __init__(self, proxy_host: str, proxy_port: int, ssl_context: ssl.SSLContext, max_idle: int = 6):
+        self.proxy_host = proxy_host
+        self.proxy_port = proxy_port
+        self.ssl_context = ssl_context
+        self.max_idle = max_idle
+        self.idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self.lock = threading.Lock()
+        self.stats = {"connections_opened": 0, "connections_reused": 0}
+
+    def get(self, scheme: str, host: str, port: int) -> Tuple[http.client.HTTPConnection, bool]:
+        """Returns (connection, reused)"""
+        key = (scheme, host, port)
+        with self.lock:
+            idle = self.idle.get(key)
+            if idle:
+                self.stats["connections_reused"] += 1
+                return idle.pop(), True
+            self.stats["connections_opened"] += 1
+
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(self.proxy_host, self.proxy_port, timeout=60, context=self.ssl_context)
+            conn.set_tunnel(host, port)
+        else:
+            conn = http.client.HTTPConnection(self.proxy_host, self.proxy_port, timeout=60)
+        return conn, False
+
+    def put(self, scheme: str, host: str, port: int, conn: http.client.HTTPConnection):
+        with self.lock:
+            idle = self.idle.setdefault((scheme, host, port), [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+
+class ProxyRequestHandler(socketserver.StreamRequestHandler):
+    """One client connection (plain HTTP requests or CONNECT)"""
+
+    server: "CachingProxyServer"
+
+    def handle(self):
+        try:
+            request = self.read_request()
+            if not request:
+                return
+            method, target, headers = request
+
+            if method == "CONNECT":
+                host, _, port = target.rpartition(":")
+                self.handle_connect(host.strip("[]"), int(port or 443))
+                return
+
+            while request:
+                method, target, headers = request
+                parts = urlsplit(target)
+                path = parts.path or "/"
+                if parts.query:
+                    path += f"?{parts.query}"
+                keep_alive = self.handle_http("http", parts.hostname or "", parts.port or 80, method, path, headers)
+                if not keep_alive:
+                    return
+                request = self.read_request()
+        except (OSError, ssl.SSLError, http.client.HTTPException, ValueError) as e:
+            self.server.count("errors")
+            self.server.log_debug(f"Connection error: {e}")
+
+    def read_request(self) -> Optional[Tuple[str, str, Headers]]:
+        """Read request line and headers"""
+        line = self.rfile.readline(65537)
+        if not line or not line.strip():
+            return None
+        method, target, _ = line.decode("latin-1").strip().split(" ", 2)
+        message = http.client.parse_headers(self.rfile)
+        return method.upper(), target, list(message.items())
+
+    def read_body(self, headers: Headers) -> Optional[bytes]:
+        """Read request body (Content-Length or chunked)"""
+        length = get_header(headers, "Content-Length")
+        if length:
+            return self.rfile.read(int(length))
+        if (get_header(headers, "Transfer-Encoding") or "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    while self.rfile.readline().strip():
+                        pass
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return None
+
+    def handle_connect(self, host: str, port: int):
+        """Intercept TLS (caching) or tunnel blindly"""
+        self.server.count("connect_requests")
+
+        if self.server.deny_rules.blocks_host(host):
+            self.server.count("blocked")
+            self.wfile.write(b"HTTP/1.1 403 Blocked by Kagami\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            return
+
+        if not is_valid_host(host.rstrip(".")):
+            self.server.count("errors")
+            self.wfile.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            return
+
+        if not self.server.should_intercept(host):
+            self.server.count("tunneled")
+            self.tunnel(host, port, b"HTTP/1.1 200 Connection established\r\n\r\n")
+            return
+
+        self.server.activity.touch()
+        self.wfile.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+        self.wfile.flush()
+        tls = self.server.ca.context_for(host).wrap_socket(self.connection, server_side=True)
+        self.server.count("intercepted")
+        self.connection = tls
+        self.rfile = tls.makefile("rb", CHUNK_SIZE)
+        self.wfile = tls.makefile("wb", 0)
+
+        while True:
+            request = self.read_request()
+            if not request:
+                return
+            method, target, headers = request
+            if (get_header(headers, "Upgrade") or "") and method == "GET":
+                self.upgrade(host, port, method, target, headers)
+                return
+            if not self.handle_http("https", host, port, method, target, headers):
+                return
+
+    def open_tunnel(self, host: str, port: int) -> socket.socket:
+        """Raw CONNECT tunnel through the upstream proxy"""
+        upstream = socket.create_connection((self.server.upstream_host, self.server.upstream_port), timeout=60)
+        upstream.sendall(f"CONNECT {host}:{port} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode("latin-1"))
+        reply = b""
+        while b"\r\n\r\n" not in reply:
+            data = upstream.recv(4096)
+            if not data:
+                raise OSError("Upstream proxy closed during CONNECT")
+            reply += data
+        status = reply.split(b" ", 2)[1]
+        if status != b"200":
+            upstream.close()
+            raise OSError(f"Upstream proxy refused CONNECT {host}:{port} ({status.decode()})")
+        return upstream
+
+    def tunnel(self, host: str, port: int, established: bytes):
+        """Blind bidirectional tunnel (in flight until established)"""
+        with self.server.activity.request():
+            try:
+                upstream = self.open_tunnel(host, port)
+            except OSError as e:
+                self.server.count("errors")
+                self.wfile.write(b"HTTP/1.1 502 Bad Gateway\r\n\r\n")
+                self.server.log_debug(str(e))
+                return
+            self.wfile.write(established)
+            self.wfile.flush()
+        self.pipe(self.connection, upstream)
+
+    def upgrade(self, host: str, port: int, method: str, target: str, headers: Headers):
+        """Pass an Upgrade (WebSocket) request through over a fresh upstream TLS connection"""
+        upstream = self.server.upstream_ssl_context.wrap_socket(self.open_tunnel(host, port), server_hostname=host)
+        head = f"{method} {target} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers) + "\r\n"
+        upstream.sendall(head.encode("latin-1"))
+        self.pipe(self.connection, upstream)
+
+    def pipe(self, client: socket.socket, upstream: socket.socket):
+        """Copy bytes both ways until either side closes"""
+        sockets = [client, upstream]
+        try:
+            while True:
+                # TLS sockets may hold decrypted data that select() does not report
+                readable = [s for s in sockets if isinstance(s, ssl.SSLSocket) and s.pending()]
+                if not readable:
+                    readable, _, _ = select.select(sockets, [], [], 300)
+                if not readable:
+                    return
+                for sock in readable:
+                    data = sock.recv(CHUNK_SIZE)
+                    if not data:
+                        return
+                    (upstream if sock is client else client).sendall(data)
+                    if sock is client:
+                        self.server.activity.tunnel_sent(client, len(data))
+                    else:
+                        self.server.activity.tunnel_received(client)
+        finally:
+            upstream.close()
+            self.server.activity.tunnel_closed(client)
+
+    def handle_http(self, scheme: str, host: str, port: int, method: str, path: str, headers: Headers) -> bool:
+        """Serve one request from cache or upstream (in flight until answered); returns whether to keep the connection open"""
+        with self.server.activity.request():
+            return self.serve_http(scheme, host, port, method, path, headers)
+
+    def serve_http(self, scheme: str, host: str, port: int, method: str, path: str, headers: Headers) -> bool:
+        body = self.read_body(headers)
+        default_port = 443 if scheme == "https" else 80
+        url = f"{scheme}://{host}{'' if port == default_port else f':{port}'}{path}"
+        keep_alive = (get_header(headers, "Connection") or "").lower() != "close"
+        if self.server.deny_rules.blocks_host(host):
+            self.server.count("blocked")
+            self.send_blocked()
+            return keep_alive
+
+        cache = self.server.cache
+        cache.count("requests")
+
+        if not is_request_cacheable(method, headers):
+            cache.count("uncacheable")
+            return self.forward(scheme, host, port, method, path, url, headers, body, None, None) and keep_alive
+
+        key = cache.make_key(url, get_header(headers, "Accept-Encoding"))
+        meta = cache.lookup(key)
+        client_conditional = get_header(headers, "If-None-Match") or get_header(headers, "If-Modified-Since")
+
+        if meta and time.time() < meta["expires_at"] and not request_wants_revalidation(headers):
+            if client_conditional and self.matches_conditional(meta, headers):
+                cache.count("hits")
+                cache.count("bytes_saved", meta["size"])
+                self.send_response_head(304, "Not Modified", meta["headers"], None, "HIT")
+                return keep_alive
+            cached_body = cache.read_body(key)
+            if cached_body is not None:
+                cache.count("hits")
+                cache.count("bytes_saved", len(cached_body))
+                self.send_cached(meta, cached_body, method, "HIT")
+                return keep_alive
+            meta = None
+
+        upstream_headers = list(headers)
+        if meta and not client_conditional:
+            # Conditional revalidation of the stored entry
+            etag = get_header(meta["headers"], "ETag")
+            last_modified = get_header(meta["headers"], "Last-Modified")
+            if etag:
+                upstream_headers.append(("If-None-Match", etag))
+            if last_modified:
+                upstream_headers.append(("If-Modified-Since", last_modified))
+            if not etag and not last_modified:
+                meta = None
+
+        return self.forward(scheme, host, port, method, path, url, upstream_headers, body, key,
+                            meta if not client_conditional else None) and keep_alive
+
+    def matches_conditional(self, meta: Dict[str, Any], headers: Headers) -> bool:
+        etag = get_header(meta["headers"], "ETag")
+        if_none_match = get_header(headers, "If-None-Match")
+        if if_none_match is not None:
+            return bool(etag) and (if_none_match.strip() == "*" or etag in [v.strip() for v in if_none_match.split(",")])
+        return get_header(headers, "If-Modified-Since") == get_header(meta["headers"], "Last-Modified")
+
+    def forward(self, scheme: str, host: str, port: int, method: str, path: str, url: str, headers: Headers,
+                body: Optional[bytes], key: Optional[str], stale_meta: Optional[Dict[str, Any]]) -> bool:
+        """Send request upstream, stream the response, store it when allowed"""
+        cache = self.server.cache
+        try:
+            response, conn = self.server.request_upstream(scheme, host, port, method,
+                                                          path if scheme == "https" else url, headers, body)
+        except (OSError, http.client.HTTPException) as e:
+            # Nothing was sent to the client yet: answer instead of dropping the connection
+            self.server.count("errors")
+            self.server.log_debug(f"Upstream error for {url}: {e}")
+            self.send_bad_gateway()
+            return False
+        response_headers = list(response.getheaders())
+
+        if stale_meta and response.status == 304:
+            response.read()
+            self.server.release_upstream(scheme, host, port, conn, response)
+            cached_body = cache.read_body(key)
+            if cached_body is not None:
+                meta = refresh_meta(stale_meta, response_headers)
+                cache.store(key, meta, None)
+                cache.count("revalidated")
+                cache.count("bytes_saved", len(cached_body))
+                self.send_cached(meta, cached_body, method, "REVALIDATED")
+                return True
+            # Body vanished (evicted meanwhile): fetch again without validators
+            stripped = [(k, v) for k, v in headers if k.lower() not in ("if-none-match", "if-modified-since")]
+            return self.forward(scheme, host, port, method, path, url, stripped, body, key, None)
+
+        no_body = method == "HEAD" or response.status in (204, 304) or 100 <= response.status < 200
+        length = get_header(response_headers, "Content-Length")
+        if not no_body and self.server.deny_rules.blocks_content_type(get_header(response_headers, "Content-Type")):
+            # Drop the upstream connection instead of downloading the body
+            conn.close()
+            self.server.count("blocked")
+            self.server.count("blocked_bytes", int(length) if length and length.isdigit() else 0)
+            self.send_blocked()
+            return True
+
+        if key:
+            cache.count("misses")
+        storable = key is not None and is_response_storable(response.status, response_headers)
+        stored: Optional[List[bytes]] = [] if storable else None
+        stored_size = 0
+
+        chunked = not no_body and (length is None or response.chunked)
+        self.send_response_head(response.status, response.reason, response_headers,
+                                None if chunked or no_body else int(length),
+                                "MISS" if key else None, chunked=chunked, no_body=no_body)
+
+        if not no_body:
+            while True:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if stored is not None:
+                    stored_size += len(chunk)
+                    if stored_size > cache.max_object_bytes:
+                        stored = None
+                    else:
+                        stored.append(chunk)
+                if chunked:
+                    self.wfile.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+                else:
+                    self.wfile.write(chunk)
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+        self.server.release_upstream(scheme, host, port, conn, response)
+
+        if stored is not None:
+            content = b"".join(stored)
+            cache.store(key, build_meta(url, response.status, response.reason, response_headers, len(content)), content)
+        return True
+
+    def send_bad_gateway(self):
+        self.wfile.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        self.wfile.flush()
+
+    def send_blocked(self):
+        self.wfile.write(b"HTTP/1.1 403 Blocked by Kagami\r\nContent-Length: 0\r\n\r\n")
+        self.wfile.flush()
+
+    def send_cached(self, meta: Dict[str, Any], body: bytes, method: str, cache_status: str):
+        age = int(max(0.0, time.time() - meta["stored_at"]))
+        headers = [(k, v) for k, v in meta["headers"] if k.lower() != "age"] + [("Age", str(age))]
+        self.send_response_head(meta["status"], meta["reason"], headers, len(body), cache_status,
+                                no_body=method == "HEAD")
+        if method != "HEAD":
+            self.wfile.write(body)
+        self.wfile.flush()
+
+    def send_response_head(self, status: int, reason: str, headers: Headers, length: Optional[int],
+                           cache_status: Optional[str], chunked: bool = False, no_body: bool = False):
+        lines = [f"HTTP/1.1 {status} {reason}"]
+        for name, value in headers:
+            if name.lower() in HOP_BY_HOP or name.lower() == "content-length":
+                continue
+            lines.append(f"{name}: {value}")
+        if chunked:
+            lines.append("Transfer-Encoding: chunked")
+        elif length is not None:
+            lines.append(f"Content-Length: {length}")
+        elif no_body and status != 304:
+            lines.append("Content-Length: 0")
+        if cache_status:
+            lines.append(f"X-Kagami-Cache: {cache_status}")
+        self.wfile.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+
+class CachingProxyServer(socketserver.ThreadingTCPServer):
+    """Caching forward proxy chained to an upstream HTTP proxy"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, listen: Tuple[str, int], upstream: Tuple[str, int], cache: HttpCache,
+                 ca: CertificateAuthority, bypass_hosts: List[str], upstream_ca_file: Optional[str] = None,
+                 deny_rules: Optional[DenyRules] = None, debug: bool = False):
+        super().__init__(listen, ProxyRequestHandler)
+        self.upstream_host, self.upstream_port = upstream
+        self.cache = cache
+        self.ca = ca
+        self.bypass_hosts = [host.lower() for host in bypass_hosts]
+        self.deny_rules = deny_rules or DenyRules([], [])
+        self.upstream_ssl_context = ssl.create_default_context(cafile=upstream_ca_file)
+        self.pool = UpstreamPool(self.upstream_host, self.upstream_port, self.upstream_ssl_context)
+        self.debug = debug
+        self.counters = {"connect_requests": 0, "intercepted": 0, "tunneled": 0, "errors": 0,
+                         "blocked": 0, "blocked_bytes": 0}
+        self.counters_lock = threading.Lock()
+        self.activity = NetworkActivity()
+
+    def count(self, name: str, amount: int = 1):
+        with self.counters_lock:
+            self.counters[name] += amount
+
+    def log_debug(self, message: str):
+        if self.debug:
+            print(f"[cache_proxy] {message}", file=sys.stderr, flush=True)
+
+    def should_intercept(self, host: str) -> bool:
+        if not self.ca.available():
+            return False
+        host = host.lower()
+        return not any(host == bypass or host.endswith(f".{bypass}") for bypass in self.bypass_hosts)
+
+    def request_upstream(self, scheme: str, host: str, port: int, method: str, target: str,
+                         headers: Headers, body: Optional[bytes]) -> Tuple[http.client.HTTPResponse, http.client.HTTPConnection]:
+        """Send request on a pooled connection (retries once if a reused connection went stale)"""
+        for attempt in range(2):
+            conn, reused = self.pool.get(scheme, host, port)
+            try:
+                conn.putrequest(method, target, skip_host=True, skip_accept_encoding=True)
+                for name, value in headers:
+                    if name.lower() not in HOP_BY_HOP:
+                        conn.putheader(name, value)
+                if body is not None and get_header(headers, "Content-Length") is None:
+                    conn.putheader("Content-Length", str(len(body)))
+                conn.endheaders(body)
+                return conn.getresponse(), conn
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused or attempt:
+                    raise
+            except Exception:
+                conn.close()
+                raise
+        raise OSError("unreachable")
+
+    def release_upstream(self, scheme: str, host: str, port: int, conn: http.client.HTTPConnection,
+                         response: http.client.HTTPResponse):
+        if response.will_close or not response.isclosed():
+            conn.close()
+        else:
+            self.pool.put(scheme, host, port, conn)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.counters_lock:
+            stats = dict(self.counters)
+        stats.update(self.pool.stats)
+        stats.update(self.cache.snapshot())
+        stats["tls_interception"] = self.ca.available()
+        return stats
+
+
+def start_caching_proxy(listen_port: int, upstream_port: int, cache_dir: Path, max_bytes: int,
+                        max_object_bytes: int, bypass_hosts: List[str],
+                        upstream_ca_file: Optional[str] = None,
+                        deny_rules: Optional[DenyRules] = None) -> CachingProxyServer:
+    """Bind the caching proxy and serve it from a background thread (ready on return)"""
+    cache = HttpCache(cache_dir, max_bytes, max_object_bytes)
+    server = CachingProxyServer(("127.0.0.1", listen_port), ("127.0.0.1", upstream_port), cache,
+                                CertificateAuthority(KAGAMI_CA_DIR), bypass_hosts, upstream_ca_file,
+                                deny_rules)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.11"
+# ///
+"""
+Kagami daemon: shared setup, proxy and playwright-mcp worker pool for many MCP sessions
+
+Communication flow:
+  Claude Code → mcp.py (stdio↔socket shim) → daemon.py (Unix socket) → playwright-mcp worker (isolated browser context) → proxy.py → ...
+
+One daemon per box:
+  1. Runs minimal setup and fetches the tool catalog once
+  2. Runs full setup and starts proxy.py once (background)
+  3. Keeps KAGAMI_DAEMON_POOL_SIZE pre-started playwright-mcp workers (--isolated)
+  4. Serves each socket connection as one MCP session with its own worker
+  5. Exits after KAGAMI_DAEMON_IDLE_EXIT seconds without sessions
+
+mcp.py attaches automatically when KAGAMI_DAEMON=1 (starting the daemon if needed).
+"""
+import argparse
+import atexit
+import fcntl
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Optional, Dict, Any, List
+
+import mcp
+
+DEFAULT_SOCKET_PATH = "/tmp/kagami-daemon.sock"
+
+
+class WorkerPool:
+    """Pre-started playwright-mcp processes; each session takes one and it is discarded afterwards"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.idle: List[subprocess.Popen] = []
+        self.lock = threading.Lock()
+        self.spawned = 0
+        self.closed = False
+
+    def spawn(self) -> Optional[subprocess.Popen]:
+        """Start one playwright-mcp worker with an isolated (in-memory) browser profile"""
+        # Concurrent browser instances cannot share userDataDir, so every worker is isolated
+        cmd = mcp.build_playwright_mcp_command(mcp.get_playwright_mcp_args() + ['--isolated'])
+        if not cmd:
+            return None
+
+        env = mcp.get_playwright_mcp_env()
+        try:
+            process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                env=env,
+                bufsize=0
+            )
+        except Exception as e:
+            mcp.log(f"Worker startup error: {e}", "ERROR")
+            return None
+
+        with self.lock:
+            self.spawned += 1
+        return process
+
+    def fill(self):
+        """Top up idle workers to the pool size"""
+        while not self.closed:
+            with self.lock:
+                if len(self.idle) >= self.size:
+                    return
+            process = self.spawn()
+            if not process:
+                return
+            with self.lock:
+                self.idle.append(process)
+
+    def acquire(self) -> Optional[subprocess.Popen]:
+        """Take an idle worker (or start one) and refill the pool in the background"""
+        process = None
+        with self.lock:
+            while self.idle:
+                candidate = self.idle.pop()
+                if candidate.poll() is None:
+                    process = candidate
+                    break
+        if not process:
+            process = self.spawn()
+        threading.Thread(target=self.fill, daemon=True).start()
+        return process
+
+    def shutdown(self):
+        """Stop idle workers"""
+        self.closed = True
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for process in idle:
+            stop_worker(process)
+
+
+def stop_worker(process: subprocess.Popen):
+    """Stop a playwright-mcp worker"""
+    try:
+        process.terminate()
+        process.wait(timeout=5)
+    except:
+        process.kill()
+
+
+class DaemonSession(threading.Thread):
+    """One MCP session (socket connection) with its own playwright-mcp worker"""
+
+    def __init__(self, daemon: "KagamiDaemon", conn: socket.socket):
+        super().__init__(daemon=True)
+        self.kagami = daemon
+        self.conn = conn
+        # Buffered: readline() reads whole chunks, write() + flush() sends the whole message
+        self.reader = conn.makefile("rb")
+        self.writer = conn.makefile("wb")
+        self.write_lock = threading.Lock()  # Own lock: sessions never write to each other's streams
+        self.worker: Optional[subprocess.Popen] = None
+        self.snapshot_cache = mcp.new_snapshot_cache("browser") if mcp.is_snapshot_cache_enabled() else None
+
+    def forward(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Forward request to this session's worker"""
+        if mcp.is_browserless_tool(request):
+            return mcp.run_browserless_tool(request)
+        if not self.worker:
+            self.worker = self.kagami.pool.acquire()
+            if self.worker:
+                mcp.auto_restore_storage_state(self.worker)
+        if not self.worker or self.worker.poll() is not None:
+            return {
+                "jsonrpc": "2.0",
+                "id": request.get("id"),
+                "error": {
+                    "code": -32603,
+                    "message": "playwright-mcp worker is not running"
+                }
+            }
+
+        try:
+            if mcp.is_wrapper_tool(request):
+                return mcp.run_wrapper_tool(request, self.worker)
+
+            if self.snapshot_cache and request.get("method") == "tools/call":
+                return mcp.call_with_snapshot_cache(self.snapshot_cache, request, self.exchange)
+            return self.exchange(request)
+
+        except Exception as e:
+            mcp.log(f"Proxy error: {e}", "ERROR")
+            return {
+                "jsonrpc": "2.0",
+                "id": request.get("id"),
+                "error": {
+                    "code": -32603,
+                    "message": f"Proxy error: {e}"
+                }
+            }
+
+    def exchange(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        mcp.write_jsonrpc_message(self.worker.stdin, request, self.write_lock)
+        return mcp.read_jsonrpc_message(self.worker.stdout)
+
+    def handle(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Dispatch one request (same semantics as the mcp.py main loop)"""
+        method = request.get("method")
+
+        if method == "initialize":
+            return mcp.handle_initialize(request)
+
+        if method == "tools/list":
+            response = mcp.handle_tools_list(request)
+            if response is None and mcp.tools_list_result_json is not None:
+                mcp.write_raw_message(self.writer, mcp.build_tools_list_response(request.get("id")), self.write_lock)
+                return None
+            if response is None:
+                response = self.forward(request)
+                if response and "result" in response:
+                    mcp.set_tool_catalog(response["result"].get("tools", []))
+                    response["result"]["tools"] = mcp.playwright_tools
+            return response
+
+        if method == "kagami/stats":
+            response = mcp.handle_stats(request)
+            response["result"]["daemon"] = self.kagami.stats()
+            return response
+
+        if method == "tools/call":
+            return mcp.handle_tool_call(request) or self.forward(request)
+
+        if mcp.setup_completed:
+            return self.forward(request)
+        return {
+            "jsonrpc": "2.0",
+            "id": request.get("id"),
+            "error": {
+                "code": -32603,
+                "message": "Setup is in progress. Please wait..."
+            }
+        }
+
+    def run(self):
+        self.kagami.session_started()
+        try:
+            while True:
+                request = mcp.read_jsonrpc_message(self.reader)
+                if not request:
+                    break
+
+                method = request.get("method")
+                if method and method.startswith("notifications/"):
+                    continue
+
+                mcp.track_request(request)
+                try:
+                    response = self.handle(request)
+                    if response:
+                        mcp.write_jsonrpc_message(self.writer, response, self.write_lock)
+                finally:
+                    mcp.untrack_request(request)
+        except OSError as e:
+            mcp.log(f"Session error: {e}", "WARN")
+        finally:
+            if self.worker:
+                mcp.auto_save_storage_state(self.worker)
+                stop_worker(self.worker)
+            # The socket only closes once its file objects are closed too
+            for closable in (self.reader, self.writer, self.conn):
+                try:
+                    closable.close()
+                except OSError:
+                    pass
+            self.kagami.session_ended()
+
+
+class KagamiDaemon:
+    """Unix socket server owning setup, proxy and the worker pool"""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.pool = WorkerPool(mcp.env_int("KAGAMI_DAEMON_POOL_SIZE", 1))
+        self.idle_exit = mcp.env_float("KAGAMI_DAEMON_IDLE_EXIT", 900.0)
+        self.lock = threading.Lock()
+        self.active_sessions = 0
+        self.total_sessions = 0
+        self.last_session_end = time.time()
+
+    def session_started(self):
+        with self.lock:
+            self.active_sessions += 1
+            self.total_sessions += 1
+        mcp.log(f"Session attached ({self.active_sessions} active)")
+
+    def session_ended(self):
+        with self.lock:
+            self.active_sessions -= 1
+            self.last_session_end = time.time()
+        mcp.log(f"Session detached ({self.active_sessions} active)")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.pool.lock:
+            idle_workers = len(self.pool.idle)
+            spawned = self.pool.spawned
+        return {
+            "pid": os.getpid(),
+            "socket": self.socket_path,
+            "active_sessions": self.active_sessions,
+            "total_sessions": self.total_sessions,
+            "idle_workers": idle_workers,
+            "workers_started": spawned,
+        }
+
+    def run_full_setup(self):
+        """Full setup and proxy start (background thread), then pre-start workers"""
+        try:
+            if not mcp.run_full_setup():
+                return
+            mcp.setup_completed = True
+            mcp.log("Full setup completed successfully")
+            self.pool.fill()
+            mcp.log(f"Worker pool ready ({len(self.pool.idle)} idle)")
+        except Exception as e:
+            mcp.setup_error = f"Error during setup: {e}"
+            mcp.log(mcp.setup_error, "ERROR")
+
+    def serve(self):
+        """Accept sessions until idle timeout"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        server.listen(16)
+        server.settimeout(5.0)
+        mcp.log(f"Kagami daemon listening on {self.socket_path}")
+
+        try:
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    with self.lock:
+                        idle_for = time.time() - self.last_session_end if self.active_sessions == 0 else 0
+                    if self.idle_exit > 0 and idle_for > self.idle_exit:
+                        mcp.log(f"No sessions for {idle_for:.0f}s, exiting")
+                        return
+                    continue
+                conn.settimeout(None)
+                DaemonSession(self, conn).start()
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Kagami daemon serving MCP sessions over a Unix socket")
+    parser.add_argument("--socket", default=os.environ.get("KAGAMI_DAEMON_SOCKET", DEFAULT_SOCKET_PATH),
+                        help="Unix socket path")
+    args = parser.parse_args()
+
+    os.environ['HOME'] = '/home/user'
+    mcp.daemon_mode = True
+
+    # Only one daemon per socket (mcp.py shims may race to start it)
+    lock_file = open(f"{args.socket}.lock", "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        mcp.log("Another Kagami daemon is already running", "WARN")
+        return 0
+    mcp.write_daemon_settings(args.socket)
+
+    daemon = KagamiDaemon(args.socket)
+    atexit.register(mcp.stop_processes)
+    atexit.register(daemon.pool.shutdown)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    mcp.install_profiling_signals()
+
+    mcp.log("=" * 70)
+    mcp.log("Kagami Daemon Starting")
+    mcp.log("=" * 70)
+
+    mcp.run_synchronous_setup()
+    threading.Thread(target=daemon.run_full_setup, daemon=True).start()
+
+    try:
+        daemon.serve()
+    except KeyboardInterrupt:
+        mcp.log("Interrupted")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
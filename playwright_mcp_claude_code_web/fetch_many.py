@@ -0,0 +1,283 @@
+"""
+Concurrent page fetches without the browser (kagami_fetch_many)
+
+Static pages don't need Firefox: the wrapper fetches them directly through the same
+local proxy chain the browser uses (caching proxy on :18916 when KAGAMI_HTTP_CACHE=1,
+otherwise :18915), so the JWT proxy, deny rules, HTTP cache, metrics and the
+network-idle signal all apply.
+
+  - keep-alive connections through the local proxy (cache_proxy.UpstreamPool), kept
+    across calls
+  - at most KAGAMI_FETCH_CONCURRENCY requests at a time
+  - TLS verified against the system store (which trusts the TLS inspection CA), or
+    KAGAMI_CACHE_UPSTREAM_CA_FILE, plus the Kagami local CA behind the caching proxy
+  - bodies capped at KAGAMI_FETCH_MAX_BYTES (downloaded and decompressed), results
+    at max_chars per URL; non-text content types are not downloaded
+  - redirects followed (MAX_REDIRECTS), no cookies, no JavaScript
+
+Each URL comes back as its own text content item, in request order.
+
+Standard library only.
+"""
+import http.client
+import os
+import re
+import ssl
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from cache_proxy import KAGAMI_CA_DIR, UpstreamPool
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024
+DEFAULT_MAX_CHARS = 20000
+DEFAULT_TIMEOUT = 20.0
+MAX_URLS = 50
+MAX_REDIRECTS = 5
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0"
+
+TEXT_CONTENT_TYPES = ("text/", "application/xhtml+xml", "application/xml", "application/json",
+                      "application/javascript", "application/ld+json", "application/rss+xml", "application/atom+xml")
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+TOOLS: List[Dict[str, Any]] = [
+    {
+        "name": "kagami_fetch_many",
+        "description": ("Fetch several URLs concurrently without the browser (plain HTTP GET through the same proxy, "
+                        "no JavaScript, no cookies) and return each page's text or HTML. Much faster than "
+                        "browser_navigate for static pages such as docs, articles and listings; use the browser "
+                        "for pages that need JavaScript or a login."),
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "urls": {"type": "array", "items": {"type": "string"}, "minItems": 1, "maxItems": MAX_URLS,
+                         "description": "http(s) URLs to fetch"},
+                "format": {"type": "string", "enum": ["text", "html"],
+                           "description": "text: readable text extracted from HTML (default); html: the raw markup"},
+                "max_chars": {"type": "integer", "minimum": 1,
+                              "description": f"Characters returned per URL (default {DEFAULT_MAX_CHARS})"},
+            },
+            "required": ["urls"],
+        },
+    },
+]
+
+
+class TextExtractor(HTMLParser):
+    """Readable text of an HTML document (scripts, styles and other non-content elements dropped)"""
+
+    SKIP = {"script", "style", "noscript", "template", "svg", "canvas", "iframe", "head"}
+    BLOCK = {"p", "div", "section", "article", "main", "header", "footer", "nav", "aside", "br", "hr", "li",
+             "ul", "ol", "dl", "dt", "dd", "table", "tr", "blockquote", "pre", "form", "figure", "figcaption",
+             "h1", "h2", "h3", "h4", "h5", "h6"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.title: List[str] = []
+        self.skip_depth = 0
+        self.in_title = False
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if tag == "title":
+            self.in_title = True
+        elif tag in self.SKIP:
+            self.skip_depth += 1
+        elif tag in self.BLOCK:
+            self.parts.append("\n")
+            if tag == "li":
+                self.parts.append("- ")
+            elif tag[0] == "h" and tag[1:].isdigit():
+                self.parts.append("#" * int(tag[1:]) + " ")
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+        if tag in self.BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag: str):
+        if tag == "title":
+            self.in_title = False
+        elif tag in self.SKIP:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in self.BLOCK:
+            self.parts.append("\n")
+
+    def handle_data(self, data: str):
+        if self.in_title:
+            self.title.append(data)
+        elif not self.skip_depth:
+            self.parts.append(data)
+
+    def text(self) -> str:
+        lines = (" ".join(line.split()) for line in "".join(self.parts).splitlines())
+        body = re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+        title = " ".join("".join(self.title).split())
+        return f"{title}\n\n{body}" if title and body else title or body
+
+
+def extract_text(html: str) -> str:
+    parser = TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.text()
+
+
+def get_charset(content_type: str, body: bytes) -> str:
+    """Charset from the Content-Type header or a <meta> tag near the top, default utf-8"""
+    match = re.search(r"charset=[\"']?([\w.:-]+)", content_type, re.I)
+    if not match:
+        match = re.search(rb"<meta[^>]+charset=[\"']?([\w.:-]+)", body[:2048], re.I)
+        if match:
+            return match.group(1).decode("ascii")
+    return match.group(1) if match else "utf-8"
+
+
+def decode_body(body: bytes, content_encoding: str, max_bytes: int) -> Tuple[bytes, bool]:
+    """Undo gzip / deflate (capped at max_bytes of output). Returns (body, truncated)"""
+    encoding = content_encoding.strip().lower()
+    if encoding not in ("gzip", "x-gzip", "deflate"):
+        return body, False
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)  # gzip or zlib header
+    try:
+        data = decompressor.decompress(body, max_bytes)
+    except zlib.error:
+        # Raw deflate stream (no zlib header)
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        data = decompressor.decompress(body, max_bytes)
+    return data, bool(decompressor.unconsumed_tail)
+
+
+def is_text_content_type(content_type: str) -> bool:
+    content_type = content_type.split(";", 1)[0].strip().lower()
+    return not content_type or content_type.startswith(TEXT_CONTENT_TYPES) or content_type.endswith(("+xml", "+json"))
+
+
+def build_ssl_context(through_cache_proxy: bool) -> ssl.SSLContext:
+    """Trust the system store (or KAGAMI_CACHE_UPSTREAM_CA_FILE), plus the Kagami CA behind the caching proxy"""
+    context = ssl.create_default_context(cafile=os.environ.get("KAGAMI_CACHE_UPSTREAM_CA_FILE"))
+    kagami_ca = Path(KAGAMI_CA_DIR) / "kagami-ca.crt"
+    if through_cache_proxy and kagami_ca.exists():
+        context.load_verify_locations(cafile=str(kagami_ca))
+    return context
+
+
+class Fetcher:
+    """GETs through the local proxy with a keep-alive pool and bounded concurrency"""
+
+    def __init__(self, proxy_port: int, ssl_context: ssl.SSLContext, concurrency: int = DEFAULT_CONCURRENCY,
+                 max_bytes: int = DEFAULT_MAX_BYTES, timeout: float = DEFAULT_TIMEOUT):
+        self.concurrency = max(1, concurrency)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.pool = UpstreamPool("127.0.0.1", proxy_port, ssl_context, max_idle=self.concurrency)
+
+    def fetch_many(self, urls: List[str], fmt: str = "text", max_chars: int = DEFAULT_MAX_CHARS) -> List[Dict[str, Any]]:
+        """Fetch URLs concurrently; results in request order"""
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(urls)) or 1) as executor:
+            return list(executor.map(lambda url: self.fetch(url, fmt, max_chars), urls))
+
+    def fetch(self, url: str, fmt: str = "text", max_chars: int = DEFAULT_MAX_CHARS) -> Dict[str, Any]:
+        """
+        GET one URL (following redirects)
+        Returns {"url", "final_url", "status", "content_type", "bytes", "truncated", "elapsed_ms"} and
+        "content" or "error"
+        """
+        started = time.perf_counter()
+        result: Dict[str, Any] = {"url": url, "final_url": url, "status": None, "content_type": "", "bytes": 0,
+                                  "truncated": False}
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                status, headers, body, truncated = self.get(result["final_url"])
+                result.update(status=status, content_type=headers.get("content-type", ""))
+                location = headers.get("location")
+                if status in REDIRECT_STATUSES and location:
+                    result["final_url"] = urljoin(result["final_url"], location)
+                    continue
+                break
+            else:
+                raise ValueError(f"more than {MAX_REDIRECTS} redirects")
+
+            if body is None:
+                result["error"] = f"not fetched: {result['content_type'] or 'unknown'} content"
+            else:
+                body, inflated_truncated = decode_body(body, headers.get("content-encoding", ""), self.max_bytes)
+                text = body.decode(get_charset(result["content_type"], body), errors="replace")
+                if fmt == "text" and "html" in result["content_type"].lower():
+                    text = extract_text(text)
+                result["bytes"] = len(body)
+                result["truncated"] = truncated or inflated_truncated or len(text) > max_chars
+                result["content"] = text[:max_chars]
+        except (OSError, ssl.SSLError, http.client.HTTPException, ValueError, LookupError, zlib.error) as e:
+            result["error"] = str(e) or type(e).__name__
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000)
+        return result
+
+    def get(self, url: str) -> Tuple[int, Dict[str, str], Optional[bytes], bool]:
+        """One GET on a pooled connection. Returns (status, lowercase headers, body or None if not text, truncated)"""
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"unsupported URL: {url}")
+        port = parts.port or (443 if scheme == "https" else 80)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        if scheme == "http":
+            target = f"http://{parts.netloc}{target}"  # Absolute form for the forward proxy
+
+        for attempt in range(2):
+            conn, reused = self.pool.get(scheme, parts.hostname, port)
+            conn.timeout = self.timeout
+            if conn.sock:
+                conn.sock.settimeout(self.timeout)
+            try:
+                conn.putrequest("GET", target, skip_host=True, skip_accept_encoding=True)
+                conn.putheader("Host", parts.netloc)
+                conn.putheader("User-Agent", os.environ.get("KAGAMI_FETCH_USER_AGENT", USER_AGENT))
+                conn.putheader("Accept", "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8")
+                conn.putheader("Accept-Language", "en-US,en;q=0.5")
+                conn.putheader("Accept-Encoding", "gzip, deflate")
+                conn.endheaders()
+                response = conn.getresponse()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused or attempt:
+                    raise
+            except Exception:
+                conn.close()
+                raise
+
+        try:
+            headers = {name.lower(): value for name, value in response.getheaders()}
+            body = None
+            truncated = False
+            if response.status in REDIRECT_STATUSES:
+                response.read(self.max_bytes)
+            elif is_text_content_type(headers.get("content-type", "")):
+                body = response.read(self.max_bytes + 1)
+                truncated = len(body) > self.max_bytes
+                body = body[:self.max_bytes]
+        except Exception:
+            conn.close()
+            raise
+
+        if response.will_close or not response.isclosed():
+            conn.close()  # Body left unread (cap, skipped content type) or server closes
+        else:
+            self.pool.put(scheme, parts.hostname, port, conn)
+        return response.status, headers, body, truncated
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    """One URL as a text content item: a status line, then the content"""
+    url = result["url"] if result["final_url"] == result["url"] else f"{result['url']} → {result['final_url']}"
+    if "error" in result:
+        status = f"HTTP {result['status']}, " if result["status"] else ""
+        return f"## {url}\n({status}error: {result['error']}, {result['elapsed_ms']} ms)"
+    truncated = ", truncated" if result["truncated"] else ""
+    return (f"## {url}\n(HTTP {result['status']}, {result['content_type'] or 'no content type'}, "
+            f"{result['bytes']} bytes{truncated}, {result['elapsed_ms']} ms)\n\n{result['content']}")
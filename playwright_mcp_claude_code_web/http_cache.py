@@ -0,0 +1,279 @@
+"""
+Size-bounded on-disk HTTP cache (LRU) with Cache-Control / ETag handling
+
+Used by cache_proxy.py. Only the standard library is used.
+
+Layout: <cache_dir>/<sha256 key>.meta (JSON) and <key>.body (raw, still content-encoded)
+The LRU order is kept in memory and seeded from file mtimes on startup.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+# Statuses that may be stored (RFC 9111 heuristically cacheable subset)
+STORABLE_STATUSES = {200, 203, 301, 404, 410}
+
+# Heuristic freshness for responses with Last-Modified only: 10% of age, capped
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX_SECONDS = 24 * 3600
+
+Headers = List[Tuple[str, str]]
+
+
+def get_header(headers: Headers, name: str) -> Optional[str]:
+    """Get first header value (case-insensitive)"""
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """Parse Cache-Control header into {directive: argument}"""
+    directives: Dict[str, Optional[str]] = {}
+    if not value:
+        return directives
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            key, arg = part.split("=", 1)
+            directives[key.strip().lower()] = arg.strip().strip('"')
+        else:
+            directives[part.lower()] = None
+    return directives
+
+
+def parse_http_date(value: Optional[str]) -> Optional[float]:
+    """Parse HTTP date to epoch seconds"""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def is_request_cacheable(method: str, headers: Headers) -> bool:
+    """Whether a request may be answered from / stored in the cache"""
+    if method != "GET":
+        return False
+    if get_header(headers, "Range") or get_header(headers, "Authorization"):
+        return False
+    return "no-store" not in parse_cache_control(get_header(headers, "Cache-Control"))
+
+
+def request_wants_revalidation(headers: Headers) -> bool:
+    """Request Cache-Control: no-cache / max-age=0 or Pragma: no-cache"""
+    directives = parse_cache_control(get_header(headers, "Cache-Control"))
+    if "no-cache" in directives or directives.get("max-age") == "0":
+        return True
+    return (get_header(headers, "Pragma") or "").lower() == "no-cache"
+
+
+def is_response_storable(status: int, headers: Headers) -> bool:
+    """Whether a response may be stored"""
+    if status not in STORABLE_STATUSES:
+        return False
+    directives = parse_cache_control(get_header(headers, "Cache-Control"))
+    if "no-store" in directives or "private" in directives:
+        return False
+    # Replaying Set-Cookie would re-apply stale cookies
+    if get_header(headers, "Set-Cookie"):
+        return False
+    vary = get_header(headers, "Vary")
+    if vary and any(v.strip().lower() not in ("accept-encoding", "") for v in vary.split(",")):
+        return False
+    # Needs explicit freshness or a validator to be useful
+    return bool(
+        "max-age" in directives or "no-cache" in directives or get_header(headers, "Expires")
+        or get_header(headers, "ETag") or get_header(headers, "Last-Modified")
+    )
+
+
+def freshness_lifetime(headers: Headers) -> float:
+    """Freshness lifetime in seconds (0 = must revalidate)"""
+    directives = parse_cache_control(get_header(headers, "Cache-Control"))
+    if "no-cache" in directives:
+        return 0.0
+    if "max-age" in directives:
+        try:
+            return max(0.0, float(directives["max-age"] or 0))
+        except ValueError:
+            return 0.0
+
+    date = parse_http_date(get_header(headers, "Date")) or time.time()
+    expires = get_header(headers, "Expires")
+    if expires is not None:
+        expires_at = parse_http_date(expires)
+        return max(0.0, expires_at - date) if expires_at else 0.0
+
+    last_modified = parse_http_date(get_header(headers, "Last-Modified"))
+    if last_modified:
+        return min(HEURISTIC_MAX_SECONDS, max(0.0, (date - last_modified) * HEURISTIC_FRACTION))
+    return 0.0
+
+
+def build_meta(url: str, status: int, reason: str, headers: Headers, body_size: int) -> Dict[str, Any]:
+    """Build cache entry metadata for a response received now"""
+    now = time.time()
+    try:
+        age = float(get_header(headers, "Age") or 0)
+    except ValueError:
+        age = 0.0
+    return {
+        "url": url,
+        "status": status,
+        "reason": reason,
+        "headers": headers,
+        "size": body_size,
+        "stored_at": now,
+        "expires_at": now - age + freshness_lifetime(headers),
+    }
+
+
+def refresh_meta(meta: Dict[str, Any], not_modified_headers: Headers) -> Dict[str, Any]:
+    """Apply a 304 response's headers to a stored entry"""
+    updated = {name.lower(): (name, value) for name, value in not_modified_headers}
+    skip = {"content-length", "transfer-encoding", "content-encoding", "connection"}
+    headers = [
+        updated.pop(name.lower()) if name.lower() in updated and name.lower() not in skip else (name, value)
+        for name, value in meta["headers"]
+    ]
+    headers += [pair for key, pair in updated.items() if key not in skip]
+    return build_meta(meta["url"], meta["status"], meta["reason"], headers, meta["size"])
+
+
+class HttpCache:
+    """On-disk response cache with size-bounded LRU eviction (thread-safe)"""
+
+    def __init__(self, cache_dir: Path, max_bytes: int, max_object_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.lock = threading.Lock()
+        self.index: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {
+            "requests": 0,
+            "hits": 0,
+            "revalidated": 0,
+            "misses": 0,
+            "uncacheable": 0,
+            "stores": 0,
+            "evictions": 0,
+            "bytes_saved": 0,
+        }
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Seed LRU order from file mtimes"""
+        entries = []
+        for meta_path in self.cache_dir.glob("*.meta"):
+            body_path = meta_path.with_suffix(".body")
+            try:
+                entries.append((meta_path.stat().st_mtime, meta_path.stem, body_path.stat().st_size))
+            except OSError:
+                continue
+        for _, key, size in sorted(entries):
+            self.index[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    @staticmethod
+    def make_key(url: str, accept_encoding: Optional[str]) -> str:
+        """Cache key for a URL (and Accept-Encoding, the only supported Vary)"""
+        return hashlib.sha256(f"{url}\n{accept_encoding or ''}".encode("utf-8")).hexdigest()
+
+    def count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get entry metadata (marks entry as recently used)"""
+        with self.lock:
+            if key not in self.index:
+                return None
+            self.index.move_to_end(key)
+        try:
+            meta_path = self.cache_dir / f"{key}.meta"
+            with open(meta_path) as f:
+                meta = json.load(f)
+            os.utime(meta_path)
+            meta["headers"] = [tuple(pair) for pair in meta["headers"]]
+            return meta
+        except (OSError, ValueError):
+            self._remove(key)
+            return None
+
+    def read_body(self, key: str) -> Optional[bytes]:
+        """Read stored body"""
+        try:
+            with open(self.cache_dir / f"{key}.body", "rb") as f:
+                return f.read()
+        except OSError:
+            self._remove(key)
+            return None
+
+    def store(self, key: str, meta: Dict[str, Any], body: Optional[bytes]):
+        """Store entry (body None keeps the existing body, e.g. after revalidation)"""
+        if body is not None and len(body) > self.max_object_bytes:
+            return
+        try:
+            if body is not None:
+                self._write_atomic(self.cache_dir / f"{key}.body", body)
+            self._write_atomic(self.cache_dir / f"{key}.meta", json.dumps(meta).encode("utf-8"))
+        except OSError:
+            return
+
+        with self.lock:
+            self.total_bytes += meta["size"] - self.index.pop(key, 0)
+            self.index[key] = meta["size"]
+            if body is not None:
+                self.stats["stores"] += 1
+        self._evict()
+
+    def _write_atomic(self, path: Path, data: bytes):
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _remove(self, key: str):
+        with self.lock:
+            self.total_bytes -= self.index.pop(key, 0)
+        for suffix in (".meta", ".body"):
+            try:
+                (self.cache_dir / f"{key}{suffix}").unlink()
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Evict least recently used entries until under max_bytes"""
+        while True:
+            with self.lock:
+                if self.total_bytes <= self.max_bytes or not self.index:
+                    return
+                key = next(iter(self.index))
+                self.stats["evictions"] += 1
+            self._remove(key)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Metrics snapshot"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.index)
+            stats["size_bytes"] = self.total_bytes
+        served = stats["hits"] + stats["revalidated"]
+        cacheable = served + stats["misses"]
+        stats["hit_rate"] = round(served / cacheable, 3) if cacheable else 0.0
+        return stats
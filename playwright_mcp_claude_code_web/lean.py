@@ -0,0 +1,142 @@
+"""
+Lean browsing mode (KAGAMI_LEAN=1)
+
+Agents rarely need images, media, web fonts or third-party trackers. Lean mode combines:
+  - Firefox prefs (written to playwright-firefox-config.json by setup_mcp.py):
+    image loading, autoplay, downloadable fonts, prefetch/speculative connections,
+    telemetry and other background requests
+  - Chromium switches (playwright-chromium-config.json): the same where Chromium has one
+    (WebKit has no equivalent, only the proxy rules apply)
+  - Proxy deny rules, enforced by every local proxy tier:
+    - hosts (and subdomains): refused at CONNECT / request time
+    - content types: refused once the response head is seen (plain HTTP, or HTTPS
+      intercepted by the caching proxy)
+
+KAGAMI_BLOCK_HOSTS / KAGAMI_BLOCK_CONTENT_TYPES (comma-separated) replace the lean
+defaults and also work without KAGAMI_LEAN.
+
+Standard library only (also imported by proxy.py worker processes).
+"""
+import os
+from typing import Optional, Dict, Any, List
+
+LEAN_FIREFOX_PREFS: Dict[str, Any] = {
+    # Images, media, fonts
+    "permissions.default.image": 2,
+    "media.autoplay.default": 5,
+    "media.autoplay.blocking_policy": 2,
+    "gfx.downloadable_fonts.enabled": False,
+    "browser.display.use_document_fonts": 0,
+    # Prefetch and speculative connections
+    "network.prefetch-next": False,
+    "network.dns.disablePrefetch": True,
+    "network.predictor.enabled": False,
+    "network.http.speculative-parallel-limit": 0,
+    "browser.urlbar.speculativeConnect.enabled": False,
+    # Telemetry and background services
+    "toolkit.telemetry.enabled": False,
+    "toolkit.telemetry.unified": False,
+    "datareporting.healthreport.uploadEnabled": False,
+    "datareporting.policy.dataSubmissionEnabled": False,
+    "app.normandy.enabled": False,
+    "app.update.auto": False,
+    "extensions.update.enabled": False,
+    "browser.safebrowsing.malware.enabled": False,
+    "browser.safebrowsing.phishing.enabled": False,
+    "browser.safebrowsing.downloads.remote.enabled": False,
+    "network.captive-portal-service.enabled": False,
+    "network.connectivity-service.enabled": False,
+}
+
+LEAN_CHROMIUM_ARGS: List[str] = [
+    "--blink-settings=imagesEnabled=false",
+    "--autoplay-policy=user-gesture-required",
+    "--disable-remote-fonts",
+    "--dns-prefetch-disable",
+]
+
+DEFAULT_BLOCK_HOSTS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "connect.facebook.net",
+    "hotjar.com",
+    "segment.io",
+    "segment.com",
+    "mixpanel.com",
+    "amplitude.com",
+    "newrelic.com",
+    "nr-data.net",
+    "sentry.io",
+    "fullstory.com",
+    "clarity.ms",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+]
+
+DEFAULT_BLOCK_CONTENT_TYPES = [
+    "image/",
+    "video/",
+    "audio/",
+    "font/",
+    "application/font-",
+    "application/x-font-",
+    "application/vnd.ms-fontobject",
+]
+
+
+def is_lean_enabled() -> bool:
+    """Check if lean browsing mode is enabled (KAGAMI_LEAN)"""
+    return os.environ.get("KAGAMI_LEAN", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_firefox_prefs() -> Dict[str, Any]:
+    """Firefox prefs added in lean mode (empty otherwise)"""
+    return dict(LEAN_FIREFOX_PREFS) if is_lean_enabled() else {}
+
+
+def get_chromium_args() -> List[str]:
+    """Chromium switches added in lean mode (empty otherwise)"""
+    return list(LEAN_CHROMIUM_ARGS) if is_lean_enabled() else []
+
+
+def _env_list(name: str, default: List[str]) -> List[str]:
+    value = os.environ.get(name)
+    if value is None:
+        return list(default) if is_lean_enabled() else []
+    return [item.strip().lower() for item in value.split(",") if item.strip()]
+
+
+class DenyRules:
+    """Host and content-type deny rules"""
+
+    def __init__(self, hosts: List[str], content_types: List[str]):
+        self.hosts = [host.lower().lstrip(".") for host in hosts]
+        self.content_types = [content_type.lower() for content_type in content_types]
+
+    @classmethod
+    def from_env(cls) -> "DenyRules":
+        return cls(_env_list("KAGAMI_BLOCK_HOSTS", DEFAULT_BLOCK_HOSTS),
+                   _env_list("KAGAMI_BLOCK_CONTENT_TYPES", DEFAULT_BLOCK_CONTENT_TYPES))
+
+    def __bool__(self) -> bool:
+        return bool(self.hosts or self.content_types)
+
+    def blocks_host(self, host: Optional[str]) -> bool:
+        """Host equals or is a subdomain of a blocked host"""
+        if not host or not self.hosts:
+            return False
+        host = host.lower().rstrip(".")
+        return any(host == blocked or host.endswith(f".{blocked}") for blocked in self.hosts)
+
+    def blocks_content_type(self, content_type: Optional[str]) -> bool:
+        """Content-Type (without parameters) starts with a blocked prefix"""
+        if not content_type or not self.content_types:
+            return False
+        media_type = content_type.split(";", 1)[0].strip().lower()
+        return any(media_type.startswith(prefix) for prefix in self.content_types)
@@ -6,7 +6,7 @@
 Playwright MCP Server Launch Script for Claude Code (tools/list_changed workaround)
 
 Communication flow:
-  Claude Code → mcp.py (MCP Wrapper) → playwright-mcp (Firefox) → proxy.py → JWT Auth Proxy → Internet
+  Claude Code → mcp.py (MCP Wrapper) → playwright-mcp (Firefox, or KAGAMI_BROWSER) → proxy.py → JWT Auth Proxy → Internet
 
 This script:
   1. Returns full tool list immediately on first tools/list (avoiding Claude Code's tools/list_changed limitation)
@@ -20,22 +20,94 @@ This avoids Claude Code's lack of support for tools/list_changed notifications.
 import os
 import sys
 import json
+import copy
+import hashlib
 import subprocess
 import threading
 import time
 import atexit
+import shlex
+import shutil
 import signal
+import socket
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Callable
 
 # Global variables
 proxy_process = None
 playwright_mcp_process = None
+http_cache_server = None  # cache_proxy.CachingProxyServer (KAGAMI_HTTP_CACHE)
+builtin_proxy = None  # local_proxy.LocalProxy (KAGAMI_PROXY_BACKEND=builtin)
+fetcher = None  # fetch_many.Fetcher (created on the first kagami_fetch_many call)
+fetcher_lock = threading.Lock()
+proxy_lock = threading.Lock()  # Held while proxy.py is started or stopped outside setup
+proxy_users = 0  # Browser-less tool calls using the local proxy (an idle shutdown keeps proxy.py up)
+snapshot_cache = None  # snapshot_cache.SnapshotCache for playwright_mcp_process (KAGAMI_SNAPSHOT_CACHE)
+fetch_cache = None  # snapshot_cache.SnapshotCache for kagami_fetch_many results (KAGAMI_SNAPSHOT_CACHE)
 setup_completed = False
 setup_error = None
+daemon_mode = False  # Running inside daemon.py (the proxies then carry every session's traffic)
 write_lock = threading.Lock()
-playwright_tools: List[Dict[str, Any]] = []  # Tools fetched from playwright-mcp
+playwright_tools: List[Dict[str, Any]] = []  # Tools fetched from playwright-mcp (filtered by profile)
+playwright_tool_names: set = set()  # Names of tools exposed by the active profile
+child_tool_names: set = set()  # Names of every tool playwright-mcp reports (before profile filtering)
+tools_list_result_json: Optional[bytes] = None  # Pre-serialized tools/list "result" for the active profile
+child_lock = threading.Lock()  # Held while a request is in flight to playwright-mcp (and while recycling it)
+last_activity = time.time()  # Time the last playwright-mcp request finished
+stack_suspended = False  # Browser stack torn down after idle timeout (relaunched on next request)
+last_page_url: Optional[str] = None  # Last "Page URL" reported by playwright-mcp (restored after relaunch)
+storage_restore_pending = False  # KAGAMI_STORAGE_STATE not yet loaded into the current playwright-mcp
+record_file = None  # Session recording (KAGAMI_RECORD_FILE)
+record_lock = threading.Lock()
+record_start = time.monotonic()
+pending_requests: Dict[int, Dict[str, Any]] = {}  # Requests being handled (shown in profiling dumps)
+pending_lock = threading.Lock()
+wrapper_stats: Dict[str, Any] = {  # Reported via the kagami/stats method and on exit
+    "started_at": time.time(),
+    "memory": {"rss_bytes": 0, "peak_rss_bytes": 0, "limit_bytes": 0, "samples": 0},
+    "recycle_count": 0,
+    "recycles": [],  # Last 20 recycle events
+    "idle_shutdown": {"timeout_s": 0.0, "suspended": False, "shutdowns": 0, "relaunches": 0, "last_relaunch_s": None},
+    "storage_state": {"name": os.environ.get("KAGAMI_STORAGE_STATE"), "saves": 0, "restores": 0, "errors": 0, "last_restore_s": None},
+    "startup": {"node_compile_cache": None, "compile_cache_populated": None, "tools_fetch_s": None},
+    "network_idle": {"waits": 0, "idle": 0, "timeouts": 0, "waited_ms_total": 0},
+    "fetch_many": {"calls": 0, "urls": 0, "errors": 0, "truncated": 0, "bytes": 0,
+                   "connections_opened": 0, "connections_reused": 0},
+    "snapshot_cache": None,  # {"browser": ..., "fetch": ...} once enabled
+}
+stats_lock = threading.Lock()  # Guards wrapper_stats (updated by daemon sessions and background threads)
+
+# Wrapper tools served without playwright-mcp (they only go through the local proxies)
+BROWSERLESS_TOOLS = {"kagami_fetch_many", "kagami_wait_network_idle"}
+
+# Tool profiles (selected with KAGAMI_TOOL_PROFILE, or KAGAMI_TOOL_ALLOWLIST="name1,name2")
+# None means "every tool playwright-mcp reports"
+VISION_TOOLS = {
+    "browser_take_screenshot",
+    "browser_mouse_move_xy",
+    "browser_mouse_click_xy",
+    "browser_mouse_drag_xy",
+}
+TOOL_PROFILES: Dict[str, Any] = {
+    "full": None,
+    "core": {
+        "browser_navigate",
+        "browser_navigate_back",
+        "browser_snapshot",
+        "browser_click",
+        "browser_type",
+        "browser_press_key",
+        "browser_fill_form",
+        "browser_select_option",
+        "browser_hover",
+        "browser_handle_dialog",
+        "browser_wait_for",
+        "browser_tabs",
+        "browser_close",
+    },
+    "no-vision": lambda name: name not in VISION_TOOLS,
+}
 
 
 def log(message: str, level: str = "INFO"):
@@ -50,6 +122,135 @@ def log(message: str, level: str = "INFO"):
     print(f"[{timestamp}] {prefix} [MCP Wrapper] {message}", file=sys.stderr, flush=True)
 
 
+def env_int(name: str, default: int) -> int:
+    """Read integer environment variable"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        log(f"Invalid value for {name}, using {default}", "WARN")
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """Read float environment variable"""
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        log(f"Invalid value for {name}, using {default}", "WARN")
+        return default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    """Read boolean environment variable (1/true/yes/on)"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def get_tool_filter():
+    """
+    Resolve the active tool profile
+    Returns (profile label, predicate on tool name)
+    """
+    allowlist = os.environ.get("KAGAMI_TOOL_ALLOWLIST", "").strip()
+    if allowlist:
+        names = {name.strip() for name in allowlist.split(",") if name.strip()}
+        return "allowlist", lambda name: name in names
+
+    profile = os.environ.get("KAGAMI_TOOL_PROFILE", "full").strip() or "full"
+    if profile not in TOOL_PROFILES:
+        log(f"Unknown tool profile '{profile}', using 'full'", "WARN")
+        profile = "full"
+
+    selection = TOOL_PROFILES[profile]
+    if selection is None:
+        return profile, lambda name: True
+    if callable(selection):
+        return profile, selection
+    return profile, lambda name: name in selection
+
+
+def set_tool_catalog(tools: List[Dict[str, Any]]):
+    """
+    Filter the playwright-mcp catalog by the active profile and
+    pre-serialize the tools/list result once
+    """
+    global playwright_tools, playwright_tool_names, child_tool_names, tools_list_result_json
+
+    child_tool_names = {tool.get("name") for tool in tools}
+
+    profile, allowed = get_tool_filter()
+    # Wrapper tools are opt-in on their own, so the profile does not filter them
+    filtered = [tool for tool in tools if allowed(tool.get("name", ""))] + get_wrapper_tools()
+    playwright_tools = filtered
+    playwright_tool_names = {tool.get("name") for tool in filtered}
+    tools_list_result_json = json.dumps({"tools": filtered}).encode('utf-8')
+    log(f"Tool profile '{profile}': exposing {len(filtered)}/{len(tools)} tools "
+        f"({len(tools_list_result_json)} bytes)")
+
+
+def get_wrapper_tools() -> List[Dict[str, Any]]:
+    """Tools implemented by mcp.py itself (listed after the playwright-mcp tools)"""
+    tools = []
+    if is_storage_state_enabled():
+        if "browser_run_code" in child_tool_names:
+            from storage_state import TOOLS
+            tools += TOOLS
+        else:
+            log("playwright-mcp has no browser_run_code tool, storage state tools disabled", "WARN")
+    if is_network_activity_per_session() and env_bool("KAGAMI_NETWORK_IDLE_TOOL", True):
+        from network_idle import TOOLS
+        tools += TOOLS
+    if get_proxy_backend() != "none" and env_bool("KAGAMI_FETCH_TOOL", True):
+        from fetch_many import TOOLS
+        tools += TOOLS
+    return tools
+
+
+def build_tools_list_response(request_id: Any) -> bytes:
+    """Build serialized tools/list response from the pre-serialized result"""
+    return (b'{"jsonrpc": "2.0", "id": ' + json.dumps(request_id).encode('utf-8')
+            + b', "result": ' + tools_list_result_json + b'}\n')
+
+
+def get_proxy_backend() -> str:
+    """Local proxy backend: 'proxypy' (default), 'builtin' (in-process asyncio proxy) or 'none' (no local proxy)"""
+    return os.environ.get("KAGAMI_PROXY_BACKEND", "proxypy").strip() or "proxypy"
+
+
+def get_playwright_config_path() -> Path:
+    """playwright-mcp config file (KAGAMI_PLAYWRIGHT_CONFIG overrides the one written by setup_mcp.py)"""
+    from browsers import get_config_filename
+
+    override = os.environ.get("KAGAMI_PLAYWRIGHT_CONFIG")
+    return Path(override) if override else Path(__file__).parent / get_config_filename()
+
+
+def build_playwright_mcp_command(extra_args: List[str]) -> Optional[List[str]]:
+    """
+    Build playwright-mcp command line for the KAGAMI_BROWSER engine
+    KAGAMI_PLAYWRIGHT_MCP_CMD replaces the whole command (e.g. a replay stub)
+    Returns None if the config file does not exist
+    """
+    from browsers import get_cli_args
+
+    override = os.environ.get("KAGAMI_PLAYWRIGHT_MCP_CMD")
+    if override:
+        return shlex.split(override)
+
+    config_path = get_playwright_config_path()
+    if not config_path.exists():
+        log(f"Configuration file not found: {config_path}", "ERROR")
+        return None
+
+    return [
+        'node',
+        '/opt/node22/lib/node_modules/@playwright/mcp/cli.js',
+        '--config', str(config_path),
+    ] + get_cli_args() + extra_args
+
+
 def run_minimal_setup() -> bool:
     """
     Run minimal synchronous setup
@@ -66,7 +267,7 @@ def run_minimal_setup() -> bool:
             ["uv", "run", "python", str(setup_script)],
             capture_output=True,
             text=True,
-            env=os.environ.copy(),
+            env=get_child_env(),
             timeout=180
         )
         elapsed = time.time() - start_time
@@ -83,6 +284,28 @@ def run_minimal_setup() -> bool:
         return False
 
 
+def get_child_env() -> Dict[str, str]:
+    """Environment for setup scripts, proxy.py and playwright-mcp: the storage state key stays in the wrapper"""
+    env = os.environ.copy()
+    env.pop("KAGAMI_STORAGE_STATE_KEY", None)
+    return env
+
+
+def get_playwright_mcp_env() -> Dict[str, str]:
+    """
+    Environment for playwright-mcp processes
+    NODE_COMPILE_CACHE lets Node 22.1+ reuse compiled code across launches (populated by setup_mcp.py)
+    """
+    from browsers import get_node_compile_cache_dir
+
+    env = get_child_env()
+    env['HOME'] = '/home/user'
+    cache_dir = get_node_compile_cache_dir()
+    if cache_dir:
+        env['NODE_COMPILE_CACHE'] = str(cache_dir)
+    return env
+
+
 def fetch_tools_from_playwright_mcp() -> Optional[List[Dict[str, Any]]]:
     """
     Fetch tools list from playwright-mcp by starting a temporary process
@@ -91,24 +314,22 @@ def fetch_tools_from_playwright_mcp() -> Optional[List[Dict[str, Any]]]:
     try:
         log("Fetching tools from playwright-mcp...", "DEBUG")
 
-        script_dir = Path(__file__).parent
-        config_path = script_dir / "playwright-firefox-config.json"
-
-        if not config_path.exists():
-            log("Config file not found", "ERROR")
+        cmd = build_playwright_mcp_command(['--headless'])
+        if not cmd:
             return None
 
-        cmd = [
-            'node',
-            '/opt/node22/lib/node_modules/@playwright/mcp/cli.js',
-            '--config', str(config_path),
-            '--browser', 'firefox',
-            '--headless'
-        ]
+        from browsers import is_node_compile_cache_populated
 
-        env = os.environ.copy()
-        env['HOME'] = '/home/user'
+        env = get_playwright_mcp_env()
+        cache_dir = env.get('NODE_COMPILE_CACHE')
+        populated = is_node_compile_cache_populated(Path(cache_dir)) if cache_dir else None
+        with stats_lock:
+            startup = wrapper_stats["startup"]
+            startup["node_compile_cache"] = cache_dir
+            if cache_dir:
+                startup["compile_cache_populated"] = populated
 
+        start_time = time.time()
         temp_process = subprocess.Popen(
             cmd,
             stdin=subprocess.PIPE,
@@ -149,19 +370,28 @@ def fetch_tools_from_playwright_mcp() -> Optional[List[Dict[str, Any]]]:
 
             if tools_response and "result" in tools_response:
                 tools = tools_response["result"].get("tools", [])
-                log(f"Fetched {len(tools)} tools from playwright-mcp")
+                elapsed = time.time() - start_time
+                with stats_lock:
+                    wrapper_stats["startup"]["tools_fetch_s"] = round(elapsed, 3)
+                cache_state = {None: "off", True: "populated", False: "empty"}[populated]
+                log(f"Fetched {len(tools)} tools from playwright-mcp in {elapsed:.2f}s "
+                    f"(node compile cache: {cache_state})")
                 return tools
             else:
                 log("Failed to get tools from response", "WARN")
                 return None
 
         finally:
-            # Clean up temp process
+            # Clean up temp process (closing stdin lets Node exit cleanly and write its compile cache)
             try:
-                temp_process.terminate()
+                temp_process.stdin.close()
                 temp_process.wait(timeout=2)
             except:
-                temp_process.kill()
+                try:
+                    temp_process.terminate()
+                    temp_process.wait(timeout=2)
+                except:
+                    temp_process.kill()
 
     except Exception as e:
         log(f"Error fetching tools: {e}", "WARN")
@@ -170,13 +400,46 @@ def fetch_tools_from_playwright_mcp() -> Optional[List[Dict[str, Any]]]:
 
 
 
-def run_setup_script():
-    """Run setup script (background thread)"""
-    global setup_completed, setup_error, playwright_mcp_process
+def run_synchronous_setup():
+    """Minimal setup and tool catalog fetch (must complete before responding)"""
+    log("Running synchronous setup...")
+    if env_bool("KAGAMI_SKIP_SETUP", False):
+        # Environment already set up (or stub playwright-mcp): keep existing config
+        log("Skipping minimal setup (KAGAMI_SKIP_SETUP)")
+        load_tool_catalog()
+    elif not run_minimal_setup():
+        log("Synchronous setup failed - continuing with limited functionality", "WARN")
+    else:
+        load_tool_catalog()
 
-    try:
-        log("Starting background setup...")
+        # Delete temporary config file (will be recreated by setup_mcp.py)
+        temp_config = get_playwright_config_path()
+        if temp_config.exists():
+            temp_config.unlink()
+            log("Deleted temporary config file (will be recreated during full setup)")
+
+
+def load_tool_catalog():
+    """Fetch tools from playwright-mcp and cache them for the active profile"""
+    log("Fetching tools from playwright-mcp...")
+    tools = fetch_tools_from_playwright_mcp()
+    if tools:
+        set_tool_catalog(tools)
+        log(f"Successfully loaded {len(playwright_tools)} tools")
+    else:
+        log("Failed to fetch tools from playwright-mcp", "WARN")
+
+
+def run_full_setup() -> bool:
+    """
+    Run setup_mcp.py and start the local proxy
+    Sets setup_error and returns False on failure
+    """
+    global setup_error
 
+    if env_bool("KAGAMI_SKIP_SETUP", False):
+        log("Skipping setup script (KAGAMI_SKIP_SETUP)")
+    else:
         script_dir = Path(__file__).parent
         setup_script = script_dir / "setup_mcp.py"
 
@@ -185,7 +448,7 @@ def run_setup_script():
             ["uv", "run", "python", str(setup_script)],
             capture_output=True,
             text=True,
-            env=os.environ.copy()
+            env=get_child_env()
         )
         elapsed = time.time() - start_time
 
@@ -193,13 +456,33 @@ def run_setup_script():
             setup_error = f"Setup failed: {result.stderr}"
             log(f"Setup failed after {elapsed:.2f}s", "ERROR")
             log(setup_error, "ERROR")
-            return
+            return False
 
         log(f"Setup script completed in {elapsed:.2f}s")
 
-        # Start proxy and playwright-mcp
-        if not start_proxy():
-            setup_error = "Failed to start proxy.py"
+    # Start proxy
+    if get_proxy_backend() == "none":
+        log("Local proxy disabled (KAGAMI_PROXY_BACKEND=none)")
+        return True
+    if not start_proxy():
+        setup_error = "Failed to start proxy.py"
+        return False
+
+    if env_bool("KAGAMI_HTTP_CACHE", False) and not start_http_cache():
+        setup_error = "Failed to start HTTP cache"
+        return False
+
+    return True
+
+
+def run_setup_script():
+    """Run setup script (background thread)"""
+    global setup_completed, setup_error
+
+    try:
+        log("Starting background setup...")
+
+        if not run_full_setup():
             return
 
         if not start_playwright_mcp():
@@ -209,23 +492,153 @@ def run_setup_script():
         setup_completed = True
         log("Full setup completed successfully")
 
+        if env_int("KAGAMI_RSS_LIMIT_MB", 0) > 0:
+            threading.Thread(target=memory_watchdog, daemon=True).start()
+        if env_float("KAGAMI_IDLE_SHUTDOWN_SECONDS", 0.0) > 0:
+            threading.Thread(target=idle_shutdown_monitor, daemon=True).start()
+
     except Exception as e:
         setup_error = f"Error during setup: {e}"
         log(setup_error, "ERROR")
 
 
+def get_proxy_stats_dir() -> str:
+    """Directory where proxy.py plugin processes write metrics snapshots (per wrapper)"""
+    return os.environ.get("KAGAMI_PROXY_STATS_DIR", f"/tmp/kagami-proxy-stats-{os.getpid()}")
+
+
+def remove_proxy_stats_dir():
+    """Delete the proxy.py stats directory unless KAGAMI_PROXY_STATS_DIR points elsewhere"""
+    if "KAGAMI_PROXY_STATS_DIR" not in os.environ:
+        shutil.rmtree(get_proxy_stats_dir(), ignore_errors=True)
+
+
+def is_network_activity_per_session() -> bool:
+    """Local proxy activity reflects this session's browser only (not without a proxy, not in daemon mode)"""
+    return get_proxy_backend() != "none" and not daemon_mode
+
+
+def get_network_activity() -> List[Tuple[int, float, int]]:
+    """(in flight, last activity, requests) of every local proxy tier the browser traffic goes through"""
+    from network_idle import read_activity_files
+
+    states = [proxy.activity.state() for proxy in (builtin_proxy, http_cache_server) if proxy]
+    if get_proxy_backend() == "proxypy":
+        states += read_activity_files(Path(get_proxy_stats_dir()))
+    return states
+
+
+def collect_proxy_stats() -> Dict[str, Any]:
+    """
+    Aggregate per-upstream-host metrics written by proxy_plugins.MetricsProxyPoolPlugin
+    (or kept in-process by the builtin proxy)
+    Returns hosts sorted by bytes received (top 50)
+    """
+    if builtin_proxy:
+        snapshot = builtin_proxy.snapshot()
+        return dict(summarize_proxy_hosts(snapshot["hosts"]), totals=snapshot["totals"], upstreams=snapshot["upstreams"])
+
+    hosts: Dict[str, Dict[str, float]] = {}
+    stats_dir = Path(get_proxy_stats_dir())
+
+    for snapshot_path in stats_dir.glob("*.json"):
+        try:
+            with open(snapshot_path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for host, metrics in snapshot.get("hosts", {}).items():
+            total = hosts.setdefault(host, {})
+            for key, value in metrics.items():
+                if key.endswith("_max"):
+                    total[key] = max(total.get(key, 0.0), value)
+                else:
+                    total[key] = total.get(key, 0) + value
+
+    return summarize_proxy_hosts(hosts)
+
+
+def summarize_proxy_hosts(hosts: Dict[str, Dict[str, float]]) -> Dict[str, Any]:
+    """Turn raw per-host counters into averages, sorted by bytes received (top 50)"""
+    result = []
+    for host, metrics in hosts.items():
+        entry = {
+            "host": host,
+            "connections": metrics.get("connections", 0),
+            "bytes_in": metrics.get("bytes_in", 0),
+            "bytes_out": metrics.get("bytes_out", 0),
+            "errors": metrics.get("errors", 0),
+            "blocked": metrics.get("blocked", 0),
+        }
+        for name in ("upstream_connect", "first_byte"):
+            samples = metrics.get(f"{name}_samples", 0)
+            entry[f"{name}_ms_avg"] = round(metrics.get(f"{name}_ms_total", 0.0) / samples, 1) if samples else None
+            entry[f"{name}_ms_max"] = round(metrics.get(f"{name}_ms_max", 0.0), 1)
+        result.append(entry)
+
+    result.sort(key=lambda entry: entry["bytes_in"], reverse=True)
+    return {
+        "hosts": result[:50],
+        "host_count": len(result),
+        "blocked": sum(metrics.get("blocked", 0) for metrics in hosts.values()),
+        "blocked_bytes": sum(metrics.get("blocked_bytes", 0) for metrics in hosts.values()),
+    }
+
+
+def wait_for_port(port: int, timeout: float, process: Optional[subprocess.Popen] = None) -> bool:
+    """Poll until localhost:port accepts connections (False on timeout or if process exits)"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process and process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def get_upstream_proxies() -> List[str]:
+    """Upstream proxy URLs: KAGAMI_UPSTREAM_PROXIES (comma-separated) or HTTPS_PROXY"""
+    upstreams = [url.strip() for url in os.environ.get("KAGAMI_UPSTREAM_PROXIES", "").split(",") if url.strip()]
+    if upstreams:
+        return upstreams
+    https_proxy = os.environ.get('HTTPS_PROXY', '')
+    return [https_proxy] if https_proxy else []
+
+
 def start_proxy():
-    """Start proxy.py"""
+    """Start local proxy on localhost:18915 (proxy.py or builtin)"""
     global proxy_process
 
-    # Check HTTPS_PROXY environment variable
-    https_proxy = os.environ.get('HTTPS_PROXY', '')
-    if not https_proxy:
+    # Upstream proxies (HTTPS_PROXY or KAGAMI_UPSTREAM_PROXIES)
+    upstreams = get_upstream_proxies()
+    if not upstreams:
         log("HTTPS_PROXY environment variable not set", "ERROR")
         return False
 
+    if get_proxy_backend() == "builtin":
+        return start_builtin_proxy(upstreams)
+
     log("Starting proxy.py...")
 
+    # Kagami plugins (proxy_plugins.py) are importable from this directory
+    env = get_child_env()
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(Path(__file__).parent), env.get("PYTHONPATH")]))
+    env["KAGAMI_PROXY_STATS_DIR"] = get_proxy_stats_dir()
+
+    if env_bool("KAGAMI_PROXY_METRICS", True):
+        plugin = "proxy_plugins.MetricsProxyPoolPlugin"
+    else:
+        plugin = "proxy.plugin.proxy_pool.ProxyPoolPlugin"
+
+    # ProxyPoolPlugin picks a random pool entry per connection (no health or latency tracking)
+    pool_args = [arg for url in upstreams for arg in ("--proxy-pool", url)]
+    if len(upstreams) > 1:
+        log(f"proxy.py picks one of {len(upstreams)} upstream proxies at random; "
+            f"KAGAMI_PROXY_BACKEND=builtin selects by health and latency", "WARN")
+
     try:
         start_time = time.time()
         proxy_process = subprocess.Popen(
@@ -233,15 +646,17 @@ def start_proxy():
                 "uv", "run", "proxy",
                 "--hostname", "127.0.0.1",
                 "--port", "18915",
-                "--plugins", "proxy.plugin.proxy_pool.ProxyPoolPlugin",
-                "--proxy-pool", https_proxy
-            ],
+                "--plugins", plugin,
+            ] + pool_args,
             stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
+            stderr=subprocess.DEVNULL,
+            env=env
         )
 
-        # Wait for proxy.py to start
-        time.sleep(2)
+        # Wait until proxy.py accepts connections
+        if not wait_for_port(18915, env_float("KAGAMI_PROXY_START_TIMEOUT", 15.0), proxy_process):
+            log("proxy.py did not start listening on localhost:18915", "ERROR")
+            return False
         elapsed = time.time() - start_time
         log(f"proxy.py started successfully in {elapsed:.2f}s (localhost:18915)")
         return True
@@ -251,29 +666,94 @@ def start_proxy():
         return False
 
 
+def start_builtin_proxy(upstream_urls: List[str]) -> bool:
+    """Start in-process asyncio proxy (localhost:18915 → HTTPS_PROXY or KAGAMI_UPSTREAM_PROXIES)"""
+    global builtin_proxy
+
+    from lean import DenyRules
+    from local_proxy import LocalProxy, UpstreamProxy
+
+    log("Starting builtin proxy...")
+
+    try:
+        start_time = time.time()
+        upstreams = [UpstreamProxy(url) for url in upstream_urls]
+        selection = os.environ.get("KAGAMI_UPSTREAM_SELECTION", "ewma").strip().lower() or "ewma"
+        proxy = LocalProxy(
+            upstreams,
+            port=18915,
+            idle_target=env_int("KAGAMI_PROXY_IDLE_CONNECTIONS", 2),
+            idle_ttl=env_float("KAGAMI_PROXY_IDLE_TTL", 20.0),
+            deny_rules=DenyRules.from_env(),
+            selection=selection,
+            probe_interval=env_float("KAGAMI_UPSTREAM_PROBE_INTERVAL", 10.0),
+            probe_target=os.environ.get("KAGAMI_UPSTREAM_PROBE_TARGET") or None
+        )
+        proxy.start()
+        builtin_proxy = proxy
+        elapsed = time.time() - start_time
+        labels = ", ".join(upstream.label for upstream in upstreams)
+        detail = f", {selection} selection" if len(upstreams) > 1 else ""
+        log(f"Builtin proxy started successfully in {elapsed:.3f}s (localhost:18915 → {labels}{detail})")
+        return True
+
+    except Exception as e:
+        log(f"Builtin proxy startup error: {e}", "ERROR")
+        return False
+
+
+def get_playwright_mcp_args() -> List[str]:
+    """playwright-mcp arguments for a full (non tools/list) launch"""
+    if get_proxy_backend() == "none":
+        return []
+    if env_bool("KAGAMI_HTTP_CACHE", False):
+        return ['--proxy-server', 'http://127.0.0.1:18916']
+    return ['--proxy-server', 'http://127.0.0.1:18915']
+
+
+def start_http_cache() -> bool:
+    """Start caching proxy tier (localhost:18916 → proxy.py) in background threads"""
+    global http_cache_server
+
+    from cache_proxy import start_caching_proxy
+    from lean import DenyRules
+
+    cache_dir = Path(os.environ.get("KAGAMI_CACHE_DIR", "/home/user/.cache/kagami-http"))
+    bypass_hosts = [h.strip() for h in os.environ.get("KAGAMI_CACHE_BYPASS_HOSTS", "").split(",") if h.strip()]
+
+    try:
+        start_time = time.time()
+        http_cache_server = start_caching_proxy(
+            listen_port=18916,
+            upstream_port=18915,
+            cache_dir=cache_dir,
+            max_bytes=env_int("KAGAMI_CACHE_SIZE_MB", 512) * 1024 * 1024,
+            max_object_bytes=env_int("KAGAMI_CACHE_MAX_OBJECT_MB", 16) * 1024 * 1024,
+            bypass_hosts=bypass_hosts,
+            upstream_ca_file=os.environ.get("KAGAMI_CACHE_UPSTREAM_CA_FILE"),
+            deny_rules=DenyRules.from_env()
+        )
+        elapsed = time.time() - start_time
+        interception = "on" if http_cache_server.ca.available() else "off (Kagami CA missing, HTTPS not cached)"
+        log(f"HTTP cache started in {elapsed:.2f}s (localhost:18916, {cache_dir}, TLS interception {interception})")
+        return True
+
+    except Exception as e:
+        log(f"HTTP cache startup error: {e}", "ERROR")
+        return False
+
+
 def start_playwright_mcp():
     """Start playwright-mcp"""
-    global playwright_mcp_process
+    global playwright_mcp_process, storage_restore_pending, snapshot_cache
 
-    script_dir = Path(__file__).parent
-    config_path = str(script_dir / "playwright-firefox-config.json")
-
-    if not os.path.exists(config_path):
-        log(f"Configuration file not found: {config_path}", "ERROR")
+    cmd = build_playwright_mcp_command(get_playwright_mcp_args())
+    if not cmd:
         return False
 
     log("Starting playwright-mcp...")
 
-    cmd = [
-        'node',
-        '/opt/node22/lib/node_modules/@playwright/mcp/cli.js',
-        '--config', config_path,
-        '--browser', 'firefox',
-        '--proxy-server', 'http://127.0.0.1:18915'
-    ]
-
-    env = os.environ.copy()
-    env['HOME'] = '/home/user'
+    env = get_playwright_mcp_env()
 
     try:
         start_time = time.time()
@@ -288,6 +768,12 @@ def start_playwright_mcp():
 
         elapsed = time.time() - start_time
         log(f"playwright-mcp started successfully in {elapsed:.2f}s")
+        # Loaded before the first forwarded request (KAGAMI_STORAGE_STATE)
+        storage_restore_pending = bool(os.environ.get("KAGAMI_STORAGE_STATE"))
+        if snapshot_cache:
+            snapshot_cache.browser_restarted()
+        elif is_snapshot_cache_enabled():
+            snapshot_cache = new_snapshot_cache("browser")
         return True
 
     except Exception as e:
@@ -296,10 +782,29 @@ def start_playwright_mcp():
 
 
 def stop_processes():
-    """Stop proxy.py and playwright-mcp"""
+    """Stop local proxy and playwright-mcp"""
     global proxy_process, playwright_mcp_process
 
+    memory = wrapper_stats["memory"]
+    if memory["samples"]:
+        log(f"Memory: peak playwright-mcp RSS {memory['peak_rss_bytes'] / (1024 * 1024):.0f} MB, "
+            f"{wrapper_stats['recycle_count']} recycle(s)")
+
+    if http_cache_server:
+        cache_stats = http_cache_server.snapshot()
+        log(f"HTTP cache: hit rate {cache_stats['hit_rate']:.1%}, {cache_stats['bytes_saved'] / (1024 * 1024):.1f} MB saved")
+
+    lean_stats = collect_lean_stats(collect_proxy_stats(), http_cache_server.snapshot() if http_cache_server else None)
+    if lean_stats["blocked_requests"]:
+        log(f"Lean mode: {lean_stats['blocked_requests']} request(s) blocked, "
+            f"{lean_stats['blocked_bytes'] / (1024 * 1024):.1f} MB of known response size avoided")
+
     if playwright_mcp_process:
+        if child_lock.acquire(blocking=False):
+            try:
+                auto_save_storage_state(playwright_mcp_process)
+            finally:
+                child_lock.release()
         log("Stopping playwright-mcp...")
         try:
             playwright_mcp_process.terminate()
@@ -315,6 +820,739 @@ def stop_processes():
         except:
             proxy_process.kill()
 
+    # Also after an idle shutdown already stopped proxy.py
+    if get_proxy_backend() == "proxypy":
+        remove_proxy_stats_dir()
+
+    if builtin_proxy:
+        log("Stopping builtin proxy...")
+        builtin_proxy.stop()
+
+
+def get_process_tree_rss(root_pid: int) -> int:
+    """
+    Sum RSS (bytes) of a process and all its descendants from /proc
+    Returns 0 if /proc is unavailable
+    """
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return 0
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            # comm may contain spaces and parentheses: fields start after the last ')'
+            ppid = int(stat[stat.rfind(")") + 2:].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+
+    total = 0
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            continue
+        pending.extend(children.get(pid, []))
+    return total
+
+
+def get_user_data_dir() -> Optional[Path]:
+    """Read browser userDataDir from the playwright-mcp config file"""
+    try:
+        with open(get_playwright_config_path()) as f:
+            config = json.load(f)
+        user_data_dir = config.get("browser", {}).get("userDataDir")
+        return Path(user_data_dir) if user_data_dir else None
+    except Exception:
+        return None
+
+
+def clear_browser_storage():
+    """Remove cookies and site storage from the browser profile (keeps CA certificates)"""
+    from browsers import get_storage_paths
+
+    profile_dir = get_user_data_dir()
+    if not profile_dir or not profile_dir.exists():
+        return
+
+    for path in get_storage_paths(profile_dir):
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+    log(f"Cleared browser storage in {profile_dir}")
+
+
+def recycle_playwright_mcp(reason: str) -> bool:
+    """
+    Restart playwright-mcp (and its browser)
+    Caller must hold child_lock so no request is in flight
+    """
+    global playwright_mcp_process
+
+    preserve_storage = env_bool("KAGAMI_RECYCLE_PRESERVE_STORAGE", True)
+    log(f"Recycling playwright-mcp ({reason}, preserve storage: {preserve_storage})", "WARN")
+
+    start_time = time.time()
+    auto_save_storage_state(playwright_mcp_process)
+    if playwright_mcp_process:
+        try:
+            playwright_mcp_process.terminate()
+            playwright_mcp_process.wait(timeout=5)
+        except:
+            playwright_mcp_process.kill()
+        playwright_mcp_process = None
+
+    if not preserve_storage:
+        clear_browser_storage()
+
+    success = start_playwright_mcp()
+    elapsed = time.time() - start_time
+    with stats_lock:
+        wrapper_stats["recycles"].append({
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "reason": reason,
+            "duration_s": round(elapsed, 3),
+            "success": success,
+        })
+        wrapper_stats["recycle_count"] += 1
+        del wrapper_stats["recycles"][:-20]
+    log(f"playwright-mcp recycled in {elapsed:.2f}s" if success else "playwright-mcp recycle failed",
+        "INFO" if success else "ERROR")
+    return success
+
+
+def memory_watchdog():
+    """
+    Sample RSS of the playwright-mcp process tree (background thread)
+    When the limit is exceeded, recycle playwright-mcp at the next idle gap between calls
+    """
+    limit_bytes = env_int("KAGAMI_RSS_LIMIT_MB", 0) * 1024 * 1024
+    interval = env_float("KAGAMI_RSS_CHECK_INTERVAL", 5.0)
+    idle_gap = env_float("KAGAMI_RECYCLE_IDLE_SECONDS", 1.0)
+    memory = wrapper_stats["memory"]
+    with stats_lock:
+        memory["limit_bytes"] = limit_bytes
+    recycle_pending = False
+
+    log(f"Memory watchdog started (limit: {limit_bytes // (1024 * 1024)} MB, interval: {interval}s)")
+
+    while True:
+        time.sleep(interval)
+
+        process = playwright_mcp_process
+        if not setup_completed or not process or process.poll() is not None:
+            continue
+
+        rss = get_process_tree_rss(process.pid)
+        with stats_lock:
+            memory["rss_bytes"] = rss
+            memory["peak_rss_bytes"] = max(memory["peak_rss_bytes"], rss)
+            memory["samples"] += 1
+
+        if not recycle_pending and rss > limit_bytes:
+            log(f"playwright-mcp RSS {rss / (1024 * 1024):.0f} MB exceeds limit, "
+                f"recycling at next idle gap", "WARN")
+            recycle_pending = True
+
+        if not recycle_pending or time.time() - last_activity < idle_gap:
+            continue
+
+        # Only recycle between calls: skip this round if a request is in flight
+        if not child_lock.acquire(blocking=False):
+            continue
+        try:
+            recycle_playwright_mcp(f"RSS {rss / (1024 * 1024):.0f} MB over limit")
+            recycle_pending = False
+        finally:
+            child_lock.release()
+
+
+def terminate_process(process: subprocess.Popen):
+    """Terminate a child process (kill if it does not exit within 5s)"""
+    try:
+        process.terminate()
+        process.wait(timeout=5)
+    except:
+        process.kill()
+
+
+def suspend_browser_stack(idle_for: float):
+    """
+    Stop playwright-mcp (and Firefox) and proxy.py after an idle timeout
+    The tool catalog stays cached; the stack is relaunched on the next request
+    Caller must hold child_lock so no request is in flight
+    """
+    global playwright_mcp_process, proxy_process, stack_suspended
+
+    preserve_storage = env_bool("KAGAMI_IDLE_PRESERVE_STORAGE", True)
+    log(f"Idle for {idle_for:.0f}s, shutting down browser stack (preserve storage: {preserve_storage})")
+
+    auto_save_storage_state(playwright_mcp_process)
+    if playwright_mcp_process:
+        terminate_process(playwright_mcp_process)
+        playwright_mcp_process = None
+    # The builtin proxy and the HTTP cache run in-process and stay up
+    with proxy_lock:
+        # proxy.py stays up while a browser-less tool is using it
+        if proxy_process and not proxy_users:
+            terminate_process(proxy_process)
+            proxy_process = None
+            # The relaunched proxy.py starts from empty metrics and activity files
+            remove_proxy_stats_dir()
+
+    if not preserve_storage:
+        clear_browser_storage()
+
+    stack_suspended = True
+    with stats_lock:
+        idle_stats = wrapper_stats["idle_shutdown"]
+        idle_stats["suspended"] = True
+        idle_stats["shutdowns"] += 1
+
+
+def resume_browser_stack(request: Dict[str, Any]) -> bool:
+    """
+    Relaunch the browser stack before forwarding request
+    Navigates back to the last page unless the request navigates itself (KAGAMI_IDLE_RESTORE_PAGE)
+    Caller must hold child_lock
+    """
+    global stack_suspended
+
+    log("Relaunching browser stack...")
+    start_time = time.time()
+
+    with proxy_lock:
+        if get_proxy_backend() == "proxypy" and not proxy_process and not start_proxy():
+            return False
+    if not start_playwright_mcp():
+        return False
+    stack_suspended = False
+
+    # Cookies first, so the restored page loads logged in
+    if storage_restore_pending:
+        auto_restore_storage_state(playwright_mcp_process)
+
+    tool_name = (request.get("params") or {}).get("name")
+    if last_page_url and tool_name != "browser_navigate" and env_bool("KAGAMI_IDLE_RESTORE_PAGE", True):
+        call_child_tool(playwright_mcp_process, "browser_navigate", {"url": last_page_url}, "kagami-restore-page")
+
+    elapsed = time.time() - start_time
+    with stats_lock:
+        idle_stats = wrapper_stats["idle_shutdown"]
+        idle_stats["suspended"] = False
+        idle_stats["relaunches"] += 1
+        idle_stats["last_relaunch_s"] = round(elapsed, 3)
+    log(f"Browser stack relaunched in {elapsed:.2f}s")
+    return True
+
+
+def remember_page_url(response: Optional[Dict[str, Any]]):
+    """Track the current page from playwright-mcp's "Page URL: ..." response text"""
+    global last_page_url
+
+    result = (response or {}).get("result")
+    if not isinstance(result, dict):
+        return
+    for item in result.get("content") or []:
+        text = item.get("text") if isinstance(item, dict) else None
+        if text and "Page URL: " in text:
+            words = text.split("Page URL: ", 1)[1].split()
+            if words and words[0].startswith(("http://", "https://")):
+                last_page_url = words[0]
+            return
+
+
+def idle_shutdown_monitor():
+    """Tear down the browser stack after KAGAMI_IDLE_SHUTDOWN_SECONDS without requests (background thread)"""
+    timeout = env_float("KAGAMI_IDLE_SHUTDOWN_SECONDS", 0.0)
+    with stats_lock:
+        wrapper_stats["idle_shutdown"]["timeout_s"] = timeout
+    log(f"Idle shutdown enabled (timeout: {timeout:.0f}s)")
+
+    while True:
+        time.sleep(min(timeout, 5.0))
+
+        idle_for = time.time() - last_activity
+        if stack_suspended or not playwright_mcp_process or idle_for < timeout:
+            continue
+
+        # Only between calls: skip this round if a request is in flight
+        if not child_lock.acquire(blocking=False):
+            continue
+        try:
+            if not stack_suspended and time.time() - last_activity >= timeout:
+                suspend_browser_stack(idle_for)
+        finally:
+            child_lock.release()
+
+
+def is_storage_state_enabled() -> bool:
+    """Storage state tools are listed when KAGAMI_STORAGE_STATE or KAGAMI_STORAGE_TOOLS is set"""
+    return bool(os.environ.get("KAGAMI_STORAGE_STATE")) or env_bool("KAGAMI_STORAGE_TOOLS", False)
+
+
+def call_child_tool(process: subprocess.Popen, name: str, arguments: Dict[str, Any],
+                    request_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Call a playwright-mcp tool on behalf of the wrapper
+    Caller must own the process's pipes (child_lock, or the daemon session's worker)
+    """
+    request = {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": "tools/call",
+        "params": {"name": name, "arguments": arguments}
+    }
+    write_jsonrpc_message(process.stdin, request)
+    return read_jsonrpc_message(process.stdout)
+
+
+def save_storage_state(process: subprocess.Popen, name: str, sites: Optional[List[str]] = None,
+                       ttl: Optional[float] = None) -> List[str]:
+    """Save the browser's cookies and localStorage under name (raises StorageStateError)"""
+    from storage_state import StorageStateStore, SAVE_CODE, parse_run_code_result
+
+    response = call_child_tool(process, "browser_run_code", {"code": SAVE_CODE}, "kagami-storage-save")
+    state = parse_run_code_result(response)
+    saved = StorageStateStore.from_env().save(name, state, sites, ttl)
+    update_stats("storage_state", saves=1)
+    return saved
+
+
+def restore_storage_state(process: subprocess.Popen, name: str, sites: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Load the named state into the browser context (raises StorageStateError)"""
+    from storage_state import StorageStateStore, build_restore_code, parse_run_code_result
+
+    state = StorageStateStore.from_env().restore_state(name, sites)
+    if not state["cookies"] and not state["origins"]:
+        return {"cookies": 0, "origins": 0}
+
+    start_time = time.time()
+    response = call_child_tool(process, "browser_run_code", {"code": build_restore_code(state)},
+                               "kagami-storage-restore")
+    restored = parse_run_code_result(response)
+    with stats_lock:
+        storage_stats = wrapper_stats["storage_state"]
+        storage_stats["restores"] += 1
+        storage_stats["last_restore_s"] = round(time.time() - start_time, 3)
+    return restored
+
+
+def auto_restore_storage_state(process: subprocess.Popen):
+    """Load KAGAMI_STORAGE_STATE into a freshly launched playwright-mcp"""
+    global storage_restore_pending
+
+    from storage_state import StorageStateError
+
+    storage_restore_pending = False
+    name = os.environ.get("KAGAMI_STORAGE_STATE")
+    if not name or "browser_run_code" not in child_tool_names:
+        return
+    try:
+        restored = restore_storage_state(process, name)
+        if restored.get("cookies") or restored.get("origins"):
+            log(f"Storage state '{name}' restored ({restored.get('cookies')} cookie(s), "
+                f"{restored.get('origins')} origin(s))")
+    except StorageStateError as e:
+        update_stats("storage_state", errors=1)
+        log(f"Storage state '{name}' restore failed: {e}", "WARN")
+
+
+def auto_save_storage_state(process: Optional[subprocess.Popen], timeout: float = 15.0):
+    """
+    Save KAGAMI_STORAGE_STATE before playwright-mcp is stopped (KAGAMI_STORAGE_STATE_AUTOSAVE)
+    Gives up after timeout so a hung browser cannot block shutdown
+    """
+    from storage_state import StorageStateError
+
+    name = os.environ.get("KAGAMI_STORAGE_STATE")
+    if (not name or not process or process.poll() is not None or "browser_run_code" not in child_tool_names
+            or not env_bool("KAGAMI_STORAGE_STATE_AUTOSAVE", True)):
+        return
+
+    def save():
+        try:
+            sites = save_storage_state(process, name)
+            log(f"Storage state '{name}' saved ({len(sites)} site(s))")
+        except StorageStateError as e:
+            update_stats("storage_state", errors=1)
+            log(f"Storage state '{name}' save failed: {e}", "WARN")
+
+    thread = threading.Thread(target=save, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        log(f"Storage state '{name}' save timed out after {timeout:.0f}s", "WARN")
+
+
+def is_wrapper_tool(request: Dict[str, Any]) -> bool:
+    """tools/call for a tool implemented by the wrapper"""
+    return (request.get("method") == "tools/call"
+            and str((request.get("params") or {}).get("name", "")).startswith("kagami_"))
+
+
+def is_browserless_tool(request: Dict[str, Any]) -> bool:
+    """tools/call for a wrapper tool that only needs the local proxies (never starts the browser)"""
+    return (request.get("method") == "tools/call"
+            and (request.get("params") or {}).get("name") in BROWSERLESS_TOOLS)
+
+
+def run_browserless_tool(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Handle kagami_fetch_many / kagami_wait_network_idle without playwright-mcp
+    Brings proxy.py back if an idle shutdown stopped it, but leaves the browser suspended
+    """
+    global proxy_users
+
+    name = request["params"]["name"]
+    arguments = request["params"].get("arguments") or {}
+    with proxy_lock:
+        if get_proxy_backend() == "proxypy" and not proxy_process and not start_proxy():
+            return {"jsonrpc": "2.0", "id": request.get("id"),
+                    "result": {"content": [{"type": "text", "text": "Error: local proxy failed to start"}],
+                               "isError": True}}
+        proxy_users += 1
+    try:
+        if name == "kagami_wait_network_idle" and is_network_activity_per_session():
+            result = run_wait_network_idle(arguments)
+        elif name == "kagami_fetch_many":
+            result = run_fetch_many(arguments)
+        else:
+            result = {"content": [{"type": "text", "text": f"Error: {name} is not available"}], "isError": True}
+    except Exception as e:
+        log(f"{name} failed: {e}", "ERROR")
+        result = {"content": [{"type": "text", "text": f"Error: {e}"}], "isError": True}
+    finally:
+        with proxy_lock:
+            proxy_users -= 1
+    return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+
+def run_wrapper_tool(request: Dict[str, Any], process: subprocess.Popen) -> Dict[str, Any]:
+    """Handle a tools/call for a tool implemented by the wrapper (caller owns the process's pipes)"""
+    from storage_state import StorageStateStore, StorageStateError, parse_sites, parse_ttl
+
+    if is_browserless_tool(request):
+        return run_browserless_tool(request)
+
+    params = request.get("params") or {}
+    name = params.get("name")
+    arguments = params.get("arguments") or {}
+    try:
+        if name == "kagami_storage_save":
+            sites = save_storage_state(process, str(arguments.get("name", "")), parse_sites(arguments.get("sites")),
+                                       parse_ttl(arguments.get("ttl_seconds")))
+            text = f"Saved {len(sites)} site(s) to '{arguments.get('name')}': {', '.join(sites) or '(none)'}"
+        elif name == "kagami_storage_restore":
+            restored = restore_storage_state(process, str(arguments.get("name", "")),
+                                             parse_sites(arguments.get("sites")))
+            text = (f"Restored {restored.get('cookies', 0)} cookie(s) and {restored.get('origins', 0)} "
+                    f"localStorage origin(s) from '{arguments.get('name')}'")
+        elif name == "kagami_storage_list":
+            text = json.dumps(StorageStateStore.from_env().list(), indent=2)
+        else:
+            raise StorageStateError(f"unknown tool '{name}'")
+        result = {"content": [{"type": "text", "text": text}]}
+    except StorageStateError as e:
+        update_stats("storage_state", errors=1)
+        result = {"content": [{"type": "text", "text": f"Error: {e}"}], "isError": True}
+
+    return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+
+def run_wait_network_idle(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """kagami_wait_network_idle: wait for quiet local proxies (tools/call result)"""
+    from network_idle import DEFAULT_IDLE_MS, DEFAULT_TIMEOUT_MS, MAX_TIMEOUT_MS, format_result, wait_network_idle
+
+    try:
+        idle_ms = max(0, int(arguments.get("idle_ms", DEFAULT_IDLE_MS)))
+        timeout_ms = min(MAX_TIMEOUT_MS, max(0, int(arguments.get("timeout_ms", DEFAULT_TIMEOUT_MS))))
+    except (TypeError, ValueError):
+        return {"content": [{"type": "text", "text": "Error: idle_ms and timeout_ms must be integers"}], "isError": True}
+
+    result = wait_network_idle(get_network_activity, idle_ms, timeout_ms)
+    update_stats("network_idle", waits=1, waited_ms_total=result["waited_ms"],
+                 **{"idle" if result["idle"] else "timeouts": 1})
+    log(f"Network idle wait: {format_result(result)}", "DEBUG")
+    return {"content": [{"type": "text", "text": format_result(result)}]}
+
+
+def get_fetcher():
+    """Fetcher for kagami_fetch_many, through the same local proxy as the browser (created once)"""
+    global fetcher
+
+    from fetch_many import DEFAULT_CONCURRENCY, DEFAULT_MAX_BYTES, DEFAULT_TIMEOUT, Fetcher, build_ssl_context
+
+    with fetcher_lock:
+        if fetcher is None:
+            through_cache_proxy = http_cache_server is not None
+            fetcher = Fetcher(18916 if through_cache_proxy else 18915, build_ssl_context(through_cache_proxy),
+                              concurrency=env_int("KAGAMI_FETCH_CONCURRENCY", DEFAULT_CONCURRENCY),
+                              max_bytes=env_int("KAGAMI_FETCH_MAX_BYTES", DEFAULT_MAX_BYTES),
+                              timeout=env_float("KAGAMI_FETCH_TIMEOUT", DEFAULT_TIMEOUT))
+        return fetcher
+
+
+def run_fetch_many(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """kagami_fetch_many: concurrent GETs without the browser, one content item per URL (tools/call result)"""
+    from fetch_many import DEFAULT_MAX_CHARS, MAX_URLS, format_result
+
+    urls = arguments.get("urls")
+    fmt = arguments.get("format") or "text"
+    try:
+        max_chars = max(1, int(arguments.get("max_chars", DEFAULT_MAX_CHARS)))
+    except (TypeError, ValueError):
+        max_chars = 0
+    if (not isinstance(urls, list) or not urls or len(urls) > MAX_URLS or not all(isinstance(url, str) for url in urls)
+            or fmt not in ("text", "html") or not max_chars):
+        text = (f"Error: urls must be a list of 1 to {MAX_URLS} URL strings, format 'text' or 'html', "
+                f"max_chars a positive integer")
+        return {"content": [{"type": "text", "text": text}], "isError": True}
+
+    started = time.time()
+    fetch = get_fetcher()
+    cache = get_fetch_cache()
+    unique = list(dict.fromkeys(urls))
+    entries = {url: cache.get(f"{fmt} {max_chars} {url}") if cache else None for url in unique}
+    missing = [url for url in unique if not entries[url]]
+    fetched_results = fetch.fetch_many(missing, fmt, max_chars) if missing else []
+    fetched = dict(zip(missing, fetched_results))
+    if cache:
+        for url, result in fetched.items():
+            if "error" not in result:
+                cache.put(f"{fmt} {max_chars} {url}", result, url, result["final_url"])
+    results = [fetched[url] if url in fetched else dict(entries[url]["result"], elapsed_ms=0) for url in urls]
+
+    update_stats("fetch_many", calls=1, urls=len(fetched_results),
+                 errors=sum(1 for result in fetched_results if "error" in result),
+                 truncated=sum(1 for result in fetched_results if result["truncated"]),
+                 bytes=sum(result["bytes"] for result in fetched_results))
+    with fetch.pool.lock:
+        pool_stats = dict(fetch.pool.stats)
+    with stats_lock:
+        wrapper_stats["fetch_many"].update(pool_stats)
+    log(f"Fetched {len(fetched_results)} URL(s) in {time.time() - started:.2f}s "
+        f"({sum(1 for result in fetched_results if 'error' in result)} error(s), "
+        f"{len(results) - len(fetched_results)} from cache)", "DEBUG")
+    return {"content": [{"type": "text", "text": format_result(result)} for result in results]}
+
+
+def is_snapshot_cache_enabled() -> bool:
+    return env_bool("KAGAMI_SNAPSHOT_CACHE", False)
+
+
+def new_snapshot_cache(kind: str):
+    """SnapshotCache with the configured TTL and size, counting into wrapper_stats["snapshot_cache"][kind]"""
+    from snapshot_cache import DEFAULT_TTL, SnapshotCache, new_stats
+
+    with stats_lock:
+        if wrapper_stats["snapshot_cache"] is None:
+            wrapper_stats["snapshot_cache"] = {"browser": new_stats(), "fetch": new_stats()}
+    return SnapshotCache(ttl=env_float("KAGAMI_SNAPSHOT_CACHE_TTL", DEFAULT_TTL),
+                         max_bytes=env_int("KAGAMI_SNAPSHOT_CACHE_MB", 32) * 1024 * 1024,
+                         stats=wrapper_stats["snapshot_cache"][kind], stats_lock=stats_lock)
+
+
+def get_fetch_cache():
+    """Cache for kagami_fetch_many results, shared by all sessions (None unless KAGAMI_SNAPSHOT_CACHE)"""
+    global fetch_cache
+
+    if fetch_cache is None and is_snapshot_cache_enabled():
+        with fetcher_lock:
+            if fetch_cache is None:
+                fetch_cache = new_snapshot_cache("fetch")
+    return fetch_cache
+
+
+def get_network_mark() -> Optional[Tuple[int, float]]:
+    """
+    (requests seen, last traffic) of the local proxies
+    None while requests are in flight, without a proxy, or in daemon mode (other sessions' traffic)
+    """
+    if not is_network_activity_per_session():
+        return None
+    states = get_network_activity()
+    if any(state[0] > 0 for state in states):
+        return None
+    return sum(state[2] for state in states), max((state[1] for state in states), default=0.0)
+
+
+def build_cached_response(request: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+    """tools/call response replaying a cached result"""
+    age = time.time() - entry["stored_at"]
+    result = dict(entry["result"])
+    result["content"] = list(result.get("content") or []) + [
+        {"type": "text", "text": f"(Served from the Kagami snapshot cache, captured {age:.0f}s ago)"}]
+    return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+
+def call_with_snapshot_cache(cache, request: Dict[str, Any],
+                             send: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    Forward a tools/call through the snapshot cache (see snapshot_cache.py)
+    send exchanges one message with playwright-mcp; caller owns its pipes
+    """
+    from snapshot_cache import NAVIGATION_TOOLS, READ_ONLY_TOOLS
+
+    params = request.get("params") or {}
+    name = params.get("name")
+    arguments = params.get("arguments") or {}
+
+    if name == "browser_snapshot":
+        entry = cache.snapshot_hit(get_network_mark())
+        if entry:
+            return build_cached_response(request, entry)
+        response = send(request)
+        cache.page_snapshotted(response, get_network_mark())
+        return response
+
+    if name not in READ_ONLY_TOOLS and name not in NAVIGATION_TOOLS and fetch_cache:
+        fetch_cache.invalidate(cache.tab().url)
+    response = send(request)
+    if name == "browser_navigate":
+        cache.page_loaded(str(arguments.get("url", "")) or None, response, get_network_mark())
+    elif name in ("browser_navigate_back", "browser_navigate_forward"):
+        cache.page_left(response)
+    elif name == "browser_tabs":
+        cache.tabs_changed(arguments, response)
+    elif name == "browser_close":
+        cache.browser_restarted()
+    else:
+        cache.page_touched(name, response)
+    return response
+
+
+def collect_lean_stats(proxy_stats: Dict[str, Any], cache_stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Lean mode settings and requests refused by the deny rules (all proxy tiers)"""
+    from lean import DenyRules, get_chromium_args, get_firefox_prefs, is_lean_enabled
+
+    rules = DenyRules.from_env()
+    return {
+        "enabled": is_lean_enabled(),
+        "firefox_prefs": len(get_firefox_prefs()),
+        "chromium_args": len(get_chromium_args()),
+        "block_hosts": len(rules.hosts),
+        "block_content_types": len(rules.content_types),
+        "blocked_requests": proxy_stats.get("blocked", 0) + (cache_stats or {}).get("blocked", 0),
+        "blocked_bytes": proxy_stats.get("blocked_bytes", 0) + (cache_stats or {}).get("blocked_bytes", 0),
+    }
+
+
+def update_stats(section: str, **deltas):
+    """Add deltas to the counters in wrapper_stats[section]"""
+    with stats_lock:
+        stats = wrapper_stats[section]
+        for key, value in deltas.items():
+            stats[key] += value
+
+
+def handle_stats(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Handle kagami/stats request (wrapper metrics)"""
+    from browsers import get_browser_engine
+
+    from snapshot_cache import summarize_stats
+
+    proxy_stats = collect_proxy_stats()
+    cache_stats = http_cache_server.snapshot() if http_cache_server else None
+    with stats_lock:
+        stats = copy.deepcopy(wrapper_stats)
+    snapshot_stats = stats["snapshot_cache"]
+    return {
+        "jsonrpc": "2.0",
+        "id": request.get("id"),
+        "result": dict(
+            stats,
+            setup_completed=setup_completed,
+            setup_error=setup_error,
+            browser=get_browser_engine(),
+            proxy=proxy_stats,
+            http_cache=cache_stats,
+            lean=collect_lean_stats(proxy_stats, cache_stats),
+            snapshot_cache={kind: summarize_stats(stats) for kind, stats in snapshot_stats.items()}
+            if snapshot_stats else None
+        )
+    }
+
+
+def open_recording():
+    """Open session recording file if KAGAMI_RECORD_FILE is set"""
+    global record_file
+
+    path = os.environ.get("KAGAMI_RECORD_FILE")
+    if not path:
+        return
+
+    try:
+        record_file = open(path, "a", buffering=1)
+        record_file.write(json.dumps({"kagami_recording": 1, "started_at": datetime.now().isoformat()}) + "\n")
+        log(f"Recording JSON-RPC session to {path}")
+    except OSError as e:
+        log(f"Cannot open recording file {path}: {e}", "WARN")
+
+
+def record_message(direction: str, message: Any):
+    """
+    Append a message to the session recording
+    direction: c2w (client→wrapper), w2c (wrapper→client), w2p (wrapper→playwright-mcp), p2w (playwright-mcp→wrapper)
+    """
+    if not record_file or message is None:
+        return
+
+    if isinstance(message, bytes):
+        message = json.loads(message)
+
+    entry = {"t": round(time.monotonic() - record_start, 6), "d": direction, "m": message}
+    try:
+        with record_lock:
+            record_file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    except Exception as e:
+        log(f"Recording error: {e}", "WARN")
+
+
+def track_request(request: Dict[str, Any]):
+    """Add request to the pending-request table"""
+    entry = {
+        "id": request.get("id"),
+        "method": request.get("method"),
+        "tool": (request.get("params") or {}).get("name") if request.get("method") == "tools/call" else None,
+        "thread": threading.current_thread().name,
+        "started": time.time(),
+    }
+    with pending_lock:
+        pending_requests[id(request)] = entry
+
+
+def untrack_request(request: Dict[str, Any]):
+    """Remove request from the pending-request table"""
+    with pending_lock:
+        pending_requests.pop(id(request), None)
+
+
+def get_pending_requests() -> List[Dict[str, Any]]:
+    """Snapshot of pending requests (oldest first)"""
+    with pending_lock:
+        return sorted((dict(entry) for entry in pending_requests.values()), key=lambda entry: entry["started"])
+
+
+def install_profiling_signals():
+    """SIGUSR1 / SIGUSR2 toggle CPU profiling / tracemalloc (KAGAMI_PROFILE_SIGNALS)"""
+    if not env_bool("KAGAMI_PROFILE_SIGNALS", True):
+        return
+
+    from profiling import SignalProfiler
+    SignalProfiler(get_pending_requests, log).install()
+
 
 def read_jsonrpc_message(stream) -> Optional[Dict[str, Any]]:
     """Read JSON-RPC message"""
@@ -334,10 +1572,10 @@ def read_jsonrpc_message(stream) -> Optional[Dict[str, Any]]:
         return None
 
 
-def write_jsonrpc_message(stream, message: Dict[str, Any]):
-    """Write JSON-RPC message (thread-safe)"""
+def write_jsonrpc_message(stream, message: Dict[str, Any], lock: Optional[threading.Lock] = None):
+    """Write JSON-RPC message (thread-safe; lock defaults to the process-wide write_lock)"""
     try:
-        with write_lock:
+        with lock or write_lock:
             json_str = json.dumps(message) + "\n"
 
             # Handle both text and binary mode streams
@@ -353,6 +1591,18 @@ def write_jsonrpc_message(stream, message: Dict[str, Any]):
         log(f"Message write error: {e}", "ERROR")
 
 
+def write_raw_message(stream, data: bytes, lock: Optional[threading.Lock] = None):
+    """Write pre-serialized JSON-RPC message bytes (thread-safe; lock defaults to the process-wide write_lock)"""
+    try:
+        with lock or write_lock:
+            # sys.stdout is a text stream; write to its binary buffer
+            target = getattr(stream, "buffer", stream)
+            target.write(data)
+            target.flush()
+    except Exception as e:
+        log(f"Message write error: {e}", "ERROR")
+
+
 def handle_initialize(request: Dict[str, Any]) -> Dict[str, Any]:
     """Handle initialize request"""
     return {
@@ -374,11 +1624,10 @@ def handle_initialize(request: Dict[str, Any]) -> Dict[str, Any]:
 def handle_tools_list(request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
     Handle tools/list request
-    - Before full setup: return fetched tool list from synchronous setup
-    - After full setup: proxy to playwright-mcp
+    - Tool catalog cached: answered by main loop from pre-serialized bytes
+    - Before full setup without catalog: error
+    - After full setup without catalog: proxy to playwright-mcp (response is cached)
     """
-    global playwright_tools
-
     if setup_error:
         # When setup error occurs
         return {
@@ -390,29 +1639,21 @@ def handle_tools_list(request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
             }
         }
 
-    if not setup_completed:
-        # Before full setup completes: return fetched tools from synchronous setup
-        if not playwright_tools:
-            log("No tools available yet", "ERROR")
-            return {
-                "jsonrpc": "2.0",
-                "id": request.get("id"),
-                "error": {
-                    "code": -32603,
-                    "message": "Tools not loaded yet. Synchronous setup may have failed."
-                }
-            }
+    if tools_list_result_json is not None:
+        return None  # Signal to send cached response
 
-        log(f"Returning {len(playwright_tools)} tools from synchronous setup", "DEBUG")
+    if not setup_completed:
+        log("No tools available yet", "ERROR")
         return {
             "jsonrpc": "2.0",
             "id": request.get("id"),
-            "result": {
-                "tools": playwright_tools
+            "error": {
+                "code": -32603,
+                "message": "Tools not loaded yet. Synchronous setup may have failed."
             }
         }
 
-    # After full setup completes: proxy to playwright-mcp for real-time list
+    # After full setup completes without a catalog: proxy to playwright-mcp
     log("Proxying tools/list to playwright-mcp", "DEBUG")
     return None  # Signal to proxy
 
@@ -431,7 +1672,6 @@ def handle_tool_call(request: Dict[str, Any]) -> Dict[str, Any]:
 
     if not setup_completed:
         # Setup still in progress - return temporary error
-        tool_name = request.get("params", {}).get("name", "unknown")
         return {
             "jsonrpc": "2.0",
             "id": request.get("id"),
@@ -441,13 +1681,44 @@ def handle_tool_call(request: Dict[str, Any]) -> Dict[str, Any]:
             }
         }
 
+    # Reject tools outside the active profile without a playwright-mcp round trip
+    tool_name = (request.get("params") or {}).get("name", "unknown")
+    if tools_list_result_json is not None and tool_name not in playwright_tool_names:
+        return {
+            "jsonrpc": "2.0",
+            "id": request.get("id"),
+            "error": {
+                "code": -32602,
+                "message": f"Tool '{tool_name}' is not available in the active tool profile"
+            }
+        }
+
     # Setup completed - proxy to playwright-mcp
     return None  # Signal to proxy
 
 
 def proxy_to_playwright_mcp(request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Proxy request to playwright-mcp"""
-    global playwright_mcp_process
+    # Browser-less tools neither wait for nor relaunch the browser stack
+    if is_browserless_tool(request):
+        return run_browserless_tool(request)
+    with child_lock:
+        return _proxy_to_playwright_mcp(request)
+
+
+def _proxy_to_playwright_mcp(request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Proxy request to playwright-mcp (caller holds child_lock)"""
+    global last_activity
+
+    if stack_suspended and not resume_browser_stack(request):
+        return {
+            "jsonrpc": "2.0",
+            "id": request.get("id"),
+            "error": {
+                "code": -32603,
+                "message": "Failed to relaunch playwright-mcp after idle shutdown"
+            }
+        }
 
     if not playwright_mcp_process:
         return {
@@ -459,12 +1730,21 @@ def proxy_to_playwright_mcp(request: Dict[str, Any]) -> Optional[Dict[str, Any]]
             }
         }
 
+    if storage_restore_pending:
+        auto_restore_storage_state(playwright_mcp_process)
+
     try:
-        # Send request
-        write_jsonrpc_message(playwright_mcp_process.stdin, request)
+        if is_wrapper_tool(request):
+            response = run_wrapper_tool(request, playwright_mcp_process)
+            last_activity = time.time()
+            return response
 
-        # Receive response
-        response = read_jsonrpc_message(playwright_mcp_process.stdout)
+        if snapshot_cache and request.get("method") == "tools/call":
+            response = call_with_snapshot_cache(snapshot_cache, request, exchange_with_playwright_mcp)
+        else:
+            response = exchange_with_playwright_mcp(request)
+        remember_page_url(response)
+        last_activity = time.time()
         return response
 
     except Exception as e:
@@ -479,40 +1759,164 @@ def proxy_to_playwright_mcp(request: Dict[str, Any]) -> Optional[Dict[str, Any]]
         }
 
 
+def exchange_with_playwright_mcp(request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Send one message to playwright-mcp and read its response (caller holds child_lock)"""
+    record_message("w2p", request)
+    write_jsonrpc_message(playwright_mcp_process.stdin, request)
+    response = read_jsonrpc_message(playwright_mcp_process.stdout)
+    record_message("p2w", response)
+    return response
+
+
+def get_daemon_socket_path() -> Optional[str]:
+    """Daemon socket path if daemon mode is enabled (KAGAMI_DAEMON=1 or KAGAMI_DAEMON_SOCKET set)"""
+    path = os.environ.get("KAGAMI_DAEMON_SOCKET")
+    if path:
+        return path
+    if env_bool("KAGAMI_DAEMON", False):
+        return "/tmp/kagami-daemon.sock"
+    return None
+
+
+# Settings that only affect the shim, not the sessions the daemon serves
+DAEMON_SHIM_SETTINGS = {"KAGAMI_DAEMON", "KAGAMI_DAEMON_SOCKET", "KAGAMI_DAEMON_AUTOSTART",
+                        "KAGAMI_DAEMON_START_TIMEOUT"}
+
+
+def get_daemon_settings() -> Dict[str, str]:
+    """
+    KAGAMI_* settings a daemon applies to every session (tool profile, browser, proxy...), as value hashes
+    Shim-only settings are left out; hashing keeps keys such as KAGAMI_STORAGE_STATE_KEY off disk
+    """
+    return {key: hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+            for key, value in sorted(os.environ.items())
+            if key.startswith("KAGAMI_") and key not in DAEMON_SHIM_SETTINGS}
+
+
+def write_daemon_settings(socket_path: str):
+    """Record the daemon's settings next to its socket (compared by attaching shims)"""
+    path = f"{socket_path}.settings"
+    fd = os.open(f"{path}.tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(get_daemon_settings(), f)
+    os.replace(f"{path}.tmp", path)
+
+
+def get_daemon_settings_mismatch(socket_path: str) -> List[str]:
+    """Settings that differ between this process and the running daemon (["(unknown)"] if unreadable)"""
+    try:
+        with open(f"{socket_path}.settings") as f:
+            theirs = json.load(f)
+    except (OSError, ValueError):
+        return ["(unknown)"]
+    ours = get_daemon_settings()
+    return sorted(key for key in set(ours) | set(theirs) if ours.get(key) != theirs.get(key))
+
+
+def connect_daemon(socket_path: str) -> Optional[socket.socket]:
+    """Connect to the Kagami daemon socket"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+def run_daemon_shim(socket_path: str) -> bool:
+    """
+    Attach to the Kagami daemon and relay stdio to its socket
+    Starts the daemon if it is not running (KAGAMI_DAEMON_AUTOSTART)
+    Returns False if the daemon is unavailable or was started with other KAGAMI_* settings
+    (caller falls back to standalone mode)
+    """
+    start_time = time.time()
+    sock = connect_daemon(socket_path)
+
+    if not sock and env_bool("KAGAMI_DAEMON_AUTOSTART", True):
+        log(f"Starting Kagami daemon ({socket_path})...")
+        with open("/tmp/kagami-daemon.log", "a") as daemon_log:
+            subprocess.Popen(
+                [sys.executable, str(Path(__file__).parent / "daemon.py"), "--socket", socket_path],
+                stdin=subprocess.DEVNULL,
+                stdout=daemon_log,
+                stderr=daemon_log,
+                start_new_session=True
+            )
+        # The daemon listens once its synchronous setup is done
+        deadline = time.time() + env_float("KAGAMI_DAEMON_START_TIMEOUT", 180.0)
+        while not sock and time.time() < deadline:
+            time.sleep(0.05)
+            sock = connect_daemon(socket_path)
+
+    if not sock:
+        log("Kagami daemon unavailable, running standalone", "WARN")
+        return False
+
+    mismatch = get_daemon_settings_mismatch(socket_path)
+    if mismatch:
+        # The daemon would silently apply its own profile, browser, proxy... to this session
+        log(f"Kagami daemon runs with other settings ({', '.join(mismatch)}), running standalone", "WARN")
+        sock.close()
+        return False
+
+    log(f"Attached to Kagami daemon in {time.time() - start_time:.3f}s")
+
+    def relay_stdin():
+        try:
+            while True:
+                data = sys.stdin.buffer.read1(65536)
+                if not data:
+                    break
+                sock.sendall(data)
+        except OSError:
+            pass
+        finally:
+            try:
+                sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    threading.Thread(target=relay_stdin, daemon=True).start()
+
+    try:
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+    except (OSError, KeyboardInterrupt):
+        pass
+    finally:
+        sock.close()
+    return True
+
+
 def main():
     """Main process"""
-    global setup_completed, playwright_tools
+    global setup_completed
 
     # Set HOME environment variable
     os.environ['HOME'] = '/home/user'
 
+    # Daemon mode: this process is only a stdio↔socket shim
+    daemon_socket = get_daemon_socket_path()
+    if daemon_socket and run_daemon_shim(daemon_socket):
+        return
+
     # Register cleanup on exit
     atexit.register(stop_processes)
+    open_recording()
+    install_profiling_signals()
 
     log("=" * 70)
     log("Playwright MCP Wrapper Starting (v2.0 - tools/list_changed workaround)")
     log("=" * 70)
 
     # Run synchronous setup (must complete before responding)
-    log("Running synchronous setup...")
-    if not run_minimal_setup():
-        log("Synchronous setup failed - continuing with limited functionality", "WARN")
-    else:
-        # Fetch tools from playwright-mcp
-        log("Fetching tools from playwright-mcp...")
-        tools = fetch_tools_from_playwright_mcp()
-        if tools:
-            playwright_tools = tools
-            log(f"Successfully loaded {len(playwright_tools)} tools")
-        else:
-            log("Failed to fetch tools from playwright-mcp", "WARN")
-
-        # Delete temporary config file (will be recreated by setup_mcp.py)
-        script_dir = Path(__file__).parent
-        temp_config = script_dir / "playwright-firefox-config.json"
-        if temp_config.exists():
-            temp_config.unlink()
-            log("Deleted temporary config file (will be recreated during full setup)")
+    run_synchronous_setup()
 
     # Start async setup in background
     log("Starting asynchronous setup in background...")
@@ -532,6 +1936,7 @@ def main():
             request = read_jsonrpc_message(sys.stdin)
             if not request:
                 break
+            record_message("c2w", request)
 
             method = request.get("method")
             log(f"Received request: {method}", "DEBUG")
@@ -544,38 +1949,55 @@ def main():
                 log(f"Skipping notification: {method}", "DEBUG")
                 continue
 
-            if method == "initialize":
-                response = handle_initialize(request)
-
-            elif method == "tools/list":
-                response = handle_tools_list(request)
-                if response is None:
-                    # Proxy to playwright-mcp
-                    response = proxy_to_playwright_mcp(request)
-
-            elif method == "tools/call":
-                response = handle_tool_call(request)
-                if response is None:
-                    # Proxy to playwright-mcp
-                    response = proxy_to_playwright_mcp(request)
+            track_request(request)
+            try:
+                if method == "initialize":
+                    response = handle_initialize(request)
+
+                elif method == "tools/list":
+                    response = handle_tools_list(request)
+                    if response is None and tools_list_result_json is not None:
+                        # Serve pre-serialized catalog for the active profile
+                        data = build_tools_list_response(request.get("id"))
+                        record_message("w2c", data)
+                        write_raw_message(sys.stdout, data)
+                        continue
+                    if response is None:
+                        # Proxy to playwright-mcp and cache the catalog
+                        response = proxy_to_playwright_mcp(request)
+                        if response and "result" in response:
+                            set_tool_catalog(response["result"].get("tools", []))
+                            response["result"]["tools"] = playwright_tools
+
+                elif method == "kagami/stats":
+                    response = handle_stats(request)
+
+                elif method == "tools/call":
+                    response = handle_tool_call(request)
+                    if response is None:
+                        # Proxy to playwright-mcp
+                        response = proxy_to_playwright_mcp(request)
 
-            else:
-                # Proxy other methods to playwright-mcp (only if setup completed)
-                if setup_completed and playwright_mcp_process:
-                    response = proxy_to_playwright_mcp(request)
                 else:
-                    response = {
-                        "jsonrpc": "2.0",
-                        "id": request.get("id"),
-                        "error": {
-                            "code": -32603,
-                            "message": "Setup is in progress. Please wait..."
+                    # Proxy other methods to playwright-mcp (only if setup completed)
+                    if setup_completed and (playwright_mcp_process or stack_suspended):
+                        response = proxy_to_playwright_mcp(request)
+                    else:
+                        response = {
+                            "jsonrpc": "2.0",
+                            "id": request.get("id"),
+                            "error": {
+                                "code": -32603,
+                                "message": "Setup is in progress. Please wait..."
+                            }
                         }
-                    }
 
-            # Send response
-            if response:
-                write_jsonrpc_message(sys.stdout, response)
+                # Send response
+                if response:
+                    record_message("w2c", response)
+                    write_jsonrpc_message(sys.stdout, response)
+            finally:
+                untrack_request(request)
 
     except KeyboardInterrupt:
         log("Interrupted")
@@ -0,0 +1,241 @@
+"""
+Network-idle signal from the local proxies (kagami_wait_network_idle)
+
+Every browser request goes through a proxy started by mcp.py, so the proxies know
+when the page stopped loading:
+  - in flight: CONNECTs until the tunnel is established, plain HTTP requests (and HTTPS
+    requests intercepted by the caching proxy) until their response is relayed
+  - awaiting tunnels: the browser wrote into an established TLS tunnel and no answer
+    came back yet. Tunnels are opaque, so this is a heuristic (TunnelState):
+      - the ClientHello -> ServerHello exchange measures the tunnel round trip
+      - the client's next flight (Finished, usually with the first request) opens a
+        window of about one round trip in which upstream bytes are protocol replies
+        (session tickets, HTTP/2 SETTINGS), not the response
+      - writes below CONTROL_WRITE_BYTES (HTTP/2 WINDOW_UPDATE, PING / SETTINGS acks)
+        wait for nothing
+    Counted as in flight for at most KAGAMI_NETWORK_IDLE_GRACE_MS, so a guess that
+    goes wrong cannot hold the page "busy" for long
+  - activity: any byte relayed
+
+The network is idle once nothing is in flight and no byte moved for idle_ms.
+
+The builtin proxy and the caching proxy keep a NetworkActivity in-process; proxy.py
+worker processes write theirs to $KAGAMI_PROXY_STATS_DIR/<pid>.activity
+(proxy_plugins.MetricsProxyPoolPlugin, at most every ACTIVITY_WRITE_INTERVAL).
+
+Standard library only.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Any, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_IDLE_MS = 500
+DEFAULT_TIMEOUT_MS = 10000
+MAX_TIMEOUT_MS = 120000
+POLL_INTERVAL = 0.01
+ACTIVITY_WRITE_INTERVAL = 0.05
+DEFAULT_GRACE_MS = 2000
+CONTROL_WRITE_BYTES = 48
+HANDSHAKE_WINDOW_MAX = 0.25
+
+TOOLS: List[Dict[str, Any]] = [
+    {
+        "name": "kagami_wait_network_idle",
+        "description": ("Wait until the page's network traffic has settled: returns as soon as no request has been "
+                        "in flight for idle_ms (seen by the local proxy), or when timeout_ms expires. "
+                        "Use after navigation or clicks instead of fixed sleeps, before taking a snapshot."),
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "idle_ms": {"type": "integer", "minimum": 0,
+                            "description": f"Quiet period that counts as idle (default {DEFAULT_IDLE_MS})"},
+                "timeout_ms": {"type": "integer", "minimum": 0, "maximum": MAX_TIMEOUT_MS,
+                               "description": f"Deadline (default {DEFAULT_TIMEOUT_MS})"},
+            },
+        },
+    },
+]
+
+
+def get_response_grace() -> float:
+    """Seconds an unanswered tunnel write counts as in flight (KAGAMI_NETWORK_IDLE_GRACE_MS)"""
+    try:
+        return max(0.0, float(os.environ.get("KAGAMI_NETWORK_IDLE_GRACE_MS", DEFAULT_GRACE_MS))) / 1000
+    except ValueError:
+        return DEFAULT_GRACE_MS / 1000
+
+
+def count_awaiting(awaiting_since: Iterable[float], now: float, grace: float) -> int:
+    return sum(1 for since in awaiting_since if now - since < grace)
+
+
+class TunnelState:
+    """One tunnel: unanswered since, handshake round trip, protocol reply window, client spoke last"""
+
+    __slots__ = ("awaiting_since", "rtt", "window_end", "pending")
+
+    def __init__(self):
+        self.awaiting_since: Optional[float] = None
+        self.rtt: Optional[float] = None
+        self.window_end: Optional[float] = None
+        self.pending = False
+
+    def sent(self, now: float, size: int) -> bool:
+        """Client write (True if the tunnel started awaiting an answer)"""
+        if self.rtt is not None:
+            if self.window_end is None:
+                # Client's second flight: replies within about a round trip are still the handshake
+                self.window_end = now + min(2 * self.rtt, HANDSHAKE_WINDOW_MAX)
+            elif size < CONTROL_WRITE_BYTES:
+                return False
+        self.pending = True
+        if self.awaiting_since is not None:
+            return False
+        self.awaiting_since = now
+        return True
+
+    def received(self, now: float) -> bool:
+        """Upstream bytes (True if they answered the client)"""
+        if not self.pending or self.awaiting_since is None:
+            return False
+        if self.rtt is None:
+            self.rtt = now - self.awaiting_since
+        elif now < self.window_end:
+            return False
+        self.pending = False
+        self.awaiting_since = None
+        return True
+
+
+class NetworkActivity:
+    """In-flight requests, awaiting tunnels and last activity time (thread-safe)"""
+
+    def __init__(self, response_grace: Optional[float] = None):
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.requests = 0
+        self.tunnels: Dict[Hashable, TunnelState] = {}
+        self.response_grace = get_response_grace() if response_grace is None else response_grace
+        self.last_activity = 0.0
+
+    def begin(self):
+        with self.lock:
+            self.inflight += 1
+            self.requests += 1
+            self.last_activity = time.time()
+
+    def end(self):
+        with self.lock:
+            self.inflight -= 1
+            self.last_activity = time.time()
+
+    def touch(self):
+        """Bytes moved (a plain float store, cheap enough for every relayed chunk)"""
+        self.last_activity = time.time()
+
+    def tunnel_sent(self, tunnel: Hashable, size: int) -> bool:
+        """Client bytes through a tunnel: a request-sized write awaits an answer (True if it started waiting)"""
+        now = time.time()
+        self.last_activity = now
+        with self.lock:
+            state = self.tunnels.get(tunnel)
+            if state is None:
+                state = self.tunnels[tunnel] = TunnelState()
+            started = state.sent(now, size)
+            if started and state.rtt is not None:
+                self.requests += 1  # The handshake (CONNECT already counted) is not a request
+            return started
+
+    def tunnel_received(self, tunnel: Hashable) -> bool:
+        """Upstream bytes through a tunnel (True if they answered the client)"""
+        now = time.time()
+        self.last_activity = now
+        with self.lock:
+            state = self.tunnels.get(tunnel)
+            return state is not None and state.received(now)
+
+    def tunnel_closed(self, tunnel: Hashable) -> bool:
+        """Forget a tunnel (True if it was still awaiting an answer)"""
+        with self.lock:
+            state = self.tunnels.pop(tunnel, None)
+            return state is not None and state.awaiting_since is not None
+
+    def awaiting_since(self) -> List[float]:
+        with self.lock:
+            return [state.awaiting_since for state in self.tunnels.values() if state.awaiting_since is not None]
+
+    @contextmanager
+    def request(self) -> Iterator[None]:
+        self.begin()
+        try:
+            yield
+        finally:
+            self.end()
+
+    def state(self) -> Tuple[int, float, int]:
+        """(in flight incl. awaiting tunnels within the grace period, last activity time, requests seen)"""
+        awaiting = count_awaiting(self.awaiting_since(), time.time(), self.response_grace)
+        with self.lock:
+            return self.inflight + awaiting, self.last_activity, self.requests
+
+
+def read_activity_files(stats_dir: Path) -> List[Tuple[int, float, int]]:
+    """Activity written by live proxy.py worker processes (files of exited workers are ignored)"""
+    states = []
+    now = time.time()
+    grace = get_response_grace()
+    for path in stats_dir.glob("*.activity"):
+        try:
+            with open(path) as f:
+                activity = json.load(f)
+            os.kill(int(activity["pid"]), 0)
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+        awaiting = count_awaiting(activity.get("awaiting_since", []), now, grace)
+        states.append((activity["inflight"] + awaiting, activity["last_activity"], activity.get("requests", 0)))
+    return states
+
+
+def wait_network_idle(sources: Callable[[], List[Tuple[int, float, int]]], idle_ms: float,
+                      timeout_ms: float) -> Dict[str, Any]:
+    """
+    Poll the activity sources until idle_ms without in-flight requests or traffic, or timeout_ms
+    Returns {"idle", "waited_ms", "inflight", "quiet_ms", "requests"} (requests seen while waiting;
+    quiet_ms is None when no traffic was seen at all)
+    """
+    started = time.time()
+    deadline = started + timeout_ms / 1000
+    baseline = None
+    while True:
+        now = time.time()
+        states = sources()
+        inflight = sum(state[0] for state in states)
+        last_activity = max((state[1] for state in states), default=0.0)
+        requests = sum(state[2] for state in states)
+        if baseline is None:
+            baseline = requests
+        quiet_ms = max(0.0, (now - last_activity) * 1000) if last_activity else None
+        idle = inflight <= 0 and (quiet_ms is None or quiet_ms >= idle_ms)
+        if idle or now >= deadline:
+            return {
+                "idle": idle,
+                "waited_ms": round((now - started) * 1000),
+                "inflight": inflight,
+                "quiet_ms": round(quiet_ms) if quiet_ms is not None else None,
+                "requests": requests - baseline,
+            }
+        # Sleep until the quiet period could be over (re-checked every POLL_INTERVAL at most)
+        remaining = (idle_ms - (quiet_ms or 0.0)) / 1000 if inflight <= 0 else POLL_INTERVAL
+        time.sleep(min(max(remaining, POLL_INTERVAL), max(0.0, deadline - now)) or POLL_INTERVAL)
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    quiet = f"{result['quiet_ms']} ms" if result["quiet_ms"] is not None else "no traffic yet"
+    if result["idle"]:
+        return f"Network idle after {result['waited_ms']} ms ({result['requests']} request(s) while waiting, quiet: {quiet})"
+    return (f"Network not idle after {result['waited_ms']} ms: {result['inflight']} request(s) in flight, "
+            f"quiet: {quiet}")
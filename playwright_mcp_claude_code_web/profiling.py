@@ -0,0 +1,241 @@
+"""
+On-demand profiling of a running wrapper via signals
+
+  kill -USR1 <pid>   start / stop the CPU profiler
+  kill -USR2 <pid>   start / stop tracemalloc
+
+The handlers only queue the signal; a worker thread starts / stops the profilers and
+writes reports (I/O or logging in a handler could deadlock on locks the interrupted
+code holds). Stopping writes a report to $KAGAMI_PROFILE_DIR (default /tmp):
+  kagami-<cpu|memory>-<pid>-<timestamp>.txt   profiler stats or top allocations, thread stacks, pending requests
+  kagami-cpu-<pid>-<timestamp>.folded         collapsed stacks (stack sampler only, flamegraph.pl / speedscope input)
+
+CPU profilers (KAGAMI_PROFILER):
+  sampler  (default) samples every thread's stack (dispatch loop, setup thread, proxies)
+           every KAGAMI_PROFILE_INTERVAL_MS
+  cprofile deterministic cProfile of the main thread only (the dispatch loop)
+
+Standard library only.
+"""
+import cProfile
+import io
+import os
+import pstats
+import queue
+import signal
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+Frame = Tuple[str, int, str]  # (file, line, function)
+
+
+class StackSampler(threading.Thread):
+    """Periodically samples the stacks of all other threads"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="kagami-stack-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()  # (thread name, frames root→leaf) -> samples
+        self.samples = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames: List[Frame] = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append((code.co_filename, frame.f_lineno, code.co_name))
+                    frame = frame.f_back
+                self.stacks[(names.get(thread_id, str(thread_id)), tuple(reversed(frames)))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join(timeout=5)
+
+    def report(self, top: int = 40) -> str:
+        """Top functions by self and inclusive samples"""
+        self_counts: Counter = Counter()
+        inclusive_counts: Counter = Counter()
+        total = sum(self.stacks.values())
+        for (_, frames), count in self.stacks.items():
+            if not frames:
+                continue
+            self_counts[format_frame(frames[-1])] += count
+            for label in {format_frame(frame) for frame in frames}:
+                inclusive_counts[label] += count
+
+        lines = [f"{self.samples} sampling rounds, {total} thread samples, interval {self.interval * 1000:.0f} ms", ""]
+        for title, counts in (("Self samples", self_counts), ("Inclusive samples", inclusive_counts)):
+            lines.append(f"{title}:")
+            for label, count in counts.most_common(top):
+                lines.append(f"  {count:>7} {count / total if total else 0:>6.1%}  {label}")
+            lines.append("")
+        return "\n".join(lines)
+
+    def folded(self) -> str:
+        """Collapsed stacks: thread;frame;frame count"""
+        lines = []
+        for (thread_name, frames), count in self.stacks.most_common():
+            path = ";".join([thread_name] + [f"{name} ({Path(file).name}:{line})" for file, line, name in frames])
+            lines.append(f"{path} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def format_frame(frame: Frame) -> str:
+    file, line, name = frame
+    return f"{name} ({Path(file).name}:{line})"
+
+
+class SignalProfiler:
+    """SIGUSR1 / SIGUSR2 handlers toggling the CPU profiler and tracemalloc"""
+
+    def __init__(self, pending_requests: Callable[[], List[Dict[str, Any]]], log: Callable[..., None]):
+        self.pending_requests = pending_requests
+        self.log = log
+        self.output_dir = Path(os.environ.get("KAGAMI_PROFILE_DIR", "/tmp"))
+        self.mode = os.environ.get("KAGAMI_PROFILER", "sampler").strip().lower() or "sampler"
+        try:
+            self.interval = max(1.0, float(os.environ.get("KAGAMI_PROFILE_INTERVAL_MS", "10"))) / 1000
+        except ValueError:
+            self.interval = 0.01
+        self.sampler: Optional[StackSampler] = None
+        self.cprofile: Optional[cProfile.Profile] = None
+        self.cpu_started: Optional[float] = None
+        self.memory_baseline: Optional[tracemalloc.Snapshot] = None
+        self.memory_started: Optional[float] = None
+        self.signals: "queue.SimpleQueue[Tuple[int, Optional[cProfile.Profile]]]" = queue.SimpleQueue()
+        self.handler_profile: Optional[cProfile.Profile] = None  # cProfile running on the main thread
+
+    def install(self):
+        """Install handlers (main thread only)"""
+        threading.Thread(target=self.run, name="kagami-profiler", daemon=True).start()
+        signal.signal(signal.SIGUSR1, self.on_signal)
+        signal.signal(signal.SIGUSR2, self.on_signal)
+        self.log(f"Profiling signals installed (SIGUSR1: {self.mode} profiler, SIGUSR2: tracemalloc, "
+                 f"pid {os.getpid()}, reports in {self.output_dir})")
+
+    def on_signal(self, signum, frame):
+        """Signal handler: queue the toggle for the worker thread (SimpleQueue.put is reentrant)"""
+        profile = None
+        if signum == signal.SIGUSR1 and self.mode == "cprofile":
+            # cProfile hooks the thread that enables it, so it is toggled here on the main thread
+            if self.handler_profile is None:
+                self.handler_profile = profile = cProfile.Profile()
+                profile.enable()
+            else:
+                profile, self.handler_profile = self.handler_profile, None
+                profile.disable()
+        self.signals.put((signum, profile))
+
+    def run(self):
+        while True:
+            signum, profile = self.signals.get()
+            try:
+                if signum == signal.SIGUSR1:
+                    self.toggle_cpu(profile)
+                else:
+                    self.toggle_memory()
+            except Exception as e:
+                self.log(f"Profiler error: {e}", "WARN")
+
+    def toggle_cpu(self, profile: Optional[cProfile.Profile] = None):
+        """Start or stop the CPU profiler (profile: the cProfile the signal handler enabled or disabled)"""
+        if self.cpu_started is None:
+            self.cpu_started = time.time()
+            if self.mode == "cprofile":
+                self.cprofile = profile
+            else:
+                self.sampler = StackSampler(self.interval)
+                self.sampler.start()
+            self.log(f"CPU profiler started ({self.mode})")
+            return
+
+        elapsed = time.time() - self.cpu_started
+        self.cpu_started = None
+        folded = None
+        if self.cprofile:
+            buffer = io.StringIO()
+            pstats.Stats(self.cprofile, stream=buffer).sort_stats("cumulative").print_stats(40)
+            body = buffer.getvalue()
+            self.cprofile = None
+        else:
+            self.sampler.stop()
+            body = self.sampler.report()
+            folded = self.sampler.folded()
+            self.sampler = None
+        self.dump("cpu", f"CPU profile ({self.mode}, {elapsed:.1f}s)", body, folded)
+
+    def toggle_memory(self):
+        if self.memory_started is None:
+            tracemalloc.start(25)
+            self.memory_baseline = tracemalloc.take_snapshot()
+            self.memory_started = time.time()
+            self.log("tracemalloc started")
+            return
+
+        elapsed = time.time() - self.memory_started
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.memory_started = None
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        snapshot = snapshot.filter_traces(filters)
+        lines = [f"Traced memory: current {current / 1024:.0f} KiB, peak {peak / 1024:.0f} KiB", "", "Top allocations:"]
+        lines += [f"  {stat}" for stat in snapshot.statistics("lineno")[:30]]
+        lines += ["", "Growth since start:"]
+        lines += [f"  {stat}" for stat in snapshot.compare_to(self.memory_baseline.filter_traces(filters), "lineno")[:30]]
+        self.memory_baseline = None
+        self.dump("memory", f"tracemalloc ({elapsed:.1f}s)", "\n".join(lines) + "\n")
+
+    def dump(self, kind: str, title: str, body: str, folded: Optional[str] = None):
+        """Write report with thread stacks and pending requests"""
+        # Microseconds: toggles within the same second must not overwrite each other's reports
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = self.output_dir / f"kagami-{kind}-{os.getpid()}-{stamp}.txt"
+        sections = [f"# {title}", f"# pid {os.getpid()}, {datetime.now().isoformat(timespec='seconds')}", "", body]
+        sections += ["", "# Thread stacks", format_thread_stacks()]
+        sections += ["# Pending requests", format_pending(self.pending_requests())]
+
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text("\n".join(sections))
+            if folded:
+                path.with_suffix(".folded").write_text(folded)
+            self.log(f"Profile written to {path}")
+        except OSError as e:
+            self.log(f"Cannot write profile {path}: {e}", "WARN")
+
+
+def format_thread_stacks() -> str:
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    lines = []
+    for thread_id, frame in sys._current_frames().items():
+        lines.append(f"Thread {names.get(thread_id, thread_id)} ({thread_id}):")
+        lines.append("".join(traceback.format_stack(frame)).rstrip())
+        lines.append("")
+    return "\n".join(lines)
+
+
+def format_pending(pending: List[Dict[str, Any]]) -> str:
+    if not pending:
+        return "(none)\n"
+    now = time.time()
+    lines = [f"{'id':<20} {'method':<20} {'tool':<30} {'age':>9}"]
+    for entry in pending:
+        lines.append(f"{str(entry.get('id')):<20} {str(entry.get('method')):<20} {str(entry.get('tool') or '-'):<30} "
+                     f"{now - entry['started']:>8.2f}s")
+    return "\n".join(lines) + "\n"
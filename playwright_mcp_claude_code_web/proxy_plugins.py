@@ -0,0 +1,247 @@
+"""
+proxy.py plugins shipped with Kagami
+
+Loaded by mcp.py via `--plugins proxy_plugins.<PluginName>` (this directory is
+added to PYTHONPATH of the proxy.py process).
+
+MetricsProxyPoolPlugin:
+  ProxyPoolPlugin that records per-upstream-host traffic and latency metrics:
+    - connections, bytes in/out, upstream errors
+    - upstream_connect_ms: TCP connect to the upstream (JWT auth) proxy
+    - first_byte_ms: request start to first upstream byte (for CONNECT this is the
+      "200 Connection established" reply, i.e. JWT proxy hop + its dial to the site)
+
+  Also enforces the lean mode host deny rules (lean.py): blocked hosts get a 403 before
+  any upstream connection and are counted as "blocked".
+
+  proxy.py runs plugins in several worker processes, so each process writes its
+  own snapshot to $KAGAMI_PROXY_STATS_DIR/<pid>.json (at most once a second).
+  mcp.py aggregates the snapshots into the kagami/stats response.
+
+  Network activity for kagami_wait_network_idle (network_idle.py) goes to
+  $KAGAMI_PROXY_STATS_DIR/<pid>.activity: connections are in flight until the first
+  upstream byte, then tunnels awaiting an answer are listed (same rules as the builtin
+  proxy), relayed bytes count as activity. Written by a background thread, never in
+  proxy.py's event loop: at most every ACTIVITY_WRITE_INTERVAL, as soon as that allows
+  after a request starts or is answered.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from proxy.common.utils import text_
+from proxy.http.exception import HttpRequestRejected
+from proxy.http.parser import HttpParser
+from proxy.plugin.proxy_pool import ProxyPoolPlugin
+
+from lean import DenyRules
+from network_idle import ACTIVITY_WRITE_INTERVAL, NetworkActivity
+
+STATS_DIR = os.environ.get("KAGAMI_PROXY_STATS_DIR", "/tmp/kagami-proxy-stats")
+FLUSH_INTERVAL = 1.0
+DENY_RULES = DenyRules.from_env()
+
+_host_metrics: Dict[str, Dict[str, float]] = {}
+_metrics_lock = threading.Lock()
+_flush_thread: Optional[threading.Thread] = None
+_dirty = False
+_activity = NetworkActivity()
+_activity_changed = threading.Event()
+_activity_thread: Optional[threading.Thread] = None
+_activity_written = 0.0
+
+
+def _new_host_metrics() -> Dict[str, float]:
+    return {
+        "connections": 0,
+        "bytes_in": 0,
+        "bytes_out": 0,
+        "errors": 0,
+        "blocked": 0,
+        "upstream_connect_ms_total": 0.0,
+        "upstream_connect_ms_max": 0.0,
+        "upstream_connect_samples": 0,
+        "first_byte_ms_total": 0.0,
+        "first_byte_ms_max": 0.0,
+        "first_byte_samples": 0,
+    }
+
+
+def record(host: str, **deltas: float):
+    """Add counter deltas for a host"""
+    global _dirty
+
+    with _metrics_lock:
+        metrics = _host_metrics.setdefault(host, _new_host_metrics())
+        for key, value in deltas.items():
+            metrics[key] += value
+        _dirty = True
+    _ensure_flush_thread()
+
+
+def record_latency(host: str, name: str, elapsed_ms: float):
+    """Record a latency sample (name: upstream_connect or first_byte)"""
+    global _dirty
+
+    with _metrics_lock:
+        metrics = _host_metrics.setdefault(host, _new_host_metrics())
+        metrics[f"{name}_ms_total"] += elapsed_ms
+        metrics[f"{name}_samples"] += 1
+        metrics[f"{name}_ms_max"] = max(metrics[f"{name}_ms_max"], elapsed_ms)
+        _dirty = True
+    _ensure_flush_thread()
+
+
+def flush():
+    """Write this process's metrics snapshot atomically"""
+    global _dirty
+
+    with _metrics_lock:
+        if not _dirty:
+            return
+        snapshot = json.dumps({"pid": os.getpid(), "updated_at": time.time(), "hosts": _host_metrics})
+        _dirty = False
+
+    os.makedirs(STATS_DIR, exist_ok=True)
+    path = os.path.join(STATS_DIR, f"{os.getpid()}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(snapshot)
+    os.replace(tmp_path, path)
+
+
+def write_activity(changed: bool = False):
+    """Schedule a write of this process's activity file (right away if a request started or ended)"""
+    if changed or time.time() - _activity_written >= ACTIVITY_WRITE_INTERVAL:
+        _activity_changed.set()
+        _ensure_activity_thread()
+
+
+def _activity_loop():
+    global _activity_written
+
+    while True:
+        _activity_changed.wait()
+        _activity_changed.clear()
+        _activity_written = time.time()
+        with _activity.lock:
+            inflight, requests = _activity.inflight, _activity.requests
+        snapshot = json.dumps({"pid": os.getpid(), "inflight": inflight, "last_activity": _activity.last_activity,
+                               "requests": requests, "awaiting_since": _activity.awaiting_since()})
+        try:
+            os.makedirs(STATS_DIR, exist_ok=True)
+            path = os.path.join(STATS_DIR, f"{os.getpid()}.activity")
+            with open(f"{path}.tmp", "w") as f:
+                f.write(snapshot)
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            pass
+        # Bursts of starts / ends coalesce into one write per interval (the last state is always written)
+        time.sleep(ACTIVITY_WRITE_INTERVAL)
+
+
+def _ensure_activity_thread():
+    global _activity_thread
+
+    # Started lazily, like the flush thread (proxy.py forks workers after importing plugins)
+    if _activity_thread is None or not _activity_thread.is_alive():
+        _activity_thread = threading.Thread(target=_activity_loop, daemon=True)
+        _activity_thread.start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _ensure_flush_thread():
+    global _flush_thread
+
+    # Started lazily: proxy.py forks worker processes after importing plugins
+    if _flush_thread is None or not _flush_thread.is_alive():
+        _flush_thread = threading.Thread(target=_flush_loop, daemon=True)
+        _flush_thread.start()
+
+
+class MetricsProxyPoolPlugin(ProxyPoolPlugin):
+    """ProxyPoolPlugin with per-upstream-host metrics"""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._kagami_host = "unknown"
+        self._kagami_started: Optional[float] = None
+        self._kagami_inflight = False
+
+    def before_upstream_connection(self, request: HttpParser) -> Optional[HttpParser]:
+        self._kagami_host = text_(request.host) if request.host else "unknown"
+        if DENY_RULES.blocks_host(self._kagami_host):
+            record(self._kagami_host, blocked=1)
+            raise HttpRequestRejected(status_code=403, reason=b"Blocked by Kagami")
+
+        self._kagami_started = time.perf_counter()
+        record(self._kagami_host, connections=1)
+        self._kagami_inflight = True
+        _activity.begin()
+        write_activity(True)
+
+        try:
+            result = super().before_upstream_connection(request)
+        except Exception:
+            record(self._kagami_host, errors=1)
+            self._kagami_started = None
+            self._end_inflight()
+            raise
+
+        if result is None:
+            # Connected to the upstream proxy (result is the request when bypassing the pool)
+            record_latency(self._kagami_host, "upstream_connect", (time.perf_counter() - self._kagami_started) * 1000)
+        return result
+
+    def handle_client_request(self, request: HttpParser) -> Optional[HttpParser]:
+        record(self._kagami_host, bytes_out=len(request.build()))
+        return super().handle_client_request(request)
+
+    def handle_client_data(self, raw: memoryview) -> Optional[memoryview]:
+        record(self._kagami_host, bytes_out=len(raw))
+        write_activity(_activity.tunnel_sent(self, len(raw)))
+        return super().handle_client_data(raw)
+
+    def handle_upstream_data(self, raw: memoryview) -> None:
+        self._record_upstream_bytes(len(raw))
+        super().handle_upstream_data(raw)
+
+    def handle_upstream_chunk(self, chunk: memoryview) -> Optional[memoryview]:
+        # Direct (non-pooled) connections, e.g. private addresses
+        self._record_upstream_bytes(len(chunk))
+        return super().handle_upstream_chunk(chunk)
+
+    def on_upstream_connection_close(self) -> None:
+        if self._kagami_started is not None:
+            # Upstream closed before sending anything
+            record(self._kagami_host, errors=1)
+            self._kagami_started = None
+        self._end_inflight()
+        write_activity(_activity.tunnel_closed(self))
+        super().on_upstream_connection_close()
+
+    def _record_upstream_bytes(self, size: int):
+        if self._kagami_started is not None:
+            record_latency(self._kagami_host, "first_byte", (time.perf_counter() - self._kagami_started) * 1000)
+            self._kagami_started = None
+        record(self._kagami_host, bytes_in=size)
+        if self._kagami_inflight:
+            self._end_inflight()
+        else:
+            write_activity(_activity.tunnel_received(self))
+
+    def _end_inflight(self):
+        if self._kagami_inflight:
+            self._kagami_inflight = False
+            _activity.end()
+            write_activity(True)
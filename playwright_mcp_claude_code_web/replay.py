@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.11"
+# ///
+"""
+Replay recorded JSON-RPC sessions against mcp.py (load testing)
+
+Recordings are written by mcp.py when KAGAMI_RECORD_FILE is set:
+  {"t": <seconds since start>, "d": "c2w" | "w2c" | "w2p" | "p2w", "m": <message>}
+
+Usage:
+  python3 replay.py session.jsonl                      # real playwright-mcp, 1x speed
+  python3 replay.py session.jsonl --stub --speed 10    # stub playwright-mcp, 10x speed
+  python3 replay.py session.jsonl --stub --speed 0 --concurrency 4
+
+With --stub, this script is also started as the playwright-mcp child
+(--stub-child) and answers with the recorded responses and latencies.
+"""
+import argparse
+import json
+import math
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+
+def log(message: str):
+    """Log output (outputs to stderr)"""
+    print(f"[replay] {message}", file=sys.stderr, flush=True)
+
+
+def load_recording(path: str) -> List[Dict[str, Any]]:
+    """Load recording entries (header lines are skipped)"""
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if "d" in entry:
+                entries.append(entry)
+    return entries
+
+
+def request_key(message: Dict[str, Any]) -> str:
+    """Label used for latency grouping: method, or tools/call:<tool name>"""
+    method = message.get("method", "?")
+    if method == "tools/call":
+        return f"tools/call:{(message.get('params') or {}).get('name', '?')}"
+    return method
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    # Rounded first so float error (0.07 * 100 = 7.000000000000001) does not skip a rank
+    index = min(len(values) - 1, max(0, math.ceil(round(pct / 100 * len(values), 9)) - 1))
+    return values[index]
+
+
+# ---------------------------------------------------------------------------
+# Stub playwright-mcp child
+# ---------------------------------------------------------------------------
+
+def run_stub_child(path: str, speed: float) -> int:
+    """Answer playwright-mcp requests from a recording (stdin/stdout)"""
+    entries = load_recording(path)
+
+    # Pair wrapper→playwright-mcp requests with their responses
+    pending: Dict[Any, Tuple[float, Dict[str, Any]]] = {}
+    exact: Dict[str, List[Tuple[float, Dict[str, Any]]]] = {}
+    by_label: Dict[str, List[Tuple[float, Dict[str, Any]]]] = {}
+    tools: List[Dict[str, Any]] = []
+
+    for entry in entries:
+        message = entry["m"]
+        if entry["d"] == "w2p" and "id" in message:
+            pending[message["id"]] = (entry["t"], message)
+        elif entry["d"] == "p2w" and message.get("id") in pending:
+            sent_at, request = pending.pop(message["id"])
+            sample = (entry["t"] - sent_at, message)
+            exact.setdefault(json.dumps([request.get("method"), request.get("params")], sort_keys=True), []).append(sample)
+            by_label.setdefault(request_key(request), []).append(sample)
+        elif entry["d"] == "w2c" and not tools:
+            tools = message.get("result", {}).get("tools", []) if isinstance(message.get("result"), dict) else []
+
+    if not tools:
+        names = {label.split(":", 1)[1] for label in by_label if label.startswith("tools/call:")}
+        tools = [{"name": name, "description": "", "inputSchema": {"type": "object"}} for name in sorted(names)]
+    # The recorded catalog includes the wrapper's own tools, which mcp.py adds again
+    tools = [tool for tool in tools if not str(tool.get("name", "")).startswith("kagami_")]
+
+    cursors: Dict[str, int] = {}
+
+    def lookup(request: Dict[str, Any]) -> Optional[Tuple[float, Dict[str, Any]]]:
+        # Exact (method, params) match first, then any response for the same tool/method
+        for key, table in ((json.dumps([request.get("method"), request.get("params")], sort_keys=True), exact),
+                           (request_key(request), by_label)):
+            samples = table.get(key)
+            if samples:
+                cursor = cursors.get(key, 0)
+                cursors[key] = cursor + 1
+                return samples[cursor % len(samples)]
+        return None
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        if "id" not in request:
+            continue
+
+        method = request.get("method")
+        if method == "initialize":
+            result = {
+                "protocolVersion": "2024-11-05",
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": "kagami-replay-stub", "version": "1.0.0"}
+            }
+            response = {"jsonrpc": "2.0", "id": request["id"], "result": result}
+        elif method == "tools/list":
+            response = {"jsonrpc": "2.0", "id": request["id"], "result": {"tools": tools}}
+        else:
+            sample = lookup(request)
+            if sample:
+                latency, recorded = sample
+                if speed > 0:
+                    time.sleep(latency / speed)
+                response = dict(recorded, id=request["id"])
+            else:
+                response = {"jsonrpc": "2.0", "id": request["id"], "result": {"content": []}}
+
+        sys.stdout.write(json.dumps(response) + "\n")
+        sys.stdout.flush()
+
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Replay driver
+# ---------------------------------------------------------------------------
+
+class ReplaySession:
+    """One mcp.py instance replaying the recorded client messages"""
+
+    def __init__(self, index: int, args: argparse.Namespace, requests: List[Tuple[float, Dict[str, Any]]]):
+        self.index = index
+        self.args = args
+        self.requests = requests
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.sent: Dict[Any, Tuple[float, str]] = {}
+        self.responded = threading.Condition()
+        self.process: Optional[subprocess.Popen] = None
+
+    def start(self):
+        """Start mcp.py"""
+        env = os.environ.copy()
+        env.pop("KAGAMI_RECORD_FILE", None)
+        if self.args.stub:
+            # mcp.py splits this with shlex
+            env["KAGAMI_PLAYWRIGHT_MCP_CMD"] = shlex.join([
+                sys.executable, str(Path(__file__).resolve()), str(self.args.recording),
+                "--stub-child", "--speed", str(self.args.speed)
+            ])
+            env["KAGAMI_SKIP_SETUP"] = "1"
+            env["KAGAMI_PROXY_BACKEND"] = "none"
+
+        self.process = subprocess.Popen(
+            [sys.executable, str(self.args.wrapper)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None if self.args.verbose else subprocess.DEVNULL,
+            env=env,
+            bufsize=0
+        )
+
+    def start_reader(self):
+        """Start collecting responses (after readiness polling)"""
+        threading.Thread(target=self._read_responses, daemon=True).start()
+
+    def _send(self, message: Dict[str, Any]):
+        self.process.stdin.write((json.dumps(message) + "\n").encode("utf-8"))
+        self.process.stdin.flush()
+
+    def _read_responses(self):
+        for line in self.process.stdout:
+            response = json.loads(line)
+            with self.responded:
+                sent = self.sent.pop(response.get("id"), None)
+                if sent:
+                    sent_at, label = sent
+                    self.latencies.setdefault(label, []).append(time.perf_counter() - sent_at)
+                    if "error" in response or (response.get("result") or {}).get("isError"):
+                        self.errors[label] = self.errors.get(label, 0) + 1
+                self.responded.notify_all()
+
+    def _request(self, message: Dict[str, Any], label: str):
+        with self.responded:
+            self.sent[message["id"]] = (time.perf_counter(), label)
+        self._send(message)
+
+    def _wait_idle(self, timeout: float) -> bool:
+        deadline = time.time() + timeout
+        with self.responded:
+            while self.sent:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.responded.wait(remaining)
+        return True
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Poll kagami/stats until the wrapper finished setup"""
+        deadline = time.time() + timeout
+        attempt = 0
+        while time.time() < deadline:
+            attempt += 1
+            self._send({"jsonrpc": "2.0", "id": f"replay-ready-{attempt}", "method": "kagami/stats"})
+            line = self.process.stdout.readline()
+            if not line:
+                return False
+            if (json.loads(line).get("result") or {}).get("setup_completed"):
+                return True
+            time.sleep(0.2)
+        return False
+
+    def run(self):
+        """Replay client messages (open loop at --speed, back-to-back at --speed 0)"""
+        started = time.perf_counter()
+        first_t = self.requests[0][0] if self.requests else 0.0
+
+        for t, message in self.requests:
+            if self.args.speed > 0:
+                delay = (t - first_t) / self.args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+
+            if "id" not in message:
+                self._send(message)
+                continue
+
+            self._request(message, request_key(message))
+            if self.args.speed == 0 and not self._wait_idle(self.args.timeout):
+                log(f"session {self.index}: timed out waiting for {request_key(message)}")
+                break
+
+        self._wait_idle(self.args.timeout)
+
+    def stop(self):
+        if self.process:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except Exception:
+                self.process.kill()
+
+
+def print_report(sessions: List[ReplaySession], elapsed: float, as_json: bool):
+    """Print latency distribution per method/tool"""
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    for session in sessions:
+        for label, values in session.latencies.items():
+            latencies.setdefault(label, []).extend(values)
+        for label, count in session.errors.items():
+            errors[label] = errors.get(label, 0) + count
+
+    rows = []
+    for label in sorted(latencies):
+        values = sorted(latencies[label])
+        rows.append({
+            "request": label,
+            "count": len(values),
+            "errors": errors.get(label, 0),
+            "min_ms": values[0] * 1000,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p90_ms": percentile(values, 90) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": values[-1] * 1000,
+        })
+
+    total = sum(row["count"] for row in rows)
+    if as_json:
+        print(json.dumps({"elapsed_s": elapsed, "requests": total, "rows": rows}, indent=2))
+        return
+
+    print(f"{'request':<40} {'count':>6} {'err':>4} {'min':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for row in rows:
+        print(f"{row['request']:<40} {row['count']:>6} {row['errors']:>4} "
+              f"{row['min_ms']:>7.1f}ms {row['p50_ms']:>7.1f}ms {row['p90_ms']:>7.1f}ms "
+              f"{row['p99_ms']:>7.1f}ms {row['max_ms']:>7.1f}ms")
+    print(f"\n{total} requests in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.1f} req/s)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded JSON-RPC sessions against mcp.py")
+    parser.add_argument("recording", help="Recording file written with KAGAMI_RECORD_FILE")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed factor (1 = recorded timing, 0 = back-to-back)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of parallel wrapper sessions")
+    parser.add_argument("--stub", action="store_true", help="Use recorded playwright-mcp responses instead of the real child")
+    parser.add_argument("--wrapper", default=str(Path(__file__).parent / "mcp.py"), help="Path to mcp.py")
+    parser.add_argument("--ready-timeout", type=float, default=300.0, help="Seconds to wait for wrapper setup")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for outstanding responses")
+    parser.add_argument("--json", action="store_true", help="Print report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show wrapper stderr")
+    parser.add_argument("--stub-child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stub_child:
+        return run_stub_child(args.recording, args.speed)
+
+    requests = [(entry["t"], entry["m"]) for entry in load_recording(args.recording) if entry["d"] == "c2w"]
+    if not requests:
+        log("No client messages in recording")
+        return 1
+
+    log(f"Replaying {len(requests)} client messages x {args.concurrency} session(s) "
+        f"(speed: {args.speed or 'back-to-back'}, child: {'stub' if args.stub else 'playwright-mcp'})")
+
+    sessions = [ReplaySession(i, args, requests) for i in range(args.concurrency)]
+    for session in sessions:
+        session.start()
+    for session in sessions:
+        if not session.wait_ready(args.ready_timeout):
+            log(f"session {session.index}: wrapper did not finish setup")
+            for s in sessions:
+                s.stop()
+            return 1
+    # Start response readers only after readiness polling consumed its replies
+    for session in sessions:
+        session.start_reader()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session.run) for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    for session in sessions:
+        session.stop()
+
+    print_report(sessions, elapsed, args.json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
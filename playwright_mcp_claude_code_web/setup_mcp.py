@@ -6,13 +6,14 @@
 Setup Script for Playwright MCP Server
 
 This script sets up the following:
-  1. certutil installation
-  2. @playwright/mcp installation
+  1. certutil installation (Firefox / Chromium)
+  2. @playwright/mcp installation (and Node compile cache warm-up)
   3. proxy.py installation
-  4. Firefox installation
-  5. Firefox profile creation
-  6. CA certificate import
-  7. MCP configuration file creation
+  4. Browser installation (KAGAMI_BROWSER, default firefox)
+  5. Browser profile (and certificate database) creation
+  6. Kagami local CA creation (KAGAMI_HTTP_CACHE=1 only)
+  7. CA certificate import (profile, ~/.pki/nssdb or system trust store, see browsers.py)
+  8. MCP configuration file creation
 
 Automatically called from SessionStart hook.
 """
@@ -20,8 +21,17 @@ import os
 import sys
 import subprocess
 import json
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List, Tuple
+
+from browsers import (ENGINES, CHROMIUM_NSS_DB, build_launch_options, get_browser_engine, get_cli_args,
+                      get_config_filename, get_node_compile_cache_dir, get_profile_dir,
+                      is_node_compile_cache_populated)
+from lean import get_chromium_args, get_firefox_prefs
+
+SYSTEM_CA_BUNDLE = Path("/etc/ssl/certs/ca-certificates.crt")
+SYSTEM_CA_DIR = Path("/usr/local/share/ca-certificates")
 
 
 def log(message: str, level: str = "INFO"):
@@ -79,22 +89,23 @@ def check_proxy_installed() -> bool:
     return result and result.returncode == 0
 
 
-def get_installed_firefox_version() -> Optional[Path]:
-    """Dynamically detect installed Firefox version
+def get_installed_browser_version(engine: Optional[str] = None) -> Optional[Path]:
+    """Dynamically detect installed browser version (KAGAMI_BROWSER engine by default)
 
     Returns:
-        Path to installed Firefox directory. Returns None if not found.
+        Path to installed browser directory. Returns None if not found.
         If multiple versions are installed, returns the latest version (highest number).
     """
+    engine = engine or get_browser_engine()
     cache_dir = Path("/home/user/.cache/ms-playwright")
 
     if not cache_dir.exists():
         return None
 
-    # Search for firefox-* pattern directories
-    firefox_dirs = list(cache_dir.glob("firefox-*"))
+    # Search for <engine>-* pattern directories (chromium_headless_shell-* does not match chromium-*)
+    browser_dirs = list(cache_dir.glob(f"{engine}-*"))
 
-    if not firefox_dirs:
+    if not browser_dirs:
         return None
 
     # Sort by version number (prefer latest version)
@@ -105,8 +116,8 @@ def get_installed_firefox_version() -> Optional[Path]:
         except (IndexError, ValueError):
             return 0
 
-    firefox_dirs.sort(key=extract_version, reverse=True)
-    return firefox_dirs[0]
+    browser_dirs.sort(key=extract_version, reverse=True)
+    return browser_dirs[0]
 
 
 def setup_certutil():
@@ -136,6 +147,94 @@ def setup_playwright_mcp():
     log("@playwright/mcp installed")
 
 
+def node_supports_compile_cache() -> bool:
+    """Node 22.1+ reads NODE_COMPILE_CACHE (older versions ignore it)"""
+    result = run_command(["node", "--version"], check=False, capture_output=True)
+    if not result or result.returncode != 0:
+        return False
+    try:
+        major, minor = (int(part) for part in result.stdout.strip().lstrip("v").split(".")[:2])
+    except ValueError:
+        return False
+    return (major, minor) >= (22, 1)
+
+
+def is_node_compile_cache_ready() -> bool:
+    """Compile cache populated, disabled, or unsupported by this Node"""
+    cache_dir = get_node_compile_cache_dir()
+    if not cache_dir or is_node_compile_cache_populated(cache_dir):
+        return True
+    return not node_supports_compile_cache()
+
+
+def time_playwright_mcp_start(env: dict) -> Optional[float]:
+    """
+    Start playwright-mcp, answer initialize and tools/list, exit cleanly
+    Returns seconds until tools/list answered (None on failure)
+    Node writes the compile cache on exit, so stdin is closed instead of killing the process
+    """
+    requests = [
+        {"jsonrpc": "2.0", "id": 1, "method": "initialize",
+         "params": {"protocolVersion": "2024-11-05", "capabilities": {},
+                    "clientInfo": {"name": "kagami-setup", "version": "1.0.0"}}},
+        {"jsonrpc": "2.0", "id": 2, "method": "tools/list", "params": {}},
+    ]
+    start_time = time.time()
+    process = subprocess.Popen(
+        ["node", "/opt/node22/lib/node_modules/@playwright/mcp/cli.js", "--headless"] + get_cli_args(),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env=env
+    )
+    try:
+        for request in requests:
+            process.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+            process.stdin.flush()
+            if not process.stdout.readline():
+                return None
+        elapsed = time.time() - start_time
+        process.stdin.close()
+        process.wait(timeout=10)
+        return elapsed
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+
+def setup_node_compile_cache():
+    """Pre-populate the Node compile cache with the playwright-mcp bundle"""
+    log("Checking Node compile cache...")
+
+    cache_dir = get_node_compile_cache_dir()
+    if not cache_dir:
+        log("Node compile cache disabled (KAGAMI_NODE_COMPILE_CACHE=0)")
+        return
+    if is_node_compile_cache_populated(cache_dir):
+        log(f"Node compile cache is already populated: {cache_dir}")
+        return
+    if not node_supports_compile_cache():
+        log("Node compile cache requires Node 22.1+, skipping", "WARN")
+        return
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    env = os.environ.copy()
+    env["HOME"] = "/home/user"
+    env["NODE_COMPILE_CACHE"] = str(cache_dir)
+
+    # First start compiles and writes the cache, the second one shows the saving
+    cold = time_playwright_mcp_start(env)
+    warm = time_playwright_mcp_start(env) if cold is not None else None
+    if cold is None or warm is None:
+        log("Node compile cache warm-up failed (playwright-mcp did not answer)", "WARN")
+        return
+    files = sum(1 for path in cache_dir.rglob("*") if path.is_file())
+    log(f"Node compile cache populated ({files} files, {cache_dir}): "
+        f"playwright-mcp start {cold:.2f}s cold, {warm:.2f}s warm")
+
+
 def setup_proxy_py():
     """Verify proxy.py installation"""
     log("Checking proxy.py installation status...")
@@ -156,201 +255,329 @@ def setup_proxy_py():
     log("proxy.py installed")
 
 
-def setup_firefox():
-    """Install Firefox"""
-    log("Checking Firefox installation status...")
+def setup_browser(engine: Optional[str] = None):
+    """Install the browser (KAGAMI_BROWSER engine by default)"""
+    engine = engine or get_browser_engine()
+    log(f"Checking {engine} installation status...")
 
-    firefox_build = get_installed_firefox_version()
+    browser_build = get_installed_browser_version(engine)
 
-    if firefox_build:
-        version = firefox_build.name.split('-')[1] if '-' in firefox_build.name else 'unknown'
-        log(f"Firefox is already installed: {firefox_build} (build v{version})")
+    if browser_build:
+        version = browser_build.name.split('-')[1] if '-' in browser_build.name else 'unknown'
+        log(f"{engine} is already installed: {browser_build} (build v{version})")
         return
 
-    log("Installing Firefox... (may take several minutes)", "WARN")
+    log(f"Installing {engine}... (may take several minutes)", "WARN")
 
     env = os.environ.copy()
     env["HOME"] = "/home/user"
 
+    # WebKit needs GStreamer / libsoup and friends that the image does not ship
+    with_deps = ["--with-deps"] if engine == "webkit" else []
     run_command([
         "node",
         "/opt/node22/lib/node_modules/@playwright/mcp/node_modules/playwright/cli.js",
         "install",
-        "firefox"
-    ])
+    ] + with_deps + [engine])
 
     # Check version after installation
-    firefox_build = get_installed_firefox_version()
-    if firefox_build:
-        version = firefox_build.name.split('-')[1] if '-' in firefox_build.name else 'unknown'
-        log(f"Firefox installed: {firefox_build} (build v{version})")
+    browser_build = get_installed_browser_version(engine)
+    if browser_build:
+        version = browser_build.name.split('-')[1] if '-' in browser_build.name else 'unknown'
+        log(f"{engine} installed: {browser_build} (build v{version})")
     else:
-        log("Firefox installation completed but version could not be verified", "WARN")
+        log(f"{engine} installation completed but version could not be verified", "WARN")
 
 
-def setup_firefox_profile():
-    """Create Firefox profile"""
-    log("Checking Firefox profile...")
+def setup_nss_db(db_dir: Path):
+    """Create an NSS certificate database (Firefox profile or Chromium's ~/.pki/nssdb)"""
+    log(f"Checking NSS database {db_dir}...")
 
-    profile_dir = Path("/home/user/firefox-profile")
-    cert_db = profile_dir / "cert9.db"
+    cert_db = db_dir / "cert9.db"
 
-    if profile_dir.exists() and cert_db.exists():
-        log(f"Firefox profile already exists: {profile_dir}")
+    if db_dir.exists() and cert_db.exists():
+        log(f"NSS database already exists: {db_dir}")
         return
 
-    log("Creating Firefox profile...")
+    log("Creating NSS database...")
 
-    profile_dir.mkdir(parents=True, exist_ok=True)
+    db_dir.mkdir(parents=True, exist_ok=True)
 
     run_command([
         "certutil",
         "-N",
-        "-d", f"sql:{profile_dir}",
+        "-d", f"sql:{db_dir}",
         "--empty-password"
     ])
 
-    log(f"Firefox profile created: {profile_dir}")
+    log(f"NSS database created: {db_dir}")
 
 
-def import_ca_certificate_to_profile(profile_dir: Path):
-    """Import CA certificates to specified Firefox profile"""
-    staging_cert = Path("/usr/local/share/ca-certificates/swp-ca-staging.crt")
-    production_cert = Path("/usr/local/share/ca-certificates/swp-ca-production.crt")
+def get_nss_db_dir(engine: Optional[str] = None, profile_dir: Optional[Path] = None) -> Optional[Path]:
+    """NSS database the engine reads CA certificates from (None for WebKit)"""
+    engine = engine or get_browser_engine()
+    cert_store = ENGINES[engine]["cert_store"]
+    if cert_store == "profile":
+        return profile_dir or get_profile_dir(engine)
+    if cert_store == "nssdb":
+        return CHROMIUM_NSS_DB
+    return None
 
-    # Verify certificate files exist
-    if not staging_cert.exists():
-        log(f"Staging CA certificate not found: {staging_cert}", "ERROR")
-        return False
 
-    if not production_cert.exists():
-        log(f"Production CA certificate not found: {production_cert}", "ERROR")
-        return False
+def setup_browser_profile(engine: Optional[str] = None, profile_dir: Optional[Path] = None):
+    """Create the browser profile and the certificate database the engine uses"""
+    engine = engine or get_browser_engine()
+    profile_dir = profile_dir or get_profile_dir(engine)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    nss_db = get_nss_db_dir(engine, profile_dir)
+    if nss_db:
+        setup_nss_db(nss_db)
+
+
+def is_http_cache_enabled() -> bool:
+    """Check if the caching proxy tier is enabled (KAGAMI_HTTP_CACHE)"""
+    return os.environ.get("KAGAMI_HTTP_CACHE", "0").strip().lower() in ("1", "true", "yes", "on")
+
 
-    # Import staging CA certificate
+def is_proxypy_backend() -> bool:
+    """Check if proxy.py is the local proxy backend (KAGAMI_PROXY_BACKEND)"""
+    return (os.environ.get("KAGAMI_PROXY_BACKEND", "proxypy").strip() or "proxypy") == "proxypy"
+
+
+def get_kagami_ca_dir() -> Path:
+    """Directory of the Kagami local CA (used by cache_proxy.py for TLS interception)"""
+    return Path(os.environ.get("KAGAMI_CA_DIR", "/home/user/.kagami/ca"))
+
+
+def create_ca(ca_dir: Path, common_name: str):
+    """Generate a CA (kagami-ca.crt / kagami-ca.key, the layout cache_proxy.CertificateAuthority expects)"""
+    ca_cert = ca_dir / "kagami-ca.crt"
+    ca_key = ca_dir / "kagami-ca.key"
+
+    if ca_cert.exists() and ca_key.exists():
+        log(f"{common_name} already exists: {ca_cert}")
+        return
+
+    log(f"Creating {common_name}...")
+    ca_dir.mkdir(parents=True, exist_ok=True)
+    run_command([
+        "openssl", "req", "-x509",
+        "-newkey", "rsa:2048", "-nodes",
+        "-keyout", str(ca_key),
+        "-out", str(ca_cert),
+        "-days", "3650",
+        "-subj", f"/CN={common_name}",
+        "-addext", "basicConstraints=critical,CA:TRUE",
+        "-addext", "keyUsage=critical,keyCertSign,cRLSign"
+    ], capture_output=True)
+    ca_key.chmod(0o600)
+    log(f"{common_name} created: {ca_cert}")
+
+
+def setup_kagami_ca():
+    """Generate Kagami local CA for the caching proxy"""
+    log("Checking Kagami local CA...")
+    create_ca(get_kagami_ca_dir(), "Kagami Local Cache CA")
+
+
+def import_certificate(profile_dir: Path, nickname: str, cert_path: Path):
+    """Import a CA certificate to an NSS database (skipped if already imported)"""
     result = run_command([
         "certutil",
         "-L",
         "-d", f"sql:{profile_dir}",
-        "-n", "Anthropic TLS Inspection CA"
+        "-n", nickname
     ], check=False, capture_output=True)
 
     if result and result.returncode == 0:
-        log(f"Staging CA certificate already imported to {profile_dir}")
-    else:
-        log(f"Importing staging CA certificate to {profile_dir}...")
-        run_command([
-            "certutil",
-            "-A",
-            "-n", "Anthropic TLS Inspection CA",
-            "-t", "CT,C,C",
-            "-i", str(staging_cert),
-            "-d", f"sql:{profile_dir}"
-        ])
-        log("Staging CA certificate imported")
-
-    # Import production CA certificate
-    result = run_command([
+        log(f"{nickname} certificate already imported to {profile_dir}")
+        return
+
+    log(f"Importing {nickname} certificate to {profile_dir}...")
+    run_command([
         "certutil",
-        "-L",
-        "-d", f"sql:{profile_dir}",
-        "-n", "Anthropic TLS Inspection CA Production"
-    ], check=False, capture_output=True)
+        "-A",
+        "-n", nickname,
+        "-t", "CT,C,C",
+        "-i", str(cert_path),
+        "-d", f"sql:{profile_dir}"
+    ])
+    log(f"{nickname} certificate imported")
 
-    if result and result.returncode == 0:
-        log(f"Production CA certificate already imported to {profile_dir}")
-    else:
-        log(f"Importing production CA certificate to {profile_dir}...")
-        run_command([
-            "certutil",
-            "-A",
-            "-n", "Anthropic TLS Inspection CA Production",
-            "-t", "CT,C,C",
-            "-i", str(production_cert),
-            "-d", f"sql:{profile_dir}"
-        ])
-        log("Production CA certificate imported")
 
-    return True
+def get_inspection_ca_certs() -> List[Tuple[str, Path]]:
+    """
+    TLS inspection CA certificates as (nickname, path)
+    KAGAMI_INSPECTION_CA_CERTS (comma-separated paths) replaces them, e.g. for the offline bench
+    """
+    override = os.environ.get("KAGAMI_INSPECTION_CA_CERTS")
+    if override:
+        return [(f"Kagami Inspection CA {Path(path).stem}", Path(path))
+                for path in (p.strip() for p in override.split(",")) if path]
+    return [
+        ("Anthropic TLS Inspection CA", Path("/usr/local/share/ca-certificates/swp-ca-staging.crt")),
+        ("Anthropic TLS Inspection CA Production", Path("/usr/local/share/ca-certificates/swp-ca-production.crt")),
+    ]
 
 
-def import_ca_certificates():
-    """Import JWT authentication proxy CA certificates to all Firefox profiles"""
-    log("Checking CA certificate import status...")
+def import_ca_certificate_to_profile(profile_dir: Path):
+    """Import CA certificates to specified NSS database (Firefox profile or ~/.pki/nssdb)"""
+    certs = get_inspection_ca_certs()
 
-    # Import to main profile
-    main_profile = Path("/home/user/firefox-profile")
-    import_ca_certificate_to_profile(main_profile)
+    # Verify certificate files exist
+    for nickname, cert_path in certs:
+        if not cert_path.exists():
+            log(f"{nickname} certificate not found: {cert_path}", "ERROR")
+            return False
 
-    # Import to Playwright MCP profile if it exists
-    mcp_profile = Path("/home/user/.cache/ms-playwright/mcp-firefox")
-    if mcp_profile.exists() and (mcp_profile / "cert9.db").exists():
-        log("Found Playwright MCP profile, importing CA certificates...")
-        import_ca_certificate_to_profile(mcp_profile)
+    for nickname, cert_path in certs:
+        import_certificate(profile_dir, nickname, cert_path)
 
+    # Kagami local CA (caching proxy TLS interception)
+    kagami_cert = get_kagami_ca_dir() / "kagami-ca.crt"
+    if is_http_cache_enabled() and kagami_cert.exists():
+        import_certificate(profile_dir, "Kagami Local Cache CA", kagami_cert)
 
-def setup_config_file():
-    """Create MCP configuration file"""
-    log("Checking MCP configuration file...")
+    return True
 
-    script_dir = Path(__file__).parent
-    config_file = script_dir / "playwright-firefox-config.json"
 
-    if config_file.exists():
-        log(f"MCP configuration file already exists: {config_file}")
+def pem_blocks(text: str) -> List[str]:
+    """Base64 bodies of the PEM certificates in a file (whitespace removed)"""
+    blocks, current = [], None
+    for line in text.splitlines():
+        line = line.strip()
+        if line == "-----BEGIN CERTIFICATE-----":
+            current = []
+        elif line == "-----END CERTIFICATE-----" and current is not None:
+            blocks.append("".join(current))
+            current = None
+        elif current is not None:
+            current.append(line)
+    return blocks
+
+
+def import_ca_certificates_to_system() -> bool:
+    """
+    Make sure the CA certificates are in the system trust store (WebKit reads no NSS database)
+    Certificates under /usr/local/share/ca-certificates are added with update-ca-certificates;
+    others (e.g. the Kagami local CA) are never made trusted system-wide, WebKit relies on
+    ignoreHTTPSErrors for them
+    """
+    certs = get_inspection_ca_certs()
+    kagami_cert = get_kagami_ca_dir() / "kagami-ca.crt"
+    if is_http_cache_enabled() and kagami_cert.exists():
+        certs.append(("Kagami Local Cache CA", kagami_cert))
+
+    def missing_certs() -> List[Tuple[str, Path]]:
+        try:
+            trusted = set(pem_blocks(SYSTEM_CA_BUNDLE.read_text()))
+        except OSError:
+            trusted = set()
+        return [(nickname, path) for nickname, path in certs
+                if not path.exists() or not set(pem_blocks(path.read_text())) <= trusted]
+
+    missing = missing_certs()
+    if missing and any(path.parent == SYSTEM_CA_DIR and path.exists() for _, path in missing):
+        log("Updating system trust store (update-ca-certificates)...")
+        run_command(["update-ca-certificates"], check=False, capture_output=True)
+        missing = missing_certs()
+
+    for nickname, path in missing:
+        log(f"{nickname} is not in the system trust store ({path}); WebKit relies on ignoreHTTPSErrors", "WARN")
+    if not missing:
+        log(f"CA certificates are trusted by the system store: {SYSTEM_CA_BUNDLE}")
+    return not missing
+
+
+def import_ca_certificates(engine: Optional[str] = None):
+    """Import JWT authentication proxy CA certificates where the browser engine reads them"""
+    engine = engine or get_browser_engine()
+    log(f"Checking CA certificate import status ({engine})...")
+
+    nss_db = get_nss_db_dir(engine)
+    if not nss_db:
+        import_ca_certificates_to_system()
         return
 
-    log("Creating MCP configuration file...")
+    # Import to main profile (Firefox) or the shared NSS database (Chromium)
+    import_ca_certificate_to_profile(nss_db)
+
+    # Import to Playwright MCP profile if it exists
+    mcp_profile = Path("/home/user/.cache/ms-playwright/mcp-firefox")
+    if engine == "firefox" and mcp_profile.exists() and (mcp_profile / "cert9.db").exists():
+        log("Found Playwright MCP profile, importing CA certificates...")
+        import_ca_certificate_to_profile(mcp_profile)
 
+
+def build_config(user_data_dir: Optional[str] = None, engine: Optional[str] = None) -> dict:
+    """Build MCP configuration for the browser engine (lean mode adds Firefox prefs / Chromium switches)"""
+    engine = engine or get_browser_engine()
     # Playwright MCP configuration (correct structure from commit 16d440a)
     config = {
         "browser": {
-            "browserName": "firefox",
-            "userDataDir": "/home/user/firefox-profile",
-            "launchOptions": {
-                "headless": True,
-                "firefoxUserPrefs": {
-                    "privacy.trackingprotection.enabled": False,
-                    "network.proxy.allow_hijacking_localhost": True,
-                    "network.stricttransportsecurity.preloadlist": False,
-                    "security.cert_pinning.enforcement_level": 0,
-                    "security.enterprise_roots.enabled": False,
-                    "security.ssl.errorReporting.enabled": False,
-                    "browser.xul.error_pages.expert_bad_cert": True,
-                    "media.navigator.streams.fake": True,
-                    "security.insecure_connection_text.enabled": False,
-                    "security.insecure_connection_text.pbmode.enabled": False,
-                    "security.mixed_content.block_active_content": False,
-                    "security.mixed_content.block_display_content": False,
-                    "security.OCSP.enabled": 0
-                },
-                "acceptDownloads": False
-            },
+            "browserName": engine,
+            "userDataDir": user_data_dir or str(get_profile_dir(engine)),
+            "launchOptions": build_launch_options(engine),
             "contextOptions": {
                 "ignoreHTTPSErrors": True,
                 "bypassCSP": True
             }
         }
     }
+    return config
+
+
+def is_config_file_current() -> bool:
+    """Check if the MCP configuration file exists and matches the current settings (e.g. KAGAMI_LEAN)"""
+    config_file = Path(__file__).parent / get_config_filename()
+    try:
+        with open(config_file) as f:
+            return json.load(f) == build_config()
+    except (OSError, ValueError):
+        return False
+
 
+def setup_config_file():
+    """Create (or update) MCP configuration file"""
+    log("Checking MCP configuration file...")
+
+    script_dir = Path(__file__).parent
+    config_file = script_dir / get_config_filename()
+
+    if is_config_file_current():
+        log(f"MCP configuration file already exists: {config_file}")
+        return
+
+    log("Creating MCP configuration file...")
+
+    config = build_config()
     with open(config_file, "w") as f:
         json.dump(config, f, indent=2)
 
-    log(f"MCP configuration file created: {config_file}")
+    lean_extras = {"firefox": (len(get_firefox_prefs()), "prefs"),
+                   "chromium": (len(get_chromium_args()), "switches")}.get(get_browser_engine(), (0, ""))
+    log(f"MCP configuration file created: {config_file}"
+        + (f" (lean mode, {lean_extras[0]} extra {lean_extras[1]})" if lean_extras[0] else ""))
 
 
 def check_setup_completed() -> bool:
     """Check if setup is completed"""
-    script_dir = Path(__file__).parent
-
+    engine = get_browser_engine()
+    nss_db = get_nss_db_dir(engine)
     checks = [
-        ("certutil", lambda: check_command_exists("certutil")),
         ("@playwright/mcp", lambda: check_npm_package_installed("@playwright/mcp")),
-        ("proxy.py", lambda: check_proxy_installed()),
-        ("Firefox", lambda: get_installed_firefox_version() is not None),
-        ("Firefox profile", lambda: Path("/home/user/firefox-profile/cert9.db").exists()),
-        ("MCP configuration file", lambda: (script_dir / "playwright-firefox-config.json").exists()),
+        ("Node compile cache", lambda: is_node_compile_cache_ready()),
+        (engine, lambda: get_installed_browser_version(engine) is not None),
+        (f"{engine} profile", lambda: get_profile_dir(engine).exists()),
+        ("MCP configuration file", lambda: is_config_file_current()),
     ]
+    if nss_db:
+        checks.insert(0, ("certutil", lambda: check_command_exists("certutil")))
+        checks.append(("NSS database", lambda: (nss_db / "cert9.db").exists()))
+    if is_proxypy_backend():
+        checks.append(("proxy.py", lambda: check_proxy_installed()))
+    if is_http_cache_enabled():
+        checks.append(("Kagami local CA", lambda: (get_kagami_ca_dir() / "kagami-ca.crt").exists()))
 
     all_ok = True
     for name, check_func in checks:
@@ -378,11 +605,16 @@ def main():
             return 0
 
         # Run setup
-        setup_certutil()
+        if get_nss_db_dir():
+            setup_certutil()
         setup_playwright_mcp()
-        setup_proxy_py()
-        setup_firefox()
-        setup_firefox_profile()
+        setup_node_compile_cache()
+        if is_proxypy_backend():
+            setup_proxy_py()
+        setup_browser()
+        setup_browser_profile()
+        if is_http_cache_enabled():
+            setup_kagami_ca()
         import_ca_certificates()
         setup_config_file()
 
@@ -11,6 +11,8 @@ import json
 import sys
 from pathlib import Path
 
+from browsers import get_browser_engine, get_config_filename
+
 
 def check_npm_package(package_name: str) -> bool:
     """Check if npm package is installed globally"""
@@ -50,11 +52,11 @@ def create_minimal_config() -> bool:
     """Create minimal playwright-mcp config file"""
     try:
         script_dir = Path(__file__).parent
-        config_path = script_dir / "playwright-firefox-config.json"
+        config_path = script_dir / get_config_filename()
 
         # Minimal config (will be deleted and replaced by setup_mcp.py)
         config = {
-            "browser": "firefox",
+            "browser": get_browser_engine(),
             "headless": True
         }
 
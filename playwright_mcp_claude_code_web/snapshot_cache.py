@@ -0,0 +1,244 @@
+"""
+Snapshot / extraction cache for revisited pages (KAGAMI_SNAPSHOT_CACHE=1)
+
+Entries hold a tool result. They expire after KAGAMI_SNAPSHOT_CACHE_TTL and the least
+recently used ones are evicted beyond KAGAMI_SNAPSHOT_CACHE_MB.
+
+Browser (one SnapshotCache per playwright-mcp process, see mcp.call_with_snapshot_cache):
+repeated snapshots of the same page load. Every tool call reaches the browser (a
+revisit navigates again) except browser_snapshot, which is answered with the tab's
+last snapshot while its page is known to be unchanged:
+  - the tab loaded it with browser_navigate and nothing was done to it since, and
+  - the local proxies saw no traffic since (network_idle.py activity; never in daemon
+    mode, where that signal mixes every session's traffic)
+Entries are kept per tab (browser_tabs new / select / close). Any tool not in
+READ_ONLY_TOOLS or NAVIGATION_TOOLS drops the current tab's entry.
+
+kagami_fetch_many results (extracted text / HTML) are cached per URL, format and
+size cap by a separate instance shared by all sessions; a page-changing browser tool
+also drops the fetched copies of that page, which may differ from a fresh load from then on.
+
+Standard library only.
+"""
+import itertools
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+DEFAULT_TTL = 300.0
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# Tools that do not change the page (everything else drops the current tab's entry)
+READ_ONLY_TOOLS = {
+    "browser_snapshot",
+    "browser_take_screenshot",
+    "browser_console_messages",
+    "browser_network_requests",
+    "browser_wait_for",
+    "browser_pdf_save",
+}
+# Tools that load another page in the tab (or change tabs) without changing the page left
+NAVIGATION_TOOLS = {"browser_navigate", "browser_navigate_back", "browser_navigate_forward", "browser_tabs",
+                    "browser_close"}
+
+_tab_ids = itertools.count(1)
+
+SNAPSHOT_PATTERN = re.compile(r"```yaml\n(.*?)```", re.S)
+PAGE_URL_PATTERN = re.compile(r"Page URL: (\S+)")
+CURRENT_TAB_PATTERN = re.compile(r"^- (\d+): \(current\)", re.M)
+
+
+def result_text(response: Optional[Dict[str, Any]]) -> str:
+    result = (response or {}).get("result")
+    if not isinstance(result, dict):
+        return ""
+    return "\n".join(item.get("text", "") for item in result.get("content") or []
+                     if isinstance(item, dict) and item.get("type") == "text")
+
+
+def page_url(text: str) -> Optional[str]:
+    match = PAGE_URL_PATTERN.search(text)
+    return match.group(1) if match else None
+
+
+def new_stats() -> Dict[str, Any]:
+    return {"hits": 0, "misses": 0, "entries": 0, "bytes": 0, "evictions": 0, "invalidations": 0}
+
+
+def summarize_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
+    lookups = stats["hits"] + stats["misses"]
+    return dict(stats, hit_rate=stats["hits"] / lookups if lookups else 0.0)
+
+
+class TabState:
+    """What the cache knows about the page in one browser tab"""
+
+    __slots__ = ("key", "url", "pristine", "network_mark")
+
+    def __init__(self):
+        self.key = f"tab-{next(_tab_ids)}"  # Entry key of the tab's last snapshot (stable across index shifts)
+        self.url: Optional[str] = None
+        self.pristine = False  # Nothing was done to the page since it loaded
+        self.network_mark: Optional[Tuple[int, float]] = None  # Proxy activity when it was last snapshotted
+
+
+class SnapshotCache:
+    """LRU of tool results with TTL, plus the browser state needed to serve them safely"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES,
+                 stats: Optional[Dict[str, Any]] = None, stats_lock: Optional[threading.Lock] = None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = stats if stats is not None else new_stats()  # Shared by every instance in the process
+        self.stats_lock = stats_lock or threading.Lock()  # Shared along with stats
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        # Browser state (tabs by index, as playwright-mcp numbers them)
+        self.tabs: List[TabState] = [TabState()]
+        self.current = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Fresh entry for key (counted as a hit or miss)"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and time.time() - entry["stored_at"] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry:
+                self.entries.move_to_end(key)
+            self.count(**{"hits" if entry else "misses": 1})
+            return entry
+
+    def put(self, key: str, result: Dict[str, Any], url: Optional[str] = None,
+            final_url: Optional[str] = None) -> Dict[str, Any]:
+        """Store a result under key (default: its URL), evicting the least recently used entries beyond max_bytes"""
+        size = len(json.dumps(result))
+        entry = {"url": url or key, "final_url": final_url or url or key, "result": result, "size": size,
+                 "stored_at": time.time()}
+        with self.lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return entry
+            self.entries[key] = entry
+            self.bytes += size
+            self.count(entries=1, bytes=size)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.count(evictions=1)
+        return entry
+
+    def invalidate(self, url: Optional[str]):
+        """Drop entries for url (requested or final URL)"""
+        if not url:
+            return
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if url in (entry["url"], entry["final_url"])]:
+                self._remove(key)
+                self.count(invalidations=1)
+
+    def discard(self, key: str):
+        """Drop the entry stored under key"""
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+                self.count(invalidations=1)
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.bytes -= entry["size"]
+            self.count(entries=-1, bytes=-entry["size"])
+
+    def count(self, **deltas):
+        with self.stats_lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    # Browser state
+
+    def tab(self) -> TabState:
+        return self.tabs[self.current]
+
+    def browser_restarted(self):
+        """playwright-mcp was relaunched (or the browser closed): every tab is gone"""
+        for tab in self.tabs:
+            self.discard(tab.key)
+        self.tabs = [TabState()]
+        self.current = 0
+
+    def tabs_changed(self, arguments: Dict[str, Any], response: Optional[Dict[str, Any]]):
+        """browser_tabs returned: follow new / select / close, then the "(current)" marker in the tab list"""
+        action = arguments.get("action")
+        index = arguments.get("index")
+        if action == "new":
+            self.tabs.append(TabState())
+            self.current = len(self.tabs) - 1
+        elif action == "select" and isinstance(index, int) and 0 <= index < len(self.tabs):
+            self.current = index
+        elif action == "close":
+            closed = index if isinstance(index, int) else self.current
+            if 0 <= closed < len(self.tabs):
+                self.discard(self.tabs.pop(closed).key)
+                if closed < self.current:
+                    self.current -= 1
+            if not self.tabs:
+                self.tabs.append(TabState())
+            self.current = min(self.current, len(self.tabs) - 1)
+
+        match = CURRENT_TAB_PATTERN.search(result_text(response))
+        if match:
+            current = int(match.group(1))
+            while current >= len(self.tabs):
+                self.tabs.append(TabState())
+            self.current = current
+
+    def page_loaded(self, requested_url: Optional[str], response: Optional[Dict[str, Any]],
+                    network_mark: Optional[Tuple[int, float]]):
+        """browser_navigate returned: the tab holds a fresh page, whose snapshot is the tab's entry"""
+        tab = self.tab()
+        self.discard(tab.key)
+        text = result_text(response)
+        tab.url = page_url(text) or requested_url
+        tab.pristine = bool(text) and not (response or {}).get("result", {}).get("isError")
+        tab.network_mark = network_mark if tab.pristine else None
+        if tab.pristine and SNAPSHOT_PATTERN.search(text):
+            self.put(tab.key, response["result"], url=tab.url)
+
+    def page_left(self, response: Optional[Dict[str, Any]]):
+        """History navigation returned: another page, possibly restored in an earlier state"""
+        tab = self.tab()
+        self.discard(tab.key)
+        tab.url = page_url(result_text(response))
+        tab.pristine = False
+        tab.network_mark = None
+
+    def page_snapshotted(self, response: Optional[Dict[str, Any]], network_mark: Optional[Tuple[int, float]]):
+        """A real browser_snapshot returned: refresh the tab's entry if nothing was done to the page"""
+        tab = self.tab()
+        text = result_text(response)
+        tab.url = page_url(text) or tab.url
+        if not tab.pristine or not tab.url or not text or (response or {}).get("result", {}).get("isError"):
+            return
+        tab.network_mark = network_mark
+        self.put(tab.key, response["result"], url=tab.url)
+
+    def page_touched(self, tool: str, response: Optional[Dict[str, Any]]):
+        """Any other browser tool returned: the tab's page may no longer match a fresh load"""
+        tab = self.tab()
+        if tool not in READ_ONLY_TOOLS:
+            self.discard(tab.key)
+            tab.pristine = False
+            tab.network_mark = None
+        tab.url = page_url(result_text(response)) or tab.url
+
+    def snapshot_hit(self, network_mark: Optional[Tuple[int, float]]) -> Optional[Dict[str, Any]]:
+        """Entry answering browser_snapshot: the tab's last snapshot if nothing was done to it and no traffic since"""
+        tab = self.tab()
+        if not tab.pristine or network_mark is None or network_mark != tab.network_mark:
+            self.count(misses=1)
+            return None
+        return self.get(tab.key)
@@ -0,0 +1,345 @@
+"""
+Named Playwright storage states (cookies + localStorage) kept across browser launches
+
+Layout ($KAGAMI_STORAGE_STATE_DIR, default /home/user/.cache/kagami-storage-state):
+  <name>.json       plain storage state
+  <name>.json.enc   encrypted at rest (KAGAMI_STORAGE_STATE_KEY set)
+
+A state holds one entry per site (cookie domain / localStorage origin host), each with
+its own expiry, so saving after a login on one site keeps the others:
+
+  {"version": 1, "sites": {"example.com": {"saved_at": ..., "expires_at": ...,
+                                           "cookies": [...], "origins": [...]}}}
+
+Encryption uses `openssl enc -aes-256-cbc -pbkdf2` (the passphrase is passed through the
+environment, never on the command line) plus an HMAC-SHA256 over the ciphertext.
+
+The browser side runs through playwright-mcp's browser_run_code tool:
+  - save:    page.context().storageState()
+  - restore: context.addCookies() and an init script that fills localStorage
+             on matching origins before page scripts run
+
+Standard library only (plus the openssl CLI for encryption).
+"""
+import hashlib
+import hmac
+import json
+import math
+import os
+import re
+import subprocess
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlsplit
+
+DEFAULT_TTL = 7 * 24 * 3600
+ENCRYPTED_MAGIC = b"KAGAMI-STATE-ENC1\n"
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+SAVE_CODE = "async (page) => await page.context().storageState()"
+
+RESTORE_CODE = """async (page) => {
+  const state = %s;
+  const context = page.context();
+  if (state.cookies.length)
+    await context.addCookies(state.cookies);
+  if (state.origins.length) {
+    const fill = origins => {
+      const entry = origins.find(origin => origin.origin === location.origin);
+      if (!entry)
+        return;
+      try {
+        for (const { name, value } of entry.localStorage) {
+          if (localStorage.getItem(name) === null)
+            localStorage.setItem(name, value);
+        }
+      } catch (e) {}
+    };
+    await context.addInitScript(fill, state.origins);
+    await page.evaluate(fill, state.origins).catch(() => {});
+  }
+  return { cookies: state.cookies.length, origins: state.origins.length };
+}"""
+
+
+class StorageStateError(Exception):
+    """Storage state cannot be read, written or decrypted"""
+
+
+def cookie_site(cookie: Dict[str, Any]) -> str:
+    return str(cookie.get("domain", "")).lstrip(".").lower()
+
+
+def origin_site(origin: Dict[str, Any]) -> str:
+    return (urlsplit(str(origin.get("origin", ""))).hostname or "").lower()
+
+
+def normalize_site(value: str) -> str:
+    """Host from a URL, origin or bare host"""
+    value = value.strip().lower()
+    if "://" in value:
+        return urlsplit(value).hostname or ""
+    return value.split("/", 1)[0].split(":", 1)[0].lstrip(".")
+
+
+def parse_sites(value: Any) -> Optional[List[str]]:
+    """sites tool argument: a list of strings, or None (raises StorageStateError)"""
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(site, str) for site in value):
+        raise StorageStateError("sites must be a list of strings")
+    return value
+
+
+def parse_ttl(value: Any) -> Optional[float]:
+    """ttl_seconds tool argument: a non-negative number, or None (raises StorageStateError)"""
+    if value is None:
+        return None
+    try:
+        if isinstance(value, bool):
+            raise ValueError(value)
+        ttl = float(value)
+    except (TypeError, ValueError):
+        raise StorageStateError("ttl_seconds must be a number")
+    if not math.isfinite(ttl) or ttl < 0:
+        raise StorageStateError("ttl_seconds must be a non-negative number")
+    return ttl
+
+
+def site_matches(site: str, selected: List[str]) -> bool:
+    """site is one of the selected hosts, or a parent domain whose cookies they receive"""
+    return any(host == site or host.endswith(f".{site}") or site.endswith(f".{host}") for host in selected)
+
+
+def split_by_site(state: Dict[str, Any]) -> Dict[str, Dict[str, list]]:
+    """Group a Playwright storageState by site"""
+    sites: Dict[str, Dict[str, list]] = {}
+    for cookie in state.get("cookies") or []:
+        sites.setdefault(cookie_site(cookie), {"cookies": [], "origins": []})["cookies"].append(cookie)
+    for origin in state.get("origins") or []:
+        if origin.get("localStorage"):
+            sites.setdefault(origin_site(origin), {"cookies": [], "origins": []})["origins"].append(origin)
+    sites.pop("", None)
+    return sites
+
+
+def parse_run_code_result(response: Optional[Dict[str, Any]]) -> Any:
+    """
+    Return value of a browser_run_code call (the JSON after "### Result")
+    Raises StorageStateError with the tool's message on failure
+    """
+    if not response:
+        raise StorageStateError("no response from playwright-mcp")
+    if "error" in response:
+        raise StorageStateError(response["error"].get("message", "playwright-mcp error"))
+
+    result = response.get("result") or {}
+    text = "\n".join(item.get("text", "") for item in result.get("content") or [] if isinstance(item, dict))
+    if result.get("isError"):
+        raise StorageStateError(text.strip() or "browser_run_code failed")
+
+    match = re.search(r"### Result\s*\n(.*?)(?:\n### |\Z)", text, re.S)
+    try:
+        value = json.loads((match.group(1) if match else text).strip())
+        if isinstance(value, str):
+            value = json.loads(value)
+        return value
+    except ValueError:
+        raise StorageStateError(f"unexpected browser_run_code output: {text[:200]}")
+
+
+class StorageStateStore:
+    """Directory of named storage states with per-site TTLs"""
+
+    def __init__(self, directory: Path, key: Optional[str] = None, default_ttl: float = DEFAULT_TTL):
+        self.directory = directory
+        self.key = key or None
+        self.default_ttl = default_ttl
+
+    @classmethod
+    def from_env(cls) -> "StorageStateStore":
+        try:
+            ttl = float(os.environ.get("KAGAMI_STORAGE_STATE_TTL", DEFAULT_TTL))
+        except ValueError:
+            ttl = DEFAULT_TTL
+        return cls(Path(os.environ.get("KAGAMI_STORAGE_STATE_DIR", "/home/user/.cache/kagami-storage-state")),
+                   os.environ.get("KAGAMI_STORAGE_STATE_KEY"), ttl)
+
+    def path(self, name: str) -> Path:
+        if not NAME_PATTERN.match(name):
+            raise StorageStateError(f"invalid state name '{name}' (letters, digits, '.', '_', '-')")
+        return self.directory / (f"{name}.json.enc" if self.key else f"{name}.json")
+
+    def load(self, name: str) -> Dict[str, Any]:
+        """Stored state (empty if missing); expired sites are dropped"""
+        path = self.path(name)
+        if not path.exists():
+            return {"version": 1, "sites": {}}
+        try:
+            data = path.read_bytes()
+            document = json.loads(self.decrypt(data) if self.key else data)
+        except (OSError, ValueError) as e:
+            raise StorageStateError(f"cannot read {path}: {e}")
+
+        now = time.time()
+        document["sites"] = {site: entry for site, entry in (document.get("sites") or {}).items()
+                             if entry.get("expires_at", 0) > now}
+        return document
+
+    def save(self, name: str, state: Dict[str, Any], sites: Optional[List[str]] = None,
+             ttl: Optional[float] = None) -> List[str]:
+        """
+        Merge a Playwright storageState into the named state
+        sites limits the save to those hosts (and parent cookie domains)
+        Returns the sites written
+        """
+        selected = [normalize_site(site) for site in sites or [] if normalize_site(site)]
+        document = self.load(name)
+        now = time.time()
+        expires_at = now + (self.default_ttl if ttl is None else ttl)
+
+        written = []
+        for site, entry in split_by_site(state).items():
+            if selected and not site_matches(site, selected):
+                continue
+            # Session cookies (expires -1) and live cookies are kept, expired ones dropped
+            entry["cookies"] = [cookie for cookie in entry["cookies"]
+                                if cookie.get("expires", -1) <= 0 or cookie["expires"] > now]
+            document["sites"][site] = dict(entry, saved_at=round(now, 3), expires_at=round(expires_at, 3))
+            written.append(site)
+
+        self.write(name, document)
+        return sorted(written)
+
+    def restore_state(self, name: str, sites: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Unexpired entries merged back into Playwright storageState form"""
+        selected = [normalize_site(site) for site in sites or [] if normalize_site(site)]
+        cookies: List[Dict[str, Any]] = []
+        origins: List[Dict[str, Any]] = []
+        now = time.time()
+        for site, entry in sorted(self.load(name)["sites"].items()):
+            if selected and not site_matches(site, selected):
+                continue
+            cookies += [cookie for cookie in entry.get("cookies") or []
+                        if cookie.get("expires", -1) <= 0 or cookie["expires"] > now]
+            origins += entry.get("origins") or []
+        return {"cookies": cookies, "origins": origins}
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summary of stored states (sites, cookie counts, expiry)"""
+        if not self.directory.exists():
+            return []
+        suffix = ".json.enc" if self.key else ".json"
+        summaries = []
+        for path in sorted(self.directory.glob(f"*{suffix}")):
+            name = path.name[:-len(suffix)]
+            try:
+                sites = self.load(name)["sites"]
+            except StorageStateError as e:
+                summaries.append({"name": name, "error": str(e)})
+                continue
+            summaries.append({
+                "name": name,
+                "encrypted": bool(self.key),
+                "sites": {
+                    site: {
+                        "cookies": len(entry.get("cookies") or []),
+                        "origins": len(entry.get("origins") or []),
+                        "age_s": round(time.time() - entry.get("saved_at", 0)),
+                        "expires_in_s": round(entry.get("expires_at", 0) - time.time()),
+                    }
+                    for site, entry in sorted(sites.items())
+                },
+            })
+        return summaries
+
+    def write(self, name: str, document: Dict[str, Any]):
+        """Atomic write, readable by the owner only"""
+        path = self.path(name)
+        data = json.dumps(document, separators=(",", ":")).encode("utf-8")
+        if self.key:
+            data = self.encrypt(data)
+
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            os.chmod(self.directory, 0o700)
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            raise StorageStateError(f"cannot write {path}: {e}")
+
+    def mac(self, ciphertext: bytes) -> bytes:
+        mac_key = hashlib.pbkdf2_hmac("sha256", self.key.encode("utf-8"), b"kagami-storage-state-mac", 100000)
+        return hmac.new(mac_key, ciphertext, hashlib.sha256).hexdigest().encode("ascii")
+
+    def openssl(self, args: List[str], data: bytes) -> bytes:
+        env = dict(os.environ, KAGAMI_STORAGE_STATE_KEY=self.key)
+        try:
+            result = subprocess.run(
+                ["openssl", "enc", "-aes-256-cbc", "-pbkdf2", "-iter", "200000", "-salt",
+                 "-pass", "env:KAGAMI_STORAGE_STATE_KEY"] + args,
+                input=data, capture_output=True, env=env, timeout=30
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise StorageStateError(f"openssl failed: {e}")
+        if result.returncode != 0:
+            raise StorageStateError(f"openssl failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+        return result.stdout
+
+    def encrypt(self, data: bytes) -> bytes:
+        ciphertext = self.openssl([], data)
+        return ENCRYPTED_MAGIC + self.mac(ciphertext) + b"\n" + ciphertext
+
+    def decrypt(self, data: bytes) -> bytes:
+        if not data.startswith(ENCRYPTED_MAGIC):
+            raise StorageStateError("not an encrypted storage state")
+        mac, _, ciphertext = data[len(ENCRYPTED_MAGIC):].partition(b"\n")
+        if not hmac.compare_digest(mac, self.mac(ciphertext)):
+            raise StorageStateError("wrong KAGAMI_STORAGE_STATE_KEY or corrupted file")
+        return self.openssl(["-d"], ciphertext)
+
+
+def build_restore_code(state: Dict[str, Any]) -> str:
+    """browser_run_code function applying a storageState to the running context"""
+    return RESTORE_CODE % json.dumps(state)
+
+
+TOOLS: List[Dict[str, Any]] = [
+    {
+        "name": "kagami_storage_save",
+        "description": "Save the browser's cookies and localStorage under a name, so later or recycled browser "
+                       "sessions start logged in. Call after completing a login.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "description": "State name (letters, digits, '.', '_', '-')"},
+                "sites": {"type": "array", "items": {"type": "string"},
+                          "description": "Only save these hosts or URLs (default: every site)"},
+                "ttl_seconds": {"type": "number", "description": "Keep the saved sites for this long"},
+            },
+            "required": ["name"],
+        },
+    },
+    {
+        "name": "kagami_storage_restore",
+        "description": "Load a saved state's cookies and localStorage into the browser (before navigating to the site).",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "description": "State name"},
+                "sites": {"type": "array", "items": {"type": "string"},
+                          "description": "Only restore these hosts or URLs (default: every site)"},
+            },
+            "required": ["name"],
+        },
+    },
+    {
+        "name": "kagami_storage_list",
+        "description": "List saved browser states with their sites and expiry.",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+]